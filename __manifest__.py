@@ -10,7 +10,8 @@
     "depends": ["base", "maintenance"],
     "data": [
         "data/cron_jobs.xml",
-        "security/ir.model.access.csv"
+        "security/ir.model.access.csv",
+        "views/wa_template_views.xml"
     ],
     "installable": True,
     "auto_install": False,
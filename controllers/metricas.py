@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+ENDPOINT PROMETHEUS DE MÉTRICAS WHATSAPP
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+GET /btr_wa/metrics en formato texto de Prometheus. Desactivado mientras
+`wa_metrics_token` esté vacío; si no, exige `Authorization: Bearer <token>`.
+
+    scrape_configs:
+      - job_name: btr_wa
+        metrics_path: /btr_wa/metrics
+        authorization: {credentials: "<wa_metrics_token>"}
+        static_configs: [{targets: ["odoo:8069"]}]
+-----------------------------------------------------------
+"""
+import hmac
+
+from odoo import http
+from odoo.http import request, Response
+
+from ..models.wa_config import wa_config
+
+
+class WAMetricsController(http.Controller):
+
+    @http.route("/btr_wa/metrics", type="http", auth="none", methods=["GET"], csrf=False, save_session=False)
+    def metrics(self, **kwargs):
+        token = wa_config()["metrics_token"]
+        if not token or not request.db:
+            return request.not_found()
+        recibido = request.httprequest.headers.get("Authorization", "")
+        if not hmac.compare_digest(recibido.encode(), f"Bearer {token}".encode()):
+            return Response("Unauthorized", status=401)
+        texto = request.env["btr.wa.metrics.hourly"].sudo()._prometheus()
+        return Response(texto, content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,4 +1,15 @@
+from . import wa_helpers
+from . import plantillas
+from . import wa_breaker
+from . import cambios_ot
 from . import aperturaot
 from . import cierreot
+from . import resumen_base
 from . import resumen_diario
 from . import resumen_semanal
+from . import estadisticas_diarias
+from . import wa_ledger
+from . import wa_outbox
+from . import metricas_horarias
+from . import recuperacion
+from . import silencio
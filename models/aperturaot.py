@@ -7,102 +7,35 @@ MÓDULO DE NOTIFICACIONES OTs - WHATSAPP
 - Autor: Andrés Sánchez Serrano
 
 📌 Descripción:
-Envía notificaciones a WhatsApp cuando se crea una OT y cuando cambia de estado
-(salvo el cierre "Reparado", que lo gestiona cierreot.py).
+Envía notificaciones a WhatsApp cuando se crea una OT, cuando cambia de estado
+(salvo el cierre "Reparado", que lo gestiona cierreot.py), cuando se reasigna
+el técnico y cuando sube la prioridad.
+Los mensajes se encolan en btr.wa.outbox y se envían tras el commit.
 
 🔧 Mejoras implementadas:
 1. Migración completa a WhatsApp (mudslide) sin Telegram.
 2. Uso de secrets.yaml con fallback a secrets.yaml.example.
 3. Adjuntos de imágenes en la creación de OT.
-4. Código autónomo: no depende de helpers externos ni de otros modelos.
+4. Capa de envío común (btr.wa.helpers + wa_transport.py).
+5. Envío diferido vía outbox transaccional (btr.wa.outbox + cron).
+6. Backend de envío configurable (command | sidecar | http).
+7. Hooks por lotes: create multi y write sobre recordsets con consultas constantes.
+8. Cambios de estado seguidos de una OT agrupados en un único aviso.
+9. Textos en plantillas editables (btr.wa.template) y conversión HTML en una pasada.
+10. Sin override propio de create/write: se suscribe al hook único de
+    cambios_ot.py (nueva, estado, reasignación y prioridad).
 -----------------------------------------------------------
 """
 import logging
-import re
-import base64
-import os
-import shlex
-import tempfile
-import subprocess
 from datetime import datetime
 
 from odoo import models, api
 
-_logger = logging.getLogger(__name__)
-
+from . import wa_metrics as metrics
+from .cambios_ot import es_cierre
+from .wa_format import html_a_markdown
 
-# ===================== Utilidades internas (WA + secrets) =====================
-def _module_root():
-    return os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-
-def _load_secrets_local():
-    """Lee secrets.yaml (o el .example) desde la raíz del módulo."""
-    import yaml
-    primary = os.path.join(_module_root(), "secrets.yaml")
-    fallback = os.path.join(_module_root(), "secrets.yaml.example")
-    path = primary if os.path.exists(primary) else fallback
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f) or {}
-            return data
-    except Exception as e:
-        _logger.error(f"Error al cargar secrets: {e}")
-        return {}
-
-def _wa_config():
-    s = _load_secrets_local()
-    return {
-        "to": s.get("wa_to", ""),  # ej.: "1203...@g.us"
-        "text_cmd": s.get("wa_text_cmd", "npx mudslide@latest send {to} {text}"),
-        "image_cmd": s.get("wa_image_cmd", "npx mudslide@latest send {to} --image {file}"),
-        "timeout": int(s.get("wa_timeout_sec", 120)),
-    }
-
-def _wa_send_text(text):
-    cfg = _wa_config()
-    if not cfg["to"]:
-        _logger.error("WhatsApp: 'wa_to' vacío en secrets.yaml(.example).")
-        return
-    # Importante: mudslide acepta: npx mudslide@latest send <to> "<mensaje>"
-    cmd = cfg["text_cmd"].format(
-        to=shlex.quote(cfg["to"]),
-        text=shlex.quote(text),
-    )
-    try:
-        res = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=cfg["timeout"])
-        if res.returncode != 0:
-            _logger.error(f"WA ERROR ({res.returncode}): {res.stderr}")
-        else:
-            _logger.info("✅ WhatsApp: mensaje de texto enviado.")
-    except subprocess.TimeoutExpired:
-        _logger.error(f"WA EXC: El envío por WhatsApp superó {cfg['timeout']} segundos (timeout).")
-    except Exception as e:
-        _logger.error(f"WA EXC: {e}")
-
-def _wa_send_image_bytes(filename, data_b64):
-    cfg = _wa_config()
-    if not cfg["to"]:
-        _logger.error("WhatsApp: 'wa_to' vacío en secrets.yaml(.example).")
-        return
-    try:
-        raw = base64.b64decode(data_b64)
-        ext = os.path.splitext(filename or '')[1] or ".jpg"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-            tmp.write(raw)
-            tmp_path = tmp.name
-        cmd = cfg["image_cmd"].format(
-            to=shlex.quote(cfg["to"]),
-            file=shlex.quote(tmp_path),
-        )
-        res = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=cfg["timeout"])
-        if res.returncode != 0:
-            _logger.error(f"WA IMG ERROR ({res.returncode}): {res.stderr}")
-        else:
-            _logger.info(f"✅ WhatsApp: imagen enviada ({filename}).")
-    except subprocess.TimeoutExpired:
-        _logger.error(f"WA IMG EXC: Envío de imagen superó {cfg['timeout']} segundos (timeout).")
-    except Exception as e:
-        _logger.error(f"WA IMG EXC: {e}")
+_logger = logging.getLogger(__name__)
 
 
 # =============================== Modelo principal ==============================
@@ -111,84 +44,182 @@ class MaintenanceRequest(models.Model):
 
     # -------------------------- Utilidades de formato --------------------------
     def _convertir_html_a_markdown(self, html_text):
-        html_text = re.sub(r'<ul[^>]*>', '', html_text or '')
-        html_text = re.sub(r'</ul>', '', html_text)
-        html_text = re.sub(r'<li[^>]*>(.*?)</li>', r'• \1', html_text)
-        html_text = re.sub(r'<[^>]+>', '', html_text)
-        return (html_text or "").strip()
+        return html_a_markdown(html_text or "")
+
+    # ------------------------------ Utilidades lote ----------------------------
+    def _wa_enlace(self, base_url):
+        return f"{base_url}/web#id={self.id}&model=maintenance.request&view_type=form"
+
+    def _wa_adjuntos_por_ot(self, solo_imagenes=False):
+        """Una sola búsqueda de adjuntos para todo el recordset, agrupada por OT."""
+        por_ot = {rec.id: self.env['ir.attachment'] for rec in self}
+        if not self.ids:
+            return por_ot
+        domain = [('res_model', '=', 'maintenance.request'), ('res_id', 'in', self.ids)]
+        if solo_imagenes:
+            domain.append(('mimetype', 'like', 'image%'))
+        for adj in self.env['ir.attachment'].search(domain, order='res_id, id'):
+            por_ot[adj.res_id] |= adj
+        return por_ot
+
+    def _wa_nombres_estado(self):
+        """{id: nombre de etapa} para todo el recordset (lectura prefetch)."""
+        return {rec.id: rec.stage_id.name for rec in self}
+
+    def _wa_evento_activo(self, evento):
+        return evento in self.env['btr.wa.helpers']._wa_config()["eventos"]
+
+    def _wa_etiqueta_prioridad(self, prioridad):
+        etiquetas = dict(self._fields['priority']._description_selection(self.env))
+        return f"{'⭐' * int(prioridad or 0)} {etiquetas.get(prioridad, prioridad or '')}".strip()
+
+    # ------------------------------ Mensajes -----------------------------------
+    def _wa_mensaje_estado(self, cadena, base_url):
+        """`cadena`: estados recorridos; más de dos si se agruparon transiciones."""
+        if len(cadena) > 2:
+            transicion = f"🔄 *Estados:* {'  ➡️  '.join(cadena)}"
+        else:
+            transicion = f"🔄 *De:* {cadena[0]}  ➡️  *A:* {cadena[-1]}"
+        return self.env['btr.wa.template']._render("ot_estado", {
+            "code": self.code,
+            "transicion": transicion,
+            "resumen": self.name or 'Sin resumen',
+            "enlace": self._wa_enlace(base_url),
+        })
+
+    def _wa_mensaje_nueva(self, base_url):
+        return self.env['btr.wa.template']._render("ot_nueva", {
+            "code": self.code,
+            "fecha_notificacion": datetime.now().strftime('%d/%m/%Y %H:%M'),
+            "resumen": self.name or 'Sin resumen',
+            "tecnico": self.user_id.name or "Sin técnico asignado",
+            "hotel": self.category_id.name or "No especificado",
+            "estancia": self.equipment_id.name or "No asignado",
+            "equipo": self.maintenance_team_id.name or "No asignado",
+            "fecha_creacion": self.create_date.strftime('%d/%m/%Y %H:%M') if self.create_date else "No disponible",
+            "descripcion": self.description or "Sin descripción",
+            "instrucciones": self._convertir_html_a_markdown(self.note or "No especificadas"),
+            "enlace": self._wa_enlace(base_url),
+        })
+
+    def _wa_mensaje_reasignada(self, anterior, base_url):
+        return self.env['btr.wa.template']._render("ot_reasignada", {
+            "code": self.code,
+            "anterior": anterior.name or "Sin técnico asignado",
+            "tecnico": self.user_id.name or "Sin técnico asignado",
+            "resumen": self.name or 'Sin resumen',
+            "hotel": self.category_id.name or "No especificado",
+            "enlace": self._wa_enlace(base_url),
+        })
+
+    def _wa_mensaje_prioridad(self, anterior, base_url):
+        return self.env['btr.wa.template']._render("ot_prioridad", {
+            "code": self.code,
+            "anterior": self._wa_etiqueta_prioridad(anterior),
+            "prioridad": self._wa_etiqueta_prioridad(self.priority),
+            "resumen": self.name or 'Sin resumen',
+            "tecnico": self.user_id.name or "Sin técnico asignado",
+            "hotel": self.category_id.name or "No especificado",
+            "enlace": self._wa_enlace(base_url),
+        })
 
     # ------------------------------ Envíos WA ----------------------------------
-    def enviar_alerta_ot(self, tipo="nueva", estado_anterior=None, estado_nuevo=None):
-        _logger.info(f"📢 Enviando notificación WA para OT {self.code} (tipo={tipo}).")
-
-        resumen_ot = self.name or "Sin resumen"
-        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
-        enlace_ot = f"{base_url}/web#id={self.id}&model=maintenance.request&view_type=form"
-
-        # Cambios de estado (excepto Reparado que lo gestiona cierreot.py)
-        if tipo == "estado" and estado_anterior and estado_nuevo:
-            if estado_nuevo.lower() == "reparado":
-                _logger.info("🔁 'Reparado' lo gestiona cierreot.py. No se envía desde aperturaot.py.")
-                return
-            mensaje = (
-                f"🛠 CAMBIO DE ESTADO # {self.code}\n"
-                f"─────────────V3───────────\n"
-                f"🔄 *De:* {estado_anterior}  ➡️  *A:* {estado_nuevo}\n"
-                f"📝 *Resumen:* {resumen_ot}\n"
-                f"🔗 Abrir OT: {enlace_ot}\n"
-            )
-            _wa_send_text(mensaje)
+    def _wa_encolar_nuevas(self):
+        """Encola 'NUEVA OT' + imágenes de todo el recordset en un solo INSERT."""
+        if not self:
             return
+        outbox = self.env['btr.wa.outbox']
+        base_url = self._wa_base_url()
+        imagenes = self._wa_adjuntos_por_ot(solo_imagenes=True)
+        vals_list = []
+        for rec in self:
+            with metrics.timer("wa_render_seconds", evento="nueva"):
+                texto = rec._wa_mensaje_nueva(base_url)
+            vals_list.append(outbox._vals_texto(texto, rec, clave=f"nueva:{rec.id}", evento="nueva"))
+            vals_list.extend(outbox._vals_imagenes_ot(imagenes[rec.id], rec, base_url))
+        _logger.info(f"📢 Encolando notificación WA de {len(self)} OT(s) nuevas.")
+        outbox._encolar(vals_list)
+
+    def _wa_encolar_cambios_estado(self, anteriores, nuevos):
+        """Encola 'CAMBIO DE ESTADO' para las OTs cuyo estado ha cambiado
+        (excepto Reparado, que lo gestiona cierreot.py). Las transiciones
+        seguidas de una misma OT se agrupan en un solo aviso en la outbox."""
+        transiciones = []
+        for rec in self:
+            anterior, nuevo = anteriores.get(rec.id), nuevos.get(rec.id)
+            if not anterior or not nuevo or anterior == nuevo:
+                continue
+            if es_cierre(nuevo):
+                _logger.info("🔁 'Reparado' lo gestiona cierreot.py. No se envía desde aperturaot.py.")
+                continue
+            transiciones.append((rec, anterior, nuevo))
+        if transiciones:
+            base_url = self._wa_base_url()
+            self.env['btr.wa.outbox']._encolar_estados(
+                transiciones, lambda ot, cadena: ot._wa_mensaje_estado(cadena, base_url))
 
-        # Nueva OT
-        tecnico = self.user_id.name or "Sin técnico asignado"
-        hotel = self.category_id.name or "No especificado"
-        estancia = self.equipment_id.name or "No asignado"
-        equipo_mantenimiento = self.maintenance_team_id.name or "No asignado"
-        fecha_creacion = self.create_date.strftime('%d/%m/%Y %H:%M') if self.create_date else "No disponible"
-        descripcion = self.description or "Sin descripción"
-        instrucciones_html = self.note or "No especificadas"
-        instrucciones = self._convertir_html_a_markdown(instrucciones_html)
-        fecha_notificacion = datetime.now().strftime('%d/%m/%Y %H:%M')
-
-        mensaje = (
-            f"🛠 NUEVA OT CREADA # {self.code}\n"
-            f"─────────────V3───────────\n"
-            f"📅 *Fecha Notificación:* {fecha_notificacion}\n"
-            f"📝 *Resumen:* {resumen_ot}\n"
-            f"👷 *Técnico:* {tecnico}\n"
-            f"🏢 *Hotel:* {hotel}\n"
-            f"🏠 *Estancia:* {estancia}\n"
-            f"👥 *Equipo de Mantenimiento:* {equipo_mantenimiento}\n"
-            f"📅 *Fecha Creación:* {fecha_creacion}\n"
-            f"📄 *Descripción:* {descripcion}\n"
-            f"📌 *Instrucciones:*\n{instrucciones}\n"
-            f"🔗 Abrir OT: {enlace_ot}\n"
-            "───────────────────────────"
-        )
-        _wa_send_text(mensaje)
-
-        # Adjuntos (solo imágenes)
-        adjuntos = self.env['ir.attachment'].search([
-            ('res_model', '=', 'maintenance.request'),
-            ('res_id', '=', self.id),
-            ('mimetype', 'like', 'image%')
-        ])
-        for adj in adjuntos:
-            if adj.datas:
-                _wa_send_image_bytes(adj.name, adj.datas)
-
-    # ------------------------ Hooks create/write de Odoo -----------------------
+    def enviar_alerta_ot(self, tipo="nueva", estado_anterior=None, estado_nuevo=None):
+        """Punto de entrada histórico; admite recordsets de varias OTs."""
+        _logger.info(f"📢 Enviando notificación WA para OT {', '.join(str(c) for c in self.mapped('code'))} (tipo={tipo}).")
+        if tipo == "estado":
+            if estado_anterior and estado_nuevo:
+                self._wa_encolar_cambios_estado(
+                    dict.fromkeys(self.ids, estado_anterior),
+                    dict.fromkeys(self.ids, estado_nuevo),
+                )
+            return
+        self._wa_encolar_nuevas()
+
+    def _wa_encolar_reasignaciones(self, cambios):
+        """Encola 'OT REASIGNADA' cuando cambia el técnico (no al quitarlo)."""
+        outbox = self.env['btr.wa.outbox']
+        base_url = self._wa_base_url()
+        vals_list = []
+        for rec in self.filtered('user_id'):
+            with metrics.timer("wa_render_seconds", evento="reasignacion"):
+                texto = rec._wa_mensaje_reasignada(cambios[rec.id]["user_id"][0], base_url)
+            vals_list.append(outbox._vals_texto(texto, rec, evento="reasignacion"))
+        outbox._encolar(vals_list)
+
+    def _wa_encolar_escaladas(self, cambios):
+        """Encola 'PRIORIDAD ELEVADA' solo cuando la prioridad sube."""
+        outbox = self.env['btr.wa.outbox']
+        base_url = self._wa_base_url()
+        vals_list = []
+        for rec in self:
+            anterior = cambios[rec.id]["priority"][0]
+            if int(rec.priority or 0) <= int(anterior or 0):
+                continue
+            with metrics.timer("wa_render_seconds", evento="prioridad"):
+                texto = rec._wa_mensaje_prioridad(anterior, base_url)
+            vals_list.append(outbox._vals_texto(texto, rec, evento="prioridad"))
+        outbox._encolar(vals_list)
+
+    # ------------------- Suscripciones al hook único (cambios_ot) ---------------
     @api.model
-    def create(self, vals):
-        record = super().create(vals)
-        record.enviar_alerta_ot(tipo="nueva")
-        return record
-
-    def write(self, vals):
-        estado_anterior = self.stage_id.name if 'stage_id' in vals else None
-        res = super().write(vals)
-        estado_nuevo = self.stage_id.name if 'stage_id' in vals else None
-        if estado_anterior and estado_nuevo and estado_anterior != estado_nuevo:
-            self.enviar_alerta_ot(tipo="estado", estado_anterior=estado_anterior, estado_nuevo=estado_nuevo)
-        return res
+    def _wa_suscripciones(self):
+        return super()._wa_suscripciones() + [
+            ("create", (), "_wa_al_crear"),
+            ("write", ("stage_id",), "_wa_al_cambiar_etapa"),
+            ("write", ("user_id",), "_wa_al_reasignar"),
+            ("write", ("priority",), "_wa_al_escalar"),
+        ]
+
+    def _wa_al_crear(self):
+        if self._wa_evento_activo("nueva"):
+            self._wa_encolar_nuevas()
+
+    def _wa_al_cambiar_etapa(self, cambios):
+        if self._wa_evento_activo("estado"):
+            self._wa_encolar_cambios_estado(
+                {i: c["stage_id"][0].name for i, c in cambios.items()},
+                {i: c["stage_id"][1].name for i, c in cambios.items()},
+            )
+
+    def _wa_al_reasignar(self, cambios):
+        if self._wa_evento_activo("reasignacion"):
+            self._wa_encolar_reasignaciones(cambios)
+
+    def _wa_al_escalar(self, cambios):
+        if self._wa_evento_activo("prioridad"):
+            self._wa_encolar_escaladas(cambios)
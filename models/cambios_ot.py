@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+DETECCIÓN DE CAMBIOS EN OTs (HOOK ÚNICO create/write)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Un solo override de create/write de maintenance.request para todo el
+módulo. Antes aperturaot.py, cierreot.py y estadisticas_diarias.py tenían
+cada uno el suyo: cada write leía la etapa dos veces antes y dos después,
+y el reparto de "Reparado" entre dos ficheros dependía del orden de carga.
+
+Los manejadores se suscriben extendiendo `_wa_suscripciones` con super():
+
+    ("create", (), "_metodo")        -> _metodo(records)
+    ("write", campos, "_metodo")     -> _metodo(records, cambios)
+
+`campos` son los campos que vigila el manejador y los que se fotografían
+antes del write; `cambios` es {id: {campo: (antes, después)}} solo con las
+OTs y campos que han cambiado de verdad. Un write que no toca ningún campo
+vigilado va directo a super() sin lecturas extra. Los writes anidados de
+maintenance (close_date al cambiar de etapa, o al crear la OT ya en una
+etapa final) no se vuelven a despachar: su efecto ya aparece en la
+diferencia del write exterior o en el registro recién creado.
+-----------------------------------------------------------
+"""
+import logging
+
+from odoo import models, api, tools
+
+from . import wa_metrics as metrics
+
+_logger = logging.getLogger(__name__)
+
+# Etapa que se notifica como cierre (cierreot.py) y no como cambio de estado
+ETAPA_CIERRE = "reparado"
+
+
+def es_cierre(nombre_etapa):
+    return (nombre_etapa or "").strip().lower() == ETAPA_CIERRE
+
+
+class MaintenanceRequest(models.Model):
+    _inherit = "maintenance.request"
+
+    # ------------------------------ Suscripciones ------------------------------
+    @api.model
+    def _wa_suscripciones(self):
+        """[(evento, campos, método)]; cada fichero añade las suyas con super()."""
+        return []
+
+    @api.model
+    @tools.ormcache()
+    def _wa_campos_vigilados(self):
+        return frozenset(c for evento, campos, _m in self._wa_suscripciones() if evento == "write" for c in campos)
+
+    def _wa_base_url(self):
+        """Una lectura por despacho: los manejadores la reciben por contexto."""
+        return (self.env.context.get("btr_wa_base_url")
+                or self.env['ir.config_parameter'].sudo().get_param('web.base.url'))
+
+    # -------------------------------- Despacho ---------------------------------
+    def _wa_instantanea(self, campos):
+        """{id: {campo: valor}} de los campos dados (una lectura prefetch)."""
+        return {rec.id: {campo: rec[campo] for campo in campos} for rec in self}
+
+    def _wa_despachar(self, evento, antes=None):
+        suscripciones = [s for s in self._wa_suscripciones() if s[0] == evento]
+        if not suscripciones or not self:
+            return
+        recs = self.with_context(btr_wa_base_url=self._wa_base_url())
+        for _evento, campos, metodo in suscripciones:
+            if evento == "create":
+                with metrics.timer("wa_hook_seconds", handler=metodo):
+                    getattr(recs, metodo)()
+                continue
+            cambios = {}
+            for rec in recs:
+                previo = antes.get(rec.id, {})
+                distintos = {
+                    campo: (previo[campo], rec[campo])
+                    for campo in campos if campo in previo and previo[campo] != rec[campo]
+                }
+                if distintos:
+                    cambios[rec.id] = distintos
+            if cambios:
+                with metrics.timer("wa_hook_seconds", handler=metodo):
+                    getattr(recs.browse(list(cambios)), metodo)(cambios)
+
+    # ------------------------ Hooks create/write de Odoo -----------------------
+    @api.model_create_multi
+    def create(self, vals_list):
+        # maintenance escribe close_date/equipo dentro de su create: esos
+        # writes anidados ya van incluidos en lo que ve el despacho "create".
+        records = super(MaintenanceRequest, self.with_context(btr_wa_cambios=True)).create(vals_list)
+        records = records.with_env(self.env)
+        records._wa_despachar("create")
+        return records
+
+    def write(self, vals):
+        vigilados = self._wa_campos_vigilados()
+        if self.env.context.get('btr_wa_cambios') or vigilados.isdisjoint(vals):
+            return super().write(vals)
+        # Se fotografían todos los campos de los manejadores afectados: un
+        # cambio de etapa también cambia close_date en el write anidado.
+        campos = {
+            c for evento, campos_s, _m in self._wa_suscripciones()
+            if evento == "write" and not set(campos_s).isdisjoint(vals)
+            for c in campos_s
+        }
+        antes = self._wa_instantanea(campos)
+        res = super(MaintenanceRequest, self.with_context(btr_wa_cambios=True)).write(vals)
+        self._wa_despachar("write", antes)
+        return res
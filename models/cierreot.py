@@ -12,159 +12,90 @@ Detecta el cambio de estado a "Reparado" y envía notificación detallada a What
 
 🔧 Mejoras implementadas:
 1. Migración completa a WhatsApp (mudslide) sin Telegram.
-2. Capa de envío propia (textos e imágenes) con timeout configurable.
+2. Envío de textos e imágenes vía outbox transaccional (btr.wa.outbox).
 3. Mensaje “CIERRE DE OT” con formato V3.
-4. Código autónomo: no depende de helpers externos.
+4. Sin envíos síncronos dentro de write(): el cron de la outbox los drena.
+5. Cierres masivos por lotes: adjuntos de todas las OTs en una sola búsqueda.
+6. Textos en plantillas editables (btr.wa.template, plantillas.py).
+7. Sin override propio de write: se suscribe al hook único de cambios_ot.py,
+   que también decide qué etapa es el cierre (`es_cierre`).
 -----------------------------------------------------------
 """
 import logging
-import re
-import base64
-import os
-import shlex
-import tempfile
-import subprocess
-from datetime import datetime
 
-from odoo import models
+from odoo import models, api
 
-_logger = logging.getLogger(__name__)
-
-
-# ===================== Utilidades internas (WA + secrets) =====================
-def _module_root():
-    return os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-
-def _load_secrets_local():
-    import yaml
-    primary = os.path.join(_module_root(), "secrets.yaml")
-    fallback = os.path.join(_module_root(), "secrets.yaml.example")
-    path = primary if os.path.exists(primary) else fallback
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return yaml.safe_load(f) or {}
-    except Exception as e:
-        _logger.error(f"Error al cargar secrets: {e}")
-        return {}
+from . import wa_metrics as metrics
+from .cambios_ot import es_cierre
 
-def _wa_config():
-    s = _load_secrets_local()
-    return {
-        "to": s.get("wa_to", ""),
-        "text_cmd": s.get("wa_text_cmd", "npx mudslide@latest send {to} {text}"),
-        "image_cmd": s.get("wa_image_cmd", "npx mudslide@latest send {to} --image {file}"),
-        "timeout": int(s.get("wa_timeout_sec", 120)),
-    }
-
-def _wa_send_text(text):
-    cfg = _wa_config()
-    if not cfg["to"]:
-        _logger.error("WhatsApp: 'wa_to' vacío en secrets.yaml(.example).")
-        return
-    cmd = cfg["text_cmd"].format(
-        to=shlex.quote(cfg["to"]),
-        text=shlex.quote(text),
-    )
-    try:
-        res = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=cfg["timeout"])
-        if res.returncode != 0:
-            _logger.error(f"WA ERROR ({res.returncode}): {res.stderr}")
-        else:
-            _logger.info("✅ WhatsApp: mensaje de texto enviado.")
-    except subprocess.TimeoutExpired:
-        _logger.error(f"WA EXC: El envío por WhatsApp superó {cfg['timeout']} segundos (timeout).")
-    except Exception as e:
-        _logger.error(f"WA EXC: {e}")
-
-def _wa_send_image_bytes(filename, data_b64):
-    cfg = _wa_config()
-    if not cfg["to"]:
-        _logger.error("WhatsApp: 'wa_to' vacío en secrets.yaml(.example).")
-        return
-    try:
-        raw = base64.b64decode(data_b64)
-        ext = os.path.splitext(filename or '')[1] or ".jpg"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-            tmp.write(raw)
-            tmp_path = tmp.name
-        cmd = cfg["image_cmd"].format(
-            to=shlex.quote(cfg["to"]),
-            file=shlex.quote(tmp_path),
-        )
-        res = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=cfg["timeout"])
-        if res.returncode != 0:
-            _logger.error(f"WA IMG ERROR ({res.returncode}): {res.stderr}")
-        else:
-            _logger.info(f"✅ WhatsApp: imagen enviada ({filename}).")
-    except subprocess.TimeoutExpired:
-        _logger.error(f"WA IMG EXC: Envío de imagen superó {cfg['timeout']} segundos (timeout).")
-    except Exception as e:
-        _logger.error(f"WA IMG EXC: {e}")
+_logger = logging.getLogger(__name__)
 
 
 # =============================== Modelo principal ==============================
 class MaintenanceRequest(models.Model):
     _inherit = "maintenance.request"
 
-    def _convertir_html_a_markdown(self, html_text):
-        html_text = re.sub(r'<ul[^>]*>', '', html_text or '')
-        html_text = re.sub(r'</ul>', '', html_text)
-        html_text = re.sub(r'<li[^>]*>(.*?)</li>', r'• \1', html_text)
-        html_text = re.sub(r'<[^>]+>', '', html_text)
-        return (html_text or "").strip()
-
-    def _mensaje_cierre(self, estado_anterior, estado_nuevo):
-        tecnico = getattr(self.user_id, 'name', 'Sin técnico')
-        hotel = getattr(self.category_id, 'name', 'No especificado')
-        estancia = getattr(self.equipment_id, 'name', 'No asignado')
-        tiempo_dedicado = self.duration or 0
-        fecha_cierre = self.close_date.strftime('%d/%m/%Y %H:%M') if self.close_date else "No disponible"
-        descripcion = self.description or "Sin descripción"
-        instrucciones_html = self.note or "No especificadas"
-        instrucciones = self._convertir_html_a_markdown(instrucciones_html)
-        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
-        enlace_ot = f"{base_url}/web#id={self.id}&model=maintenance.request&view_type=form"
-
-        mensaje = (
-            f"🛠 *CIERRE DE OT # {self.code}*\n"
-            f"─────────────V3───────────\n"
-            f"🔄 *De:* {estado_anterior} ➡️ *A:* {estado_nuevo}\n"
-            f"👷 *Técnico:* {tecnico}\n"
-            f"🏢 *Hotel:* {hotel}\n"
-            f"🏠 *Estancia:* {estancia}\n"
-            f"⏳ *Tiempo Dedicado:* {tiempo_dedicado:.2f} horas\n"
-            f"🗓 *Fecha Cierre:* {fecha_cierre}\n"
-            f"📄 *Descripción:* {descripcion}\n"
-            f"📌 *Instrucciones:*\n{instrucciones}\n"
-            f"🔗 Abrir OT: {enlace_ot}\n"
-            "───────────────────────────"
+    def _mensaje_cierre(self, estado_anterior, estado_nuevo, base_url=None):
+        base_url = base_url or self._wa_base_url()
+        return self.env['btr.wa.template']._render("ot_cierre", {
+            "code": self.code,
+            "estado_anterior": estado_anterior,
+            "estado_nuevo": estado_nuevo,
+            "tecnico": getattr(self.user_id, 'name', 'Sin técnico'),
+            "hotel": getattr(self.category_id, 'name', 'No especificado'),
+            "estancia": getattr(self.equipment_id, 'name', 'No asignado'),
+            "horas": self.duration or 0,
+            "fecha_cierre": self.close_date.strftime('%d/%m/%Y %H:%M') if self.close_date else "No disponible",
+            "descripcion": self.description or "Sin descripción",
+            "instrucciones": self._convertir_html_a_markdown(self.note or "No especificadas"),
+            "enlace": self._wa_enlace(base_url),
+        })
+
+    def _wa_encolar_cierres(self, anteriores, nuevos):
+        """Encola cierre + imágenes + enlaces de todas las OTs que pasan a
+        'Reparado', con una sola búsqueda de adjuntos y un solo INSERT."""
+        cerradas = self.filtered(
+            lambda r: es_cierre(nuevos.get(r.id))
+            and anteriores.get(r.id) != nuevos.get(r.id)
         )
-        return mensaje
-
-    def write(self, vals):
-        estado_anterior = self.stage_id.name if self.stage_id else "Desconocido"
-        res = super().write(vals)
-        estado_nuevo = self.stage_id.name if self.stage_id else "Desconocido"
-
-        if 'stage_id' in vals and estado_anterior != estado_nuevo and estado_nuevo and estado_nuevo.lower() == "reparado":
-            _logger.info(f"📢 Enviando notificación WA: OT {self.code} pasó de '{estado_anterior}' a '{estado_nuevo}'.")
-            _wa_send_text(self._mensaje_cierre(estado_anterior, estado_nuevo))
-
-            # Enviar adjuntos (texto con enlaces) + imágenes
-            base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
-            adjuntos = self.env['ir.attachment'].search([('res_model', '=', 'maintenance.request'),
-                                                         ('res_id', '=', self.id)])
+        if not cerradas:
+            return
+        _logger.info(f"📢 Encolando notificación WA de cierre para {len(cerradas)} OT(s).")
+        outbox = self.env['btr.wa.outbox']
+        base_url = self._wa_base_url()
+        adjuntos_por_ot = cerradas._wa_adjuntos_por_ot()
+        vals_list = []
+        for rec in cerradas:
+            estado_anterior = anteriores.get(rec.id) or "Desconocido"
+            with metrics.timer("wa_render_seconds", evento="cierre"):
+                texto = rec._mensaje_cierre(estado_anterior, nuevos[rec.id], base_url)
+            vals_list.append(outbox._vals_texto(texto, rec, evento="cierre"))
+
+            # Imágenes + texto con enlaces (el orden de la cola se respeta)
             enlaces = []
-            for adj in adjuntos:
+            imagenes = self.env['ir.attachment']
+            for adj in adjuntos_por_ot[rec.id]:
                 url = f"{base_url}/web/content/{adj.id}"
                 if str(adj.mimetype or "").startswith('image/'):
                     enlaces.append(f"🖼 {adj.name}: {url}")
-                    if adj.datas:
-                        _wa_send_image_bytes(adj.name, adj.datas)
+                    imagenes |= adj
                 else:
                     enlaces.append(f"📎 {adj.name}: {url}")
 
+            vals_list.extend(outbox._vals_imagenes_ot(imagenes, rec))
             if enlaces:
-                _wa_send_text("Adjuntos:\n" + "\n".join(enlaces))
-
-        return res
+                texto = self.env['btr.wa.template']._render("ot_adjuntos", {
+                    "code": rec.code, "enlaces": "\n".join(enlaces)})
+                vals_list.append(outbox._vals_texto(texto, rec, evento="adjuntos"))
+        outbox._encolar(vals_list)
+
+    @api.model
+    def _wa_suscripciones(self):
+        return super()._wa_suscripciones() + [("write", ("stage_id",), "_wa_al_cerrar")]
+
+    def _wa_al_cerrar(self, cambios):
+        if self._wa_evento_activo("cierre"):
+            self._wa_encolar_cierres(
+                {i: c["stage_id"][0].name for i, c in cambios.items()},
+                {i: c["stage_id"][1].name for i, c in cambios.items()},
+            )
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+ESTADÍSTICAS DIARIAS DE OTs (MATERIALIZADAS)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Tabla agregada por día, empresa, equipo, hotel (categoría) y técnico con OTs
+creadas, cerradas y horas. Se mantiene de forma incremental desde el
+hook único de create/write (cambios_ot.py) y desde unlink, así los resúmenes
+(diario, semanal y futuros mensual/anual) leen unas pocas filas en vez de
+recorrer las OTs.
+
+Cada OT aporta:
+- 1 creada en (create_date::date, empresa, equipo, hotel, técnico);
+- 1 cerrada + duration horas en (close_date, empresa, equipo, hotel,
+  técnico) si tiene fecha de cierre.
+En cada write que toca un campo relevante se resta la aportación anterior
+y se suma la nueva, por lo que reaperturas, reasignaciones o cambios de
+horas quedan reflejados sin recalcular nada.
+
+La carga inicial se hace sola al instalar/actualizar el módulo si la tabla
+está vacía. Reconstrucción manual: tools/backfill_stats.py (odoo shell).
+-----------------------------------------------------------
+"""
+import logging
+from collections import defaultdict
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Campos de maintenance.request que afectan a la aportación de una OT
+CAMPOS_STATS = ("stage_id", "close_date", "duration", "company_id", "maintenance_team_id", "category_id", "user_id")
+
+# Dimensiones de la tabla, en el orden de la clave
+DIMS = ("company_id", "maintenance_team_id", "category_id", "user_id")
+
+# Clave única (NULL no colisiona en un UNIQUE normal: se usa COALESCE(..., 0))
+CLAVE = """(fecha, COALESCE(company_id, 0), COALESCE(maintenance_team_id, 0),
+            COALESCE(category_id, 0), COALESCE(user_id, 0))"""
+
+
+class EstadisticasDiarias(models.Model):
+    _name = "btr.wa.stats.daily"
+    _description = "Estadísticas diarias de OTs (WhatsApp)"
+    _order = "fecha desc"
+    _log_access = False
+
+    fecha = fields.Date(required=True, index=True)
+    company_id = fields.Many2one("res.company", string="Empresa", ondelete="set null")
+    maintenance_team_id = fields.Many2one("maintenance.team", string="Equipo", ondelete="set null")
+    category_id = fields.Many2one("maintenance.equipment.category", string="Hotel", ondelete="set null")
+    user_id = fields.Many2one("res.users", string="Técnico", ondelete="set null")
+    creadas = fields.Integer(default=0)
+    cerradas = fields.Integer(default=0)
+    horas = fields.Float(default=0.0)
+
+    def init(self):
+        self.env.cr.execute(f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS btr_wa_stats_daily_clave_uniq ON btr_wa_stats_daily {CLAVE}
+        """)
+        # Primera instalación/actualización: carga inicial si la tabla está vacía
+        self.env.cr.execute("SELECT 1 FROM btr_wa_stats_daily LIMIT 1")
+        if not self.env.cr.fetchone():
+            self.backfill()
+
+    # --------------------------- Mantenimiento incremental ---------------------
+    @api.model
+    def _aportaciones(self, requests, valores=None):
+        """{clave: [creadas, cerradas, horas]} que aportan las OTs dadas.
+        `valores` ({id: {campo: valor}}) sustituye a los del registro, para
+        calcular la aportación anterior a un write."""
+        delta = defaultdict(lambda: [0, 0, 0.0])
+        valores = valores or {}
+        for ot in requests:
+            previo = valores.get(ot.id, {})
+
+            def valor(campo):
+                return previo[campo] if campo in previo else ot[campo]
+
+            dims = tuple(valor(campo).id or 0 for campo in DIMS)
+            if ot.create_date:
+                delta[(ot.create_date.date(),) + dims][0] += 1
+            if valor("close_date"):
+                fila = delta[(valor("close_date"),) + dims]
+                fila[1] += 1
+                fila[2] += valor("duration") or 0.0
+        return delta
+
+    @api.model
+    def _aplicar(self, delta, signo=1):
+        """Suma (o resta) las aportaciones con un único INSERT ... ON CONFLICT."""
+        filas = [
+            (clave[0],) + tuple(d or None for d in clave[1:]) + (signo * v[0], signo * v[1], signo * v[2])
+            for clave, v in delta.items() if v[0] or v[1] or v[2]
+        ]
+        if not filas:
+            return
+        valores = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(filas))
+        self.env.cr.execute(f"""
+            INSERT INTO btr_wa_stats_daily
+                   (fecha, company_id, maintenance_team_id, category_id, user_id, creadas, cerradas, horas)
+            VALUES {valores}
+            ON CONFLICT {CLAVE}
+            DO UPDATE SET creadas = btr_wa_stats_daily.creadas + EXCLUDED.creadas,
+                          cerradas = btr_wa_stats_daily.cerradas + EXCLUDED.cerradas,
+                          horas = btr_wa_stats_daily.horas + EXCLUDED.horas
+        """, [x for fila in filas for x in fila])
+        self.invalidate_model()
+
+    @api.model
+    def _restar_sumar(self, antes, despues):
+        delta = defaultdict(lambda: [0, 0, 0.0])
+        for clave, v in despues.items():
+            for i in range(3):
+                delta[clave][i] += v[i]
+        for clave, v in antes.items():
+            for i in range(3):
+                delta[clave][i] -= v[i]
+        self._aplicar(delta)
+
+    # ------------------------------ Reconstrucción -----------------------------
+    @api.model
+    def backfill(self):
+        """Reconstruye la tabla completa desde maintenance_request (una consulta)."""
+        self.env['maintenance.request'].flush_model()
+        self.env.cr.execute("DELETE FROM btr_wa_stats_daily")
+        self.env.cr.execute("""
+            INSERT INTO btr_wa_stats_daily
+                   (fecha, company_id, maintenance_team_id, category_id, user_id, creadas, cerradas, horas)
+            SELECT fecha, company_id, maintenance_team_id, category_id, user_id,
+                   SUM(creadas), SUM(cerradas), SUM(horas)
+              FROM (
+                    SELECT create_date::date AS fecha, company_id, maintenance_team_id, category_id, user_id,
+                           1 AS creadas, 0 AS cerradas, 0.0 AS horas
+                      FROM maintenance_request
+                     WHERE create_date IS NOT NULL
+                    UNION ALL
+                    SELECT close_date, company_id, maintenance_team_id, category_id, user_id,
+                           0, 1, COALESCE(duration, 0.0)
+                      FROM maintenance_request
+                     WHERE close_date IS NOT NULL
+                   ) AS aportaciones
+             GROUP BY fecha, company_id, maintenance_team_id, category_id, user_id
+        """)
+        filas = self.env.cr.rowcount
+        self.invalidate_model()
+        _logger.info(f"📊 Estadísticas diarias reconstruidas: {filas} filas.")
+        return filas
+
+
+class MaintenanceRequest(models.Model):
+    _inherit = "maintenance.request"
+
+    # El hook único (cambios_ot.py) fotografía CAMPOS_STATS antes del write:
+    # el close_date que reescribe el write anidado de maintenance ya sale en
+    # la diferencia.
+    @api.model
+    def _wa_suscripciones(self):
+        return [
+            ("create", (), "_wa_stats_al_crear"),
+            ("write", CAMPOS_STATS, "_wa_stats_al_cambiar"),
+        ] + super()._wa_suscripciones()
+
+    def _wa_stats_al_crear(self):
+        stats = self.env['btr.wa.stats.daily']
+        stats._aplicar(stats._aportaciones(self))
+
+    def _wa_stats_al_cambiar(self, cambios):
+        stats = self.env['btr.wa.stats.daily']
+        antes = stats._aportaciones(self, {i: {c: v[0] for c, v in campos.items()} for i, campos in cambios.items()})
+        stats._restar_sumar(antes, stats._aportaciones(self))
+
+    def unlink(self):
+        stats = self.env['btr.wa.stats.daily']
+        antes = stats._aportaciones(self)
+        res = super().unlink()
+        stats._aplicar(antes, signo=-1)
+        return res
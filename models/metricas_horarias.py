@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+MÉTRICAS HORARIAS DEL ENVÍO WHATSAPP
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Rollup por hora de las métricas en proceso (wa_metrics.py). Cada worker
+vuelca sus incrementos con un único INSERT ... ON CONFLICT en un cursor
+propio, así el volcado no alarga ni bloquea la transacción del usuario.
+- counter: `suma` acumula el valor.
+- timer: `n` observaciones, `suma` segundos y `maximo` de la hora.
+
+El endpoint /btr_wa/metrics (controllers/metricas.py) expone los totales
+en formato texto de Prometheus.
+
+Las horas se conservan RETENCION_DIAS días. El autovacuum diario suma las
+más antiguas en una fila de totales por métrica y etiquetas (hora
+HORA_TOTALES, 01/01/1970) y las borra: los contadores siguen siendo
+acumulados desde siempre y el scrape agrega unos pocos cientos de filas,
+no todo el histórico.
+-----------------------------------------------------------
+"""
+import logging
+from datetime import datetime, timedelta
+
+from odoo import models, fields, api
+
+from . import wa_metrics
+
+_logger = logging.getLogger(__name__)
+
+# Días de detalle por hora; lo anterior queda sumado en la fila de totales
+RETENCION_DIAS = 7
+HORA_TOTALES = datetime(1970, 1, 1)
+
+
+def _etiquetas_prometheus(etiquetas):
+    if not etiquetas:
+        return ""
+    pares = []
+    for par in etiquetas.split(","):
+        k, _, v = par.partition("=")
+        v = v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pares.append(f'{k}="{v}"')
+    return "{" + ",".join(pares) + "}"
+
+
+class MetricasHorarias(models.Model):
+    _name = "btr.wa.metrics.hourly"
+    _description = "Métricas horarias del envío WhatsApp"
+    _order = "hora desc, metrica"
+    _log_access = False
+
+    hora = fields.Datetime(required=True, index=True)
+    metrica = fields.Char(required=True)
+    etiquetas = fields.Char(default="")
+    tipo = fields.Selection([("counter", "Contador"), ("timer", "Temporizador")], required=True)
+    n = fields.Integer(default=0)
+    suma = fields.Float(default=0.0)
+    maximo = fields.Float(default=0.0)
+
+    _sql_constraints = [
+        ("hora_metrica_uniq", "unique(hora, metrica, etiquetas)",
+         "Solo una fila por hora, métrica y etiquetas."),
+    ]
+
+    # ------------------------------- Volcado -----------------------------------
+    @api.model
+    def _volcar(self):
+        """Guarda lo acumulado en este proceso en la hora actual."""
+        contadores, tiempos = wa_metrics.REGISTRY.drain()
+        if not contadores and not tiempos:
+            return 0
+        hora = fields.Datetime.now().replace(minute=0, second=0, microsecond=0)
+        filas = [(hora, nombre, etiquetas, "counter", 0, valor, 0.0)
+                 for (nombre, etiquetas), valor in contadores.items()]
+        filas += [(hora, nombre, etiquetas, "timer", n, suma, maximo)
+                  for (nombre, etiquetas), (n, suma, maximo) in tiempos.items()]
+        valores = ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(filas))
+        try:
+            with self.pool.cursor() as cr:
+                cr.execute(f"""
+                    INSERT INTO btr_wa_metrics_hourly (hora, metrica, etiquetas, tipo, n, suma, maximo)
+                    VALUES {valores}
+                    ON CONFLICT (hora, metrica, etiquetas)
+                    DO UPDATE SET n = btr_wa_metrics_hourly.n + EXCLUDED.n,
+                                  suma = btr_wa_metrics_hourly.suma + EXCLUDED.suma,
+                                  maximo = GREATEST(btr_wa_metrics_hourly.maximo, EXCLUDED.maximo)
+                """, [x for fila in filas for x in fila])
+        except Exception as e:
+            _logger.warning(f"WA METRICS: no se pudieron volcar las métricas ({e}); se reintenta luego.")
+            wa_metrics.REGISTRY.restore(contadores, tiempos)
+            return 0
+        return len(filas)
+
+    @api.model
+    def _volcar_si_toca(self):
+        """Volcado oportunista desde los caminos calientes (como mucho uno por minuto)."""
+        if wa_metrics.REGISTRY.flush_due():
+            self._volcar()
+
+    @api.autovacuum
+    def _gc_compactar(self):
+        """Suma las horas anteriores a RETENCION_DIAS en la fila de totales y las borra."""
+        limite = fields.Datetime.now() - timedelta(days=RETENCION_DIAS)
+        self.env.cr.execute("""
+            WITH viejas AS (
+                DELETE FROM btr_wa_metrics_hourly
+                 WHERE hora < %(limite)s AND hora <> %(totales)s
+             RETURNING metrica, etiquetas, tipo, n, suma, maximo
+            )
+            INSERT INTO btr_wa_metrics_hourly (hora, metrica, etiquetas, tipo, n, suma, maximo)
+            SELECT %(totales)s, metrica, etiquetas, MIN(tipo), SUM(n), SUM(suma), MAX(maximo)
+              FROM viejas
+             GROUP BY metrica, etiquetas
+            ON CONFLICT (hora, metrica, etiquetas)
+            DO UPDATE SET n = btr_wa_metrics_hourly.n + EXCLUDED.n,
+                          suma = btr_wa_metrics_hourly.suma + EXCLUDED.suma,
+                          maximo = GREATEST(btr_wa_metrics_hourly.maximo, EXCLUDED.maximo)
+        """, {"limite": limite, "totales": HORA_TOTALES})
+        if self.env.cr.rowcount:
+            _logger.info(f"🧹 WA METRICS: horas anteriores a {limite:%d/%m/%Y} sumadas en los totales "
+                         f"({self.env.cr.rowcount} series).")
+            self.invalidate_model()
+
+    # ------------------------------ Prometheus ---------------------------------
+    @api.model
+    def _prometheus(self):
+        """Métricas en formato texto de Prometheus (totales de todos los workers).
+
+        Suma la fila de totales y las horas de los últimos RETENCION_DIAS días.
+        """
+        cr = self.env.cr
+        lineas = []
+        cr.execute("""
+            SELECT metrica, etiquetas, tipo, SUM(n), SUM(suma)
+              FROM btr_wa_metrics_hourly
+             GROUP BY metrica, etiquetas, tipo
+             ORDER BY metrica, etiquetas
+        """)
+        tipos_emitidos = set()
+        for metrica, etiquetas, tipo, n, suma in cr.fetchall():
+            nombre = f"btr_{metrica}"
+            labels = _etiquetas_prometheus(etiquetas)
+            if nombre not in tipos_emitidos:
+                tipos_emitidos.add(nombre)
+                lineas.append(f"# TYPE {nombre} {'counter' if tipo == 'counter' else 'summary'}")
+            if tipo == "counter":
+                lineas.append(f"{nombre}{labels} {suma:g}")
+            else:
+                lineas.append(f"{nombre}_count{labels} {n}")
+                lineas.append(f"{nombre}_sum{labels} {suma:.6f}")
+
+        cr.execute("""
+            SELECT metrica, etiquetas, maximo FROM btr_wa_metrics_hourly
+             WHERE tipo = 'timer' AND hora = date_trunc('hour', now() at time zone 'UTC')
+             ORDER BY metrica, etiquetas
+        """)
+        for metrica, etiquetas, maximo in cr.fetchall():
+            nombre = f"btr_{metrica}_max"
+            if nombre not in tipos_emitidos:
+                tipos_emitidos.add(nombre)
+                lineas.append(f"# TYPE {nombre} gauge")
+            lineas.append(f"{nombre}{_etiquetas_prometheus(etiquetas)} {maximo:.6f}")
+
+        # Estado actual (no acumulado): cola y circuit breaker
+        cr.execute("SELECT state, COUNT(*) FROM btr_wa_outbox WHERE state IN ('pending', 'error') GROUP BY state")
+        por_estado = dict(cr.fetchall())
+        breaker = self.env["btr.wa.breaker"].estado()
+        lineas += [
+            "# TYPE btr_wa_outbox_jobs gauge",
+            f'btr_wa_outbox_jobs{{state="pending"}} {por_estado.get("pending", 0)}',
+            f'btr_wa_outbox_jobs{{state="error"}} {por_estado.get("error", 0)}',
+            "# TYPE btr_wa_breaker_open gauge",
+            f"btr_wa_breaker_open {int(breaker['estado'] != 'closed')}",
+            "# TYPE btr_wa_breaker_failures gauge",
+            f"btr_wa_breaker_failures {breaker['fallos']}",
+        ]
+        return "\n".join(lineas) + "\n"
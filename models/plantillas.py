@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+PLANTILLAS DE MENSAJES WHATSAPP
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Los textos de "NUEVA OT", "CAMBIO DE ESTADO", "CIERRE DE OT", reasignación,
+prioridad elevada, adjuntos, avisos agrupados o retenidos y resúmenes se
+editan en Ajustes > Técnico > WhatsApp > Plantillas. Sintaxis str.format:
+{campo}, {horas:.2f}, {diff:+d}; cada plantilla indica sus campos
+disponibles y se valida al guardar renderizándola con valores de ejemplo
+del tipo de cada campo (así "{resumen:.2f}" no llega a producción). Si aun
+así un envío no se puede renderizar, sale con el texto por defecto.
+
+Cada plantilla se compila una vez por (código, idioma) y se cachea con
+ormcache; crear, editar o borrar una plantilla invalida la caché en todos
+los workers. Sin plantilla para el idioma se usa la que no tiene idioma;
+si se borra también esa, el texto por defecto de PLANTILLAS. Los textos
+por defecto se crean al instalar/actualizar si falta el código (las
+ediciones se conservan).
+-----------------------------------------------------------
+"""
+import logging
+
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import ValidationError
+
+from .wa_format import compilar
+
+_logger = logging.getLogger(__name__)
+
+SEPARADOR = "───────────────────────────"
+
+# código: (nombre, campos disponibles, cuerpo por defecto)
+PLANTILLAS = {
+    "ot_nueva": (
+        "OT nueva",
+        ("code", "fecha_notificacion", "resumen", "tecnico", "hotel", "estancia", "equipo",
+         "fecha_creacion", "descripcion", "instrucciones", "enlace"),
+        "🛠 NUEVA OT CREADA # {code}\n"
+        "─────────────V3───────────\n"
+        "📅 *Fecha Notificación:* {fecha_notificacion}\n"
+        "📝 *Resumen:* {resumen}\n"
+        "👷 *Técnico:* {tecnico}\n"
+        "🏢 *Hotel:* {hotel}\n"
+        "🏠 *Estancia:* {estancia}\n"
+        "👥 *Equipo de Mantenimiento:* {equipo}\n"
+        "📅 *Fecha Creación:* {fecha_creacion}\n"
+        "📄 *Descripción:* {descripcion}\n"
+        "📌 *Instrucciones:*\n{instrucciones}\n"
+        "🔗 Abrir OT: {enlace}\n"
+        + SEPARADOR,
+    ),
+    "ot_estado": (
+        "Cambio de estado",
+        ("code", "transicion", "resumen", "enlace"),
+        "🛠 CAMBIO DE ESTADO # {code}\n"
+        "─────────────V3───────────\n"
+        "{transicion}\n"
+        "📝 *Resumen:* {resumen}\n"
+        "🔗 Abrir OT: {enlace}\n",
+    ),
+    "ot_cierre": (
+        "Cierre de OT",
+        ("code", "estado_anterior", "estado_nuevo", "tecnico", "hotel", "estancia", "horas",
+         "fecha_cierre", "descripcion", "instrucciones", "enlace"),
+        "🛠 *CIERRE DE OT # {code}*\n"
+        "─────────────V3───────────\n"
+        "🔄 *De:* {estado_anterior} ➡️ *A:* {estado_nuevo}\n"
+        "👷 *Técnico:* {tecnico}\n"
+        "🏢 *Hotel:* {hotel}\n"
+        "🏠 *Estancia:* {estancia}\n"
+        "⏳ *Tiempo Dedicado:* {horas:.2f} horas\n"
+        "🗓 *Fecha Cierre:* {fecha_cierre}\n"
+        "📄 *Descripción:* {descripcion}\n"
+        "📌 *Instrucciones:*\n{instrucciones}\n"
+        "🔗 Abrir OT: {enlace}\n"
+        + SEPARADOR,
+    ),
+    "ot_reasignada": (
+        "Reasignación de técnico",
+        ("code", "anterior", "tecnico", "resumen", "hotel", "enlace"),
+        "👷 *OT REASIGNADA # {code}*\n"
+        "─────────────V3───────────\n"
+        "🔄 *De:* {anterior}  ➡️  *A:* {tecnico}\n"
+        "📝 *Resumen:* {resumen}\n"
+        "🏢 *Hotel:* {hotel}\n"
+        "🔗 Abrir OT: {enlace}\n",
+    ),
+    "ot_prioridad": (
+        "Prioridad elevada",
+        ("code", "anterior", "prioridad", "resumen", "tecnico", "hotel", "enlace"),
+        "🚨 *PRIORIDAD ELEVADA # {code}*\n"
+        "─────────────V3───────────\n"
+        "⬆️ *De:* {anterior}  ➡️  *A:* {prioridad}\n"
+        "📝 *Resumen:* {resumen}\n"
+        "👷 *Técnico:* {tecnico}\n"
+        "🏢 *Hotel:* {hotel}\n"
+        "🔗 Abrir OT: {enlace}\n",
+    ),
+    "ot_adjuntos": (
+        "Lista de adjuntos",
+        ("code", "enlaces"),
+        "Adjuntos:\n{enlaces}",
+    ),
+    "digest": (
+        "Avisos agrupados",
+        ("n", "cuerpo"),
+        "📦 *AVISOS AGRUPADOS* ({n})\n─────────────────────\n{cuerpo}",
+    ),
+    "backlog": (
+        "Avisos pendientes (recuperación)",
+        ("n", "cuerpo"),
+        "⏪ *AVISOS PENDIENTES* ({n})\n"
+        "Avisos que no llegaron mientras el envío estuvo caído:\n"
+        "─────────────────────\n{cuerpo}",
+    ),
+    "silencio": (
+        "Avisos retenidos (horas de silencio)",
+        ("n", "desde", "hasta", "cuerpo"),
+        "🌙 *AVISOS DE LA NOCHE* ({n})\n"
+        "{desde} - {hasta}\n"
+        "─────────────────────\n{cuerpo}",
+    ),
+    "resumen_diario": (
+        "Resumen diario",
+        ("fecha", "creadas", "cerradas", "horas", "pendientes", "antiguedad", "desglose"),
+        "📝 *RESUMEN DEL DÍA*\n"
+        "─────────────────────\n"
+        "📅 Fecha: {fecha}\n"
+        "✅ OTs Creadas: {creadas}\n"
+        "🛠️ OTs Cerradas: {cerradas}\n"
+        "⏳ Horas trabajadas: {horas:.2f}h\n"
+        "📌 OTs Pendientes: {pendientes}\n"
+        "{antiguedad}"
+        "{desglose}"
+        "─────────────────────",
+    ),
+    "resumen_semanal": (
+        "Resumen semanal",
+        ("inicio", "fin", "creadas", "cerradas", "diff_cerradas", "horas", "diff_horas",
+         "pendientes", "desglose"),
+        "📊 *RESUMEN SEMANAL*\n"
+        "─────────────────────\n"
+        "📅 Semana: {inicio} - {fin}\n"
+        "✅ OTs creadas: {creadas}\n"
+        "🛠️ OTs cerradas: {cerradas} ({diff_cerradas:+d} vs semana ant.)\n"
+        "⏳ Horas: {horas:.2f}h ({diff_horas:+.2f} vs ant.)\n"
+        "📌 OTs pendientes: {pendientes}\n"
+        "{desglose}"
+        "─────────────────────",
+    ),
+}
+
+# Valores de ejemplo para validar los formatos; el resto de campos son texto
+MUESTRAS = {
+    "n": 3, "creadas": 5, "cerradas": 4, "pendientes": 12, "diff_cerradas": -1,
+    "horas": 7.5, "diff_horas": -1.25,
+}
+
+
+def compilar_validada(code, cuerpo):
+    """Compila `cuerpo` para `code` y lo renderiza con MUESTRAS; ValueError si falla."""
+    campos = PLANTILLAS[code][1]
+    plantilla = compilar(cuerpo, set(campos))
+    try:
+        plantilla.render({c: MUESTRAS.get(c, "texto") for c in campos})
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Formato no válido: {e}.") from e
+    return plantilla
+
+
+class WATemplate(models.Model):
+    _name = "btr.wa.template"
+    _description = "Plantilla de mensaje WhatsApp"
+    _order = "code, lang"
+
+    name = fields.Char(required=True)
+    code = fields.Selection(
+        [(code, datos[0]) for code, datos in PLANTILLAS.items()],
+        required=True, index=True,
+    )
+    lang = fields.Selection("_lang_get", string="Idioma", help="Vacío = cualquier idioma.")
+    body = fields.Text(string="Plantilla", required=True)
+    campos = fields.Char(string="Campos disponibles", compute="_compute_campos")
+    active = fields.Boolean(default=True)
+
+    _sql_constraints = [
+        ("code_lang_uniq", "unique(code, lang)", "Ya existe una plantilla con ese código e idioma."),
+    ]
+
+    @api.model
+    def _lang_get(self):
+        return self.env["res.lang"].get_installed()
+
+    @api.depends("code")
+    def _compute_campos(self):
+        for tpl in self:
+            tpl.campos = ", ".join(f"{{{c}}}" for c in PLANTILLAS[tpl.code][1]) if tpl.code else ""
+
+    @api.constrains("code", "body")
+    def _check_body(self):
+        for tpl in self:
+            try:
+                compilar_validada(tpl.code, tpl.body)
+            except ValueError as e:
+                raise ValidationError(_("Plantilla '%s' no válida: %s") % (tpl.name, e))
+
+    def init(self):
+        # Textos por defecto para los códigos que falten; no pisa ediciones
+        for code, (nombre, _campos, cuerpo) in PLANTILLAS.items():
+            self.env.cr.execute("""
+                INSERT INTO btr_wa_template (code, name, body, active)
+                SELECT %s, %s, %s, TRUE
+                 WHERE NOT EXISTS (SELECT 1 FROM btr_wa_template WHERE code = %s)
+            """, (code, nombre, cuerpo, code))
+
+    # ------------------------------ Caché ---------------------------------------
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.clear_caches()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        self.clear_caches()
+        return super().write(vals)
+
+    def unlink(self):
+        self.clear_caches()
+        return super().unlink()
+
+    @api.model
+    @tools.ormcache("code", "lang")
+    def _compilada(self, code, lang):
+        tpls = self.sudo().search([("code", "=", code), ("lang", "in", [lang, False])])
+        tpl = tpls.filtered(lambda t: t.lang == lang)[:1] or tpls[:1]
+        if tpl:
+            try:
+                return compilar_validada(code, tpl.body)
+            except ValueError as e:
+                _logger.error(f"WhatsApp: plantilla '{code}' no válida ({e}); se usa la de por defecto.")
+        return compilar(PLANTILLAS[code][2], set(PLANTILLAS[code][1]))
+
+    @api.model
+    def _render(self, code, valores, lang=None):
+        """Texto de la plantilla `code` para `valores` (dict campo -> valor).
+
+        Un error de formato no puede tumbar el create/write que genera el
+        aviso: se registra y se usa el texto por defecto.
+        """
+        try:
+            return self._compilada(code, lang or self.env.lang or False).render(valores)
+        except (ValueError, TypeError) as e:
+            _logger.error(f"WhatsApp: plantilla '{code}' falla al renderizar ({e}); se usa la de por defecto.")
+            return compilar(PLANTILLAS[code][2]).render(valores)
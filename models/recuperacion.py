@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+RECUPERACIÓN DE AVISOS PERDIDOS (CATCH-UP)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Repasa lo ocurrido desde la última marca (high-water mark) y reconstruye
+los avisos que no llegaron a ningún destino: OTs creadas, cambios de
+estado y cierres "Reparado" sin trabajo en la outbox, o cuyo trabajo acabó
+en *Error* tras agotar los reintentos (WhatsApp caído, OTs creadas por
+importación/SQL sin pasar por los hooks...).
+
+- Marca: último id de maintenance_request y de mail_tracking_value
+  revisados (parámetros `btr_wa.catchup_ot_id` / `btr_wa.catchup_tracking_id`).
+  La primera ejecución solo la fija; no se repasa el histórico.
+- Lectura por páginas con keyset (`id > último ORDER BY id LIMIT n`), así
+  el coste no depende de cuánto histórico haya detrás de la marca.
+- Un aviso se da por enviado a un destino si tiene en la outbox un trabajo
+  del mismo evento (en una ventana alrededor del cambio para los estados)
+  que no acabó en error, o si quedó retenido en horas de silencio
+  (btr.wa.quiet, silencio.py).
+- Solo cuentan los avisos activos en `wa_events`.
+- Los destinos de un aviso perdido se resuelven con la etapa y la
+  prioridad que tenía la OT en el momento del evento (historial del
+  chatter), no con las actuales.
+- Un trabajo que aún está pendiente cuenta como enviado y la marca sigue
+  adelante; si después agota los reintentos y acaba en *Error*, lo recoge
+  una segunda pasada que repasa los trabajos en error de los últimos
+  ERRORES_DIAS días (con el destino del propio trabajo).
+- Lo perdido se envía como un único mensaje compacto por destino
+  ("AVISOS PENDIENTES"), no uno por evento. Los trabajos en error que
+  cubre quedan como *Agrupado* en ese mensaje.
+
+Corre con su cron y, además, cuando el circuit breaker se vuelve a cerrar.
+-----------------------------------------------------------
+"""
+import logging
+from collections import defaultdict
+
+from odoo import models, fields, api
+
+from .cambios_ot import ETAPA_CIERRE, es_cierre
+from .wa_ledger import content_hash
+
+_logger = logging.getLogger(__name__)
+
+CRON_XMLID = "btr_automation_whatsapp.ir_cron_wa_catchup"
+PARAM_OT = "btr_wa.catchup_ot_id"
+PARAM_TRACKING = "btr_wa.catchup_tracking_id"
+
+# Líneas por mensaje y máximo de líneas por destino en una recuperación
+LINEAS_MENSAJE = 40
+LINEAS_MAX = 400
+
+# Antigüedad máxima de los trabajos en error que se recuperan
+ERRORES_DIAS = 2
+
+# Campos cuyo valor en la fecha del evento decide los destinos
+CAMPOS_HISTORIAL = ("stage_id", "priority")
+
+
+class WACatchup(models.AbstractModel):
+    _name = "btr.wa.catchup"
+    _description = "Recuperación de avisos WhatsApp perdidos"
+
+    # -------------------------------- Marca ------------------------------------
+    def _icp(self):
+        return self.env["ir.config_parameter"].sudo()
+
+    def _leer_marca(self):
+        icp = self._icp()
+        ot_id, tracking_id = icp.get_param(PARAM_OT), icp.get_param(PARAM_TRACKING)
+        if ot_id is None or tracking_id is None:
+            return None
+        return int(ot_id), int(tracking_id)
+
+    def _guardar_marca(self, ot_id, tracking_id):
+        icp = self._icp()
+        icp.set_param(PARAM_OT, str(ot_id))
+        icp.set_param(PARAM_TRACKING, str(tracking_id))
+
+    def _campo_etapa(self):
+        return self.env["ir.model.fields"]._get("maintenance.request", "stage_id").id
+
+    # ------------------------------- Historial ---------------------------------
+    def _historial(self, ot_ids):
+        """{(id OT, campo): [(fecha, anterior, nuevo)]} de etapa y prioridad, por fecha."""
+        campos = {self.env["ir.model.fields"]._get("maintenance.request", c).id: c for c in CAMPOS_HISTORIAL}
+        prioridad = self.env["maintenance.request"]._fields["priority"]
+        # El chatter guarda la etiqueta de la selección, no la clave
+        claves = {etiqueta: clave for clave, etiqueta in prioridad.selection}
+        claves.update({etiqueta: clave for clave, etiqueta in prioridad._description_selection(self.env)})
+        self.env.cr.execute("""
+            SELECT m.res_id, v.field, m.date, v.old_value_char, v.new_value_char
+              FROM mail_tracking_value v
+              JOIN mail_message m ON m.id = v.mail_message_id
+             WHERE m.model = 'maintenance.request' AND m.res_id = ANY(%s) AND v.field = ANY(%s)
+             ORDER BY m.date, v.id
+        """, (list(ot_ids), list(campos)))
+        historial = defaultdict(list)
+        for rid, campo_id, fecha, anterior, nuevo in self.env.cr.fetchall():
+            campo = campos[campo_id]
+            if campo == "priority":
+                anterior, nuevo = claves.get(anterior, anterior), claves.get(nuevo, nuevo)
+            historial[(rid, campo)].append((fecha, anterior, nuevo))
+        return historial
+
+    @staticmethod
+    def _valor_en(cambios, fecha, actual):
+        """Valor en `fecha`: el anterior del primer cambio posterior o, si no hay, el actual."""
+        if fecha:
+            for cuando, anterior, _nuevo in cambios:
+                if cuando > fecha and anterior:
+                    return anterior
+        return actual
+
+    # ------------------------------- Lectura -----------------------------------
+    def _paginas(self, consulta, desde, params, pagina):
+        """Recorre `consulta` por keyset: el primer parámetro es el último id."""
+        ultimo = desde
+        while True:
+            self.env.cr.execute(consulta, (ultimo,) + tuple(params) + (pagina,))
+            filas = self.env.cr.fetchall()
+            if not filas:
+                return
+            ultimo = filas[-1][0]
+            yield filas
+            if len(filas) < pagina:
+                return
+
+    def _creaciones(self, desde, pagina):
+        """Por página: [(id keyset, id OT, fecha, evento, anterior, nuevo, destinos cubiertos)]."""
+        consulta = """
+            SELECT id, create_date FROM maintenance_request
+             WHERE id > %s
+             ORDER BY id
+             LIMIT %s
+        """
+        for filas in self._paginas(consulta, desde, (), pagina):
+            self.env.cr.execute("""
+                SELECT request_id, destino FROM btr_wa_outbox
+                 WHERE request_id = ANY(%(ids)s) AND evento = 'nueva' AND state <> 'error'
+                 UNION
+                SELECT request_id, destino FROM btr_wa_quiet
+                 WHERE request_id = ANY(%(ids)s) AND evento = 'nueva'
+            """, {"ids": [f[0] for f in filas]})
+            cubiertos = defaultdict(set)
+            for request_id, destino in self.env.cr.fetchall():
+                cubiertos[request_id].add(destino)
+            yield [(rid, rid, fecha, "nueva", None, None, cubiertos[rid]) for rid, fecha in filas]
+
+    def _cambios_estado(self, desde, pagina, ventana_sec):
+        """Igual que _creaciones, para los cambios de etapa (mail.tracking.value)."""
+        consulta = """
+            SELECT v.id, m.res_id, m.date, v.old_value_char, v.new_value_char
+              FROM mail_tracking_value v
+              JOIN mail_message m ON m.id = v.mail_message_id
+             WHERE v.id > %s AND v.field = %s AND m.model = 'maintenance.request'
+             ORDER BY v.id
+             LIMIT %s
+        """
+        for filas in self._paginas(consulta, desde, (self._campo_etapa(),), pagina):
+            eventos = [
+                (vid, rid, fecha, "cierre" if es_cierre(nuevo) else "estado", anterior, nuevo)
+                for vid, rid, fecha, anterior, nuevo in filas
+            ]
+            self.env.cr.execute("""
+                WITH t(vid, rid, fecha, evento) AS (
+                    SELECT * FROM unnest(%(vids)s::int[], %(rids)s::int[], %(fechas)s::timestamp[],
+                                         %(eventos)s::varchar[])
+                )
+                SELECT t.vid, o.destino
+                  FROM t
+                  JOIN btr_wa_outbox o
+                    ON o.request_id = t.rid AND o.evento = t.evento AND o.state <> 'error'
+                   AND o.create_date BETWEEN t.fecha - %(ventana)s * interval '1 second'
+                                         AND t.fecha + interval '5 minutes'
+                 UNION
+                SELECT t.vid, q.destino
+                  FROM t
+                  JOIN btr_wa_quiet q
+                    ON q.request_id = t.rid AND q.evento = t.evento
+                   AND q.fecha BETWEEN t.fecha - interval '1 minute' AND t.fecha + interval '5 minutes'
+            """, {"vids": [e[0] for e in eventos], "rids": [e[1] for e in eventos],
+                  "fechas": [e[2] for e in eventos], "eventos": [e[3] for e in eventos],
+                  "ventana": ventana_sec})
+            cubiertos = defaultdict(set)
+            for vid, destino in self.env.cr.fetchall():
+                cubiertos[vid].add(destino)
+            yield [e + (cubiertos[e[0]],) for e in eventos]
+
+    def _errores(self):
+        """[(id OT, fecha, evento, anterior, nuevo, destino)] de los trabajos de
+        aviso que agotaron los reintentos y ninguna recuperación ha cubierto."""
+        self.env.cr.execute("""
+            SELECT request_id, create_date, evento, estados, destino FROM btr_wa_outbox
+             WHERE state = 'error' AND request_id IS NOT NULL AND evento IN ('nueva', 'estado', 'cierre')
+               AND create_date > (now() AT TIME ZONE 'UTC') - %s * interval '1 day'
+             ORDER BY id
+        """, (ERRORES_DIAS,))
+        errores = []
+        for rid, fecha, evento, estados, destino in self.env.cr.fetchall():
+            cadena = (estados or "").split(" → ") if estados else []
+            anterior = cadena[0] if len(cadena) > 1 else None
+            nuevo = cadena[-1] if cadena else (ETAPA_CIERRE.capitalize() if evento == "cierre" else None)
+            errores.append((rid, fecha, evento, anterior, nuevo, destino))
+        return errores
+
+    # ------------------------------ Recuperación -------------------------------
+    def _linea(self, ot, fecha, evento, anterior, nuevo):
+        hora = fields.Datetime.context_timestamp(self, fecha).strftime('%d/%m %H:%M') if fecha else ""
+        if evento == "nueva":
+            return f"{hora} 🆕 #{ot.code} {ot.name or ''}".rstrip()
+        icono = "✅" if evento == "cierre" else "🔄"
+        cadena = f"{anterior} ➡️ {nuevo or '?'}" if anterior else (nuevo or "?")
+        return f"{hora} {icono} #{ot.code} {cadena}"
+
+    @api.model
+    def recuperar(self, pagina=500):
+        """Reconstruye los avisos perdidos desde la marca y los encola agrupados."""
+        cr = self.env.cr
+        marca = self._leer_marca()
+        cr.execute("SELECT COALESCE(MAX(id), 0) FROM maintenance_request")
+        max_ot = cr.fetchone()[0]
+        cr.execute("SELECT COALESCE(MAX(id), 0) FROM mail_tracking_value")
+        max_tracking = cr.fetchone()[0]
+        if marca is None:
+            self._guardar_marca(max_ot, max_tracking)
+            _logger.info("⏪ WA catch-up: marca inicial fijada; no se repasa el histórico.")
+            return 0
+
+        cfg = self.env["btr.wa.helpers"]._wa_config()
+        ventana = cfg["coalesce_sec"] + 60
+        perdidos = []  # (ot id, fecha, evento, anterior, nuevo, destinos ya cubiertos)
+        ultimo_ot, ultimo_tracking = marca
+        # Los avisos desactivados en wa_events no se echan en falta
+        activos = cfg["eventos"]
+        for eventos in self._creaciones(marca[0], pagina):
+            perdidos += [e[1:] for e in eventos if e[3] in activos]
+            ultimo_ot = eventos[-1][0]
+        for eventos in self._cambios_estado(marca[1], pagina, ventana):
+            perdidos += [e[1:] for e in eventos if e[3] in activos]
+            ultimo_tracking = eventos[-1][0]
+
+        errores = [e for e in self._errores() if e[2] in activos]
+        enviados = self._encolar_perdidos(perdidos, cfg, errores) if perdidos or errores else 0
+        self._guardar_marca(max(ultimo_ot, marca[0]), max(ultimo_tracking, marca[1]))
+        if enviados:
+            _logger.warning(f"⏪ WA catch-up: {enviados} avisos perdidos reenviados agrupados.")
+        return enviados
+
+    def _encolar_perdidos(self, perdidos, cfg, errores=()):
+        """`perdidos`: eventos sin aviso, enrutados como estaba la OT entonces.
+        `errores`: trabajos en error (_errores), cada uno a su destino."""
+        ots = self.env["maintenance.request"].browse({p[0] for p in perdidos} | {e[0] for e in errores}).exists()
+        existentes = set(ots.ids)
+        helpers = self.env["btr.wa.helpers"]
+        historial = self._historial(ots.ids) if perdidos else {}
+        pendientes = []  # (fecha, destino, línea)
+        ots_por_destino = defaultdict(set)
+        con_linea = set()
+        for ot_id, fecha, evento, anterior, nuevo, cubiertos in perdidos:
+            if ot_id not in existentes:
+                continue  # OT borrada
+            ot = ots.browse(ot_id)
+            atributos = helpers._wa_atributos(ot)
+            atributos["priority"] = self._valor_en(historial.get((ot_id, "priority"), ()), fecha, ot.priority)
+            if evento == "nueva":
+                atributos["stage"] = self._valor_en(historial.get((ot_id, "stage_id"), ()), fecha, ot.stage_id.name)
+            else:
+                atributos["stage"] = nuevo
+            faltan = cfg["routes"].resolve(atributos) - cubiertos
+            if not faltan:
+                continue
+            linea = self._linea(ot, fecha, evento, anterior, nuevo)
+            for destino in faltan:
+                pendientes.append((fecha, destino, linea))
+                ots_por_destino[destino].add(ot_id)
+                con_linea.add((destino, ot_id, evento))
+        for ot_id, fecha, evento, anterior, nuevo, destino in errores:
+            if ot_id not in existentes or (destino, ot_id, evento) in con_linea:
+                continue
+            con_linea.add((destino, ot_id, evento))
+            pendientes.append((fecha, destino, self._linea(ots.browse(ot_id), fecha, evento, anterior, nuevo)))
+            ots_por_destino[destino].add(ot_id)
+        lineas_por_destino = defaultdict(list)
+        ahora = fields.Datetime.now()
+        for _fecha, destino, linea in sorted(pendientes, key=lambda p: p[0] or ahora):
+            lineas_por_destino[destino].append(linea)
+
+        outbox = self.env["btr.wa.outbox"]
+        plantillas = self.env["btr.wa.template"]
+        vals_list = []
+        for destino, lineas in sorted(lineas_por_destino.items()):
+            n = len(lineas)
+            if n > LINEAS_MAX:
+                lineas = lineas[:LINEAS_MAX] + [f"… y {n - LINEAS_MAX} más"]
+            for i in range(0, len(lineas), LINEAS_MENSAJE):
+                texto = plantillas._render("backlog", {"n": n, "cuerpo": "\n".join(lineas[i:i + LINEAS_MENSAJE])})
+                vals_list.append({
+                    "tipo": "text", "evento": "backlog", "destino": destino,
+                    "texto": texto, "content_hash": content_hash(texto),
+                })
+        jobs = outbox._encolar(vals_list)
+        # Los trabajos en error que este mensaje sustituye dejan de contar como error
+        for destino, ids in ots_por_destino.items():
+            digest = jobs.filtered(lambda j: j.destino == destino)[:1]
+            self.env.cr.execute("""
+                UPDATE btr_wa_outbox SET state = 'merged', digest_id = %s
+                 WHERE state = 'error' AND destino = %s AND request_id = ANY(%s)
+                   AND evento IN ('nueva', 'estado', 'cierre')
+            """, (digest.id, destino, list(ids)))
+        outbox.invalidate_model(["state", "digest_id"])
+        return sum(len(v) for v in lineas_por_destino.values())
+
+    @api.model
+    def _trigger(self):
+        cron = self.env.ref(CRON_XMLID, raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+
+class MaintenanceRequest(models.Model):
+    _inherit = "maintenance.request"
+
+    # Con historial en el chatter la recuperación enruta cada aviso perdido
+    # con la prioridad que tenía la OT en el momento del evento
+    priority = fields.Selection(tracking=True)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+BASE DE RESÚMENES DE OTs - WHATSAPP
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Agregados comunes a los resúmenes diario y semanal (y futuros mensual o
+anual). Se leen de la tabla materializada btr.wa.stats.daily con un solo
+read_group, nunca recorriendo maintenance.request, para que el tiempo no
+crezca con el histórico:
+- OTs creadas, cerradas y horas por empresa, equipo, hotel (categoría) y
+  técnico.
+- OTs pendientes (etapa no final y no archivadas) con su antigüedad por
+  tramos (<1d, 1-3d, 3-7d, >7d), en una única consulta agregada apoyada en
+  los índices que crea init().
+Con reglas wa_routes cada destino recibe su propio resumen, filtrado a las
+empresas/hoteles/equipos de sus reglas, calculado sobre las mismas filas
+agregadas: añadir hoteles o empresas no añade consultas. Los resúmenes se
+encolan en un solo INSERT y la outbox los envía en paralelo por destino
+(`wa_concurrency`).
+-----------------------------------------------------------
+"""
+import logging
+from collections import defaultdict
+
+from odoo import models
+
+from . import wa_metrics as metrics
+
+_logger = logging.getLogger(__name__)
+
+DIMENSIONES = (
+    ("company_id", "🏛 *Por empresa:*", "Sin empresa"),
+    ("maintenance_team_id", "👥 *Por equipo:*", "Sin equipo"),
+    ("category_id", "🏢 *Por hotel:*", "Sin hotel"),
+    ("user_id", "👷 *Por técnico:*", "Sin técnico"),
+)
+
+# Tramos de antigüedad de las OTs pendientes (límite superior en días)
+TRAMOS = (("<1d", 1), ("1-3d", 3), ("3-7d", 7), (">7d", None))
+
+
+class ResumenBase(models.AbstractModel):
+    _name = "btr.wa.resumen"
+    _description = "Agregados comunes de los resúmenes WhatsApp"
+
+    def init(self):
+        # Índices para las búsquedas por fecha y la consulta de pendientes
+        # (etapa abierta + antigüedad): todas por index scan sobre el histórico.
+        # btr_wa_mr_abiertas_idx se rehace si no cubre company_id (la consulta
+        # de pendientes agrupa también por empresa).
+        self.env.cr.execute("""
+            SELECT indexdef NOT LIKE '%company_id%' FROM pg_indexes
+             WHERE indexname = 'btr_wa_mr_abiertas_idx'
+        """)
+        fila = self.env.cr.fetchone()
+        if fila and fila[0]:
+            self.env.cr.execute("DROP INDEX btr_wa_mr_abiertas_idx")
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS btr_wa_mr_create_date_idx ON maintenance_request (create_date);
+            CREATE INDEX IF NOT EXISTS btr_wa_mr_close_date_idx ON maintenance_request (close_date);
+            CREATE INDEX IF NOT EXISTS btr_wa_mr_abiertas_idx
+                ON maintenance_request (stage_id, create_date)
+                INCLUDE (category_id, maintenance_team_id, company_id)
+                WHERE archive IS NOT TRUE;
+        """)
+
+    def _wa_filas(self, fecha_desde, fecha_hasta):
+        """Filas agregadas (empresa, equipo, hotel, técnico) del periodo, en una consulta."""
+        campos = [d[0] for d in DIMENSIONES]
+        with metrics.timer("wa_summary_query_seconds", query="periodo"):
+            # sudo: el resumen cubre todas las empresas, no las del usuario del cron
+            return self.env['btr.wa.stats.daily'].sudo().read_group(
+                [('fecha', '>=', fecha_desde), ('fecha', '<=', fecha_hasta)],
+                campos + ['creadas:sum', 'cerradas:sum', 'horas:sum'], campos, lazy=False)
+
+    def _wa_acumular(self, filas, filtro=None):
+        """Totales y desglose a partir de `filas`, opcionalmente filtradas.
+
+        `filtro(hotel, equipo, empresa)` viene de las reglas wa_routes del destino.
+        Devuelve {"creadas", "cerradas", "horas", "<campo>": {nombre: [creadas, cerradas, horas]}}.
+        """
+        res = {"creadas": 0, "cerradas": 0, "horas": 0.0}
+        for campo, _titulo, _vacio in DIMENSIONES:
+            res[campo] = defaultdict(lambda: [0, 0, 0.0])
+        for fila in filas:
+            if not _incluida(fila, filtro):
+                continue
+            valores = (fila.get('creadas') or 0, fila.get('cerradas') or 0, fila.get('horas') or 0.0)
+            res["creadas"] += valores[0]
+            res["cerradas"] += valores[1]
+            res["horas"] += valores[2]
+            for campo, _titulo, vacio in DIMENSIONES:
+                acumulado = res[campo][_nombre(fila[campo]) or vacio]
+                for i in range(3):
+                    acumulado[i] += valores[i]
+        return res
+
+    def _wa_agregar(self, fecha_desde, fecha_hasta, filtro=None):
+        return self._wa_acumular(self._wa_filas(fecha_desde, fecha_hasta), filtro)
+
+    def _wa_filas_pendientes(self):
+        """OTs pendientes por (empresa, hotel, equipo) con su antigüedad, en una consulta.
+
+        Mismo formato que read_group ('company_id', 'category_id',
+        'maintenance_team_id', '__count') más 'antiguedad': recuento por
+        tramo de TRAMOS.
+        """
+        OT = self.env['maintenance.request']
+        OT.flush_model(['stage_id', 'archive', 'create_date', 'company_id', 'category_id', 'maintenance_team_id'])
+        limites = [dias for _t, dias in TRAMOS if dias]
+        tramos = ", ".join(
+            ["COUNT(*) FILTER (WHERE mr.create_date >= t.ahora - %s * interval '1 day')"]
+            + ["COUNT(*) FILTER (WHERE mr.create_date < t.ahora - %s * interval '1 day'"
+               " AND mr.create_date >= t.ahora - %s * interval '1 day')"] * (len(limites) - 1)
+            + ["COUNT(*) FILTER (WHERE mr.create_date < t.ahora - %s * interval '1 day')"]
+        )
+        params = [limites[0]] + [x for i in range(1, len(limites)) for x in (limites[i - 1], limites[i])] + [limites[-1]]
+        with metrics.timer("wa_summary_query_seconds", query="pendientes"):
+            self.env.cr.execute(f"""
+                SELECT mr.company_id, mr.category_id, mr.maintenance_team_id, COUNT(*), {tramos}
+                  FROM maintenance_request mr, (SELECT now() at time zone 'UTC' AS ahora) AS t
+                 WHERE mr.archive IS NOT TRUE
+                   AND mr.stage_id IN (SELECT id FROM maintenance_stage WHERE done IS NOT TRUE)
+                 GROUP BY mr.company_id, mr.category_id, mr.maintenance_team_id
+            """, params)
+            filas = self.env.cr.fetchall()
+        dims = (('company_id', 'res.company'), ('category_id', 'maintenance.equipment.category'),
+                ('maintenance_team_id', 'maintenance.team'))
+        nombres = [
+            {r.id: r.name for r in self.env[modelo].sudo().browse({f[i] for f in filas if f[i]})}
+            for i, (_campo, modelo) in enumerate(dims)
+        ]
+        resultado = []
+        for f in filas:
+            fila = {campo: (f[i], nombres[i][f[i]]) if f[i] else False for i, (campo, _m) in enumerate(dims)}
+            fila.update({'__count': f[3], 'antiguedad': f[4:]})
+            resultado.append(fila)
+        return resultado
+
+    def _wa_pendientes(self, filas=None, filtro=None):
+        filas = self._wa_filas_pendientes() if filas is None else filas
+        return sum(f['__count'] for f in filas if _incluida(f, filtro))
+
+    def _wa_lineas_desglose(self, agregados, con_creadas=True):
+        """Líneas "• nombre: cerradas (horas) · creadas" por dimensión. El
+        bloque de empresas solo sale si el resumen abarca más de una."""
+        lineas = []
+        for campo, titulo, _vacio in DIMENSIONES:
+            datos = agregados.get(campo)
+            if not datos or (campo == 'company_id' and len(datos) < 2):
+                continue
+            lineas.append(titulo)
+            for nombre in sorted(datos, key=lambda n: (-datos[n][2], n)):
+                creadas, cerradas, horas = datos[nombre]
+                linea = f"  • {nombre}: {cerradas} cerradas ({horas:.2f}h)"
+                if con_creadas:
+                    linea += f" · {creadas} creadas"
+                lineas.append(linea)
+        return lineas
+
+    def _wa_bloque_antiguedad(self, filas, filtro=None):
+        """Campo {antiguedad}: pendientes por tramo de antigüedad, por hotel y equipo."""
+        dimensiones = [d for d in DIMENSIONES if d[0] in ('category_id', 'maintenance_team_id')]
+        por_dim = {campo: defaultdict(lambda: [0] * len(TRAMOS)) for campo, _t, _v in dimensiones}
+        for fila in filas:
+            if not _incluida(fila, filtro):
+                continue
+            for campo, _titulo, vacio in dimensiones:
+                acumulado = por_dim[campo][_nombre(fila[campo]) or vacio]
+                for i, n in enumerate(fila['antiguedad']):
+                    acumulado[i] += n
+        if not any(por_dim.values()):
+            return ""
+        lineas = ["─────────────────────",
+                  f"⏳ *Antigüedad de pendientes* ({' · '.join(t for t, _d in TRAMOS)})"]
+        for campo, titulo, _vacio in dimensiones:
+            datos = por_dim[campo]
+            lineas.append(titulo)
+            for nombre in sorted(datos, key=lambda n: (-datos[n][-1], -sum(datos[n]), n)):
+                lineas.append(f"  • {nombre}: {' · '.join(str(n) for n in datos[nombre])}")
+        return "\n".join(lineas) + "\n"
+
+    def _wa_bloque_desglose(self, agregados, con_creadas=True):
+        """Campo {desglose} de las plantillas: separador + líneas, o vacío."""
+        lineas = self._wa_lineas_desglose(agregados, con_creadas)
+        return "\n".join(["─────────────────────"] + lineas) + "\n" if lineas else ""
+
+    def _wa_enviar_por_destino(self, render):
+        """Encola un resumen por destino de wa_routes (o solo wa_to).
+
+        `render(filtro)` devuelve el texto para un filtro (None = global). Los
+        destinos con el mismo alcance comparten el texto ya renderizado.
+        """
+        helpers = self.env["btr.wa.helpers"]
+        routes = helpers._wa_config()["routes"]
+        outbox = self.env["btr.wa.outbox"]
+        vals_list = []
+        textos = {}
+        for destino in sorted(routes.destinations()):
+            filtro = routes.summary_filter(destino)
+            clave = id(filtro) if filtro else None
+            if clave not in textos:
+                with metrics.timer("wa_render_seconds", evento="resumen"):
+                    textos[clave] = render(filtro)
+            vals = outbox._vals_texto(textos[clave], evento="resumen")
+            vals["destino"] = destino
+            vals_list.append(vals)
+        if not vals_list:
+            _logger.error("WhatsApp: 'wa_to' vacío y sin reglas wa_routes. No se envía el resumen.")
+        outbox._encolar(vals_list)
+
+
+def _nombre(valor_m2o):
+    return valor_m2o[1] if valor_m2o else ""
+
+
+def _incluida(fila, filtro):
+    """¿Entra `fila` en el alcance `filtro` (None = todo)?"""
+    return not filtro or filtro(
+        _nombre(fila['category_id']), _nombre(fila['maintenance_team_id']), _nombre(fila['company_id']))
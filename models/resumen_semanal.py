@@ -11,101 +11,51 @@ Muestra OTs creadas, cerradas, horas y comparativa con la semana anterior.
 
 🔧 Mejoras implementadas:
 1. Migración de Telegram a WhatsApp (mudslide).
-2. Centralización de helper de envío WA.
+2. Centralización de helper de envío WA (btr.wa.helpers en wa_helpers.py).
 3. Comparativa con semana anterior.
 4. Detalle de técnicos y horas.
+5. Lectura de estadísticas diarias materializadas (btr.wa.stats.daily).
+6. Un resumen por destino según wa_routes, encolado en la outbox.
 -----------------------------------------------------------
 """
 
-import logging, os, shlex, subprocess, base64, tempfile
+import logging
 from odoo import models, fields
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 _logger = logging.getLogger(__name__)
 
 
-class WAHelpers(models.AbstractModel):
-    _name = "btr.wa.helpers"
-    _description = "Utilidades WhatsApp (Mudslide)"
-
-    def _load_secrets(self):
-        import yaml
-        module_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-        primary = os.path.join(module_root, "secrets.yaml")
-        fallback = os.path.join(module_root, "secrets.yaml.example")
-        path = primary if os.path.exists(primary) else fallback
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                return yaml.safe_load(f) or {}
-        except Exception as e:
-            _logger.error(f"Error al cargar secrets: {e}")
-            return {}
-
-    def _wa_config(self):
-        s = self._load_secrets()
-        return {
-            "to": s.get("wa_to", ""),
-            "text_cmd": s.get("wa_text_cmd", "mudslide send {to} --text {text}"),
-            "image_cmd": s.get("wa_image_cmd", "mudslide send {to} --image {file}"),
-        }
-
-    def _wa_env(self):
-        env = os.environ.copy()
-        env.setdefault("NODE_OPTIONS", "--max-old-space-size=256")
-        return env
-
-    def _wa_send_text(self, text):
-        cfg = self._wa_config()
-        if not cfg["to"]:
-            _logger.error("WhatsApp: 'wa_to' vacío en secrets.yaml(.example).")
-            return
-        cmd = cfg["text_cmd"].format(to=shlex.quote(cfg["to"]), text=shlex.quote(text))
-        try:
-            res = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=180, env=self._wa_env())
-            if res.returncode != 0:
-                _logger.error(f"WA ERROR ({res.returncode}): {res.stderr}")
-            else:
-                _logger.info("✅ WhatsApp: mensaje enviado.")
-        except Exception as e:
-            _logger.error(f"WA EXC: {e}")
-
-
 class WeeklySummary(models.Model):
     _name = "resumen_semanal"
+    _inherit = "btr.wa.resumen"
     _description = "Resumen semanal de órdenes de trabajo (WhatsApp)"
 
     def enviar_resumen_semanal(self):
-        helpers = self.env["btr.wa.helpers"]
-
         hoy = fields.Date.today()
         inicio_semana = hoy - timedelta(days=hoy.weekday())
         fin_semana = inicio_semana + timedelta(days=6)
         inicio_anterior = inicio_semana - timedelta(days=7)
         fin_anterior = inicio_semana - timedelta(days=1)
 
-        MR = self.env['maintenance.request']
-
-        # Semana actual
-        ots_creadas = MR.search_count([('create_date', '>=', inicio_semana), ('create_date', '<=', fin_semana)])
-        ots_cerradas = MR.search([('close_date', '>=', inicio_semana), ('close_date', '<=', fin_semana)])
-        horas = sum(ot.duration or 0 for ot in ots_cerradas)
-
-        # Semana anterior
-        ots_cerradas_ant = MR.search([('close_date', '>=', inicio_anterior), ('close_date', '<=', fin_anterior)])
-        horas_ant = sum(ot.duration or 0 for ot in ots_cerradas_ant)
-
-        diff_ots = len(ots_cerradas) - len(ots_cerradas_ant)
-        diff_horas = horas - horas_ant
-
-        # Mensaje
-        mensaje = (
-            f"📊 *RESUMEN SEMANAL*\n"
-            f"─────────────────────\n"
-            f"📅 Semana: {inicio_semana.strftime('%d/%m')} - {fin_semana.strftime('%d/%m')}\n"
-            f"✅ OTs creadas: {ots_creadas}\n"
-            f"🛠️ OTs cerradas: {len(ots_cerradas)} ({'+' if diff_ots>=0 else ''}{diff_ots} vs semana ant.)\n"
-            f"⏳ Horas: {horas:.2f}h ({'+' if diff_horas>=0 else ''}{diff_horas:.2f} vs ant.)\n"
-            f"─────────────────────"
-        )
-        helpers._wa_send_text(mensaje)
-
+        # Semana actual y anterior desde las estadísticas diarias (dos consultas en total)
+        filas = self._wa_filas(inicio_semana, fin_semana)
+        filas_ant = self._wa_filas(inicio_anterior, fin_anterior)
+        filas_pendientes = self._wa_filas_pendientes()
+
+        def render(filtro):
+            actual = self._wa_acumular(filas, filtro)
+            anterior = self._wa_acumular(filas_ant, filtro)
+            return self.env['btr.wa.template']._render("resumen_semanal", {
+                "inicio": inicio_semana.strftime('%d/%m'),
+                "fin": fin_semana.strftime('%d/%m'),
+                "creadas": actual['creadas'],
+                "cerradas": actual['cerradas'],
+                "diff_cerradas": actual['cerradas'] - anterior['cerradas'],
+                "horas": actual['horas'],
+                "diff_horas": actual['horas'] - anterior['horas'],
+                "pendientes": self._wa_pendientes(filas_pendientes, filtro),
+                "desglose": self._wa_bloque_desglose(actual, con_creadas=False),
+            })
+
+        self._wa_enviar_por_destino(render)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+AVISOS RETENIDOS EN HORAS DE SILENCIO
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Durante las horas de silencio de un destino (`wa_quiet_hours`, ver
+wa_silencio.py) los avisos de OT no pasan a la outbox: se guarda una línea
+compacta por evento (destino, OT, hotel, equipo, texto corto) y las fotos
+de esas OTs no se suben. Al terminar la ventana sale un único mensaje por
+destino, agrupado por hotel y equipo ("AVISOS DE LA NOCHE"): un envío en
+vez de un proceso de Node por mensaje e imagen.
+
+- Las OTs con prioridad >= `wa_quiet_urgent_priority` ('3', alta) no
+  esperan: se envían al momento como siempre.
+- Solo se retienen avisos de OT (nueva, estado, cierre, reasignación,
+  prioridad y sus imágenes); resúmenes y mensajes agrupados no.
+- El envío lo dispara ir.cron.trigger a la hora de fin de la ventana; el
+  cron horario es solo una red de seguridad.
+- Las líneas enviadas se conservan PURGA_DIAS días: la recuperación de
+  avisos perdidos (recuperacion.py) las cuenta como entregadas.
+-----------------------------------------------------------
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+import pytz
+
+from odoo import models, fields, api
+
+from . import wa_metrics as metrics
+from .recuperacion import LINEAS_MENSAJE
+from .wa_ledger import content_hash
+
+_logger = logging.getLogger(__name__)
+
+CRON_XMLID = "btr_automation_whatsapp.ir_cron_wa_quiet"
+
+# Avisos que se acumulan como línea y adjuntos que se descartan
+EVENTOS_LINEA = ("nueva", "estado", "cierre", "reasignacion", "prioridad")
+EVENTOS_ADJUNTOS = ("imagen", "collage", "adjuntos")
+
+PURGA_DIAS = 2
+
+
+class WAQuiet(models.Model):
+    _name = "btr.wa.quiet"
+    _description = "Avisos WhatsApp retenidos en horas de silencio"
+    _order = "id"
+    _log_access = False
+
+    destino = fields.Char(required=True, index=True)
+    request_id = fields.Many2one("maintenance.request", string="OT", ondelete="cascade", index=True)
+    evento = fields.Char()
+    linea = fields.Char()
+    category_id = fields.Many2one("maintenance.equipment.category", string="Hotel", ondelete="set null")
+    maintenance_team_id = fields.Many2one("maintenance.team", string="Equipo", ondelete="set null")
+    fecha = fields.Datetime(default=fields.Datetime.now)
+    hasta = fields.Datetime(required=True, index=True, help="Fin de la ventana de silencio (UTC).")
+    digest_id = fields.Many2one("btr.wa.outbox", string="Enviado en", ondelete="set null")
+
+    # ------------------------------- Retención ---------------------------------
+    @api.model
+    def _linea(self, ot, vals):
+        evento = vals["evento"]
+        if evento == "nueva":
+            return f"🆕 #{ot.code} {ot.name or ''}".rstrip()
+        if evento == "estado":
+            cadena = (vals.get("estados") or ot.stage_id.name or "?").replace(" → ", " ➡️ ")
+            return f"🔄 #{ot.code} {cadena}"
+        if evento == "cierre":
+            return f"✅ #{ot.code} {ot.stage_id.name or ''} · {ot.user_id.name or 'Sin técnico'}"
+        if evento == "reasignacion":
+            return f"👷 #{ot.code} ➡️ {ot.user_id.name or 'Sin técnico'}"
+        return f"🚨 #{ot.code} ➡️ {ot._wa_etiqueta_prioridad(ot.priority)}"
+
+    @api.model
+    def _retener(self, vals_list, cfg=None):
+        """Separa de `vals_list` (ya repartidos por destino) los avisos de OT
+        de destinos en silencio. Devuelve los que se encolan ahora."""
+        cfg = cfg or self.env["btr.wa.helpers"]._wa_config()
+        quiet = cfg["quiet"]
+        if not quiet:
+            return vals_list
+        ahora = fields.Datetime.now()
+        fines = {}
+        urgente = int(cfg["quiet_urgent_priority"])
+        ots = self.env["maintenance.request"].browse({v["request_id"] for v in vals_list if v.get("request_id")})
+        urgentes = set(ots.filtered(lambda ot: int(ot.priority or 0) >= urgente).ids)
+        salen, retenidos, descartados = [], [], 0
+        for vals in vals_list:
+            evento = vals.get("evento")
+            request_id = vals.get("request_id")
+            if not request_id or request_id in urgentes or evento not in EVENTOS_LINEA + EVENTOS_ADJUNTOS:
+                salen.append(vals)
+                continue
+            destino = vals["destino"]
+            if destino not in fines:
+                fines[destino] = quiet.fin(destino, ahora)
+            if not fines[destino]:
+                salen.append(vals)
+            elif evento in EVENTOS_ADJUNTOS:
+                descartados += 1
+            else:
+                ot = ots.browse(request_id)
+                retenidos.append({
+                    "destino": destino,
+                    "request_id": request_id,
+                    "evento": evento,
+                    "linea": self._linea(ot, vals),
+                    "category_id": ot.category_id.id,
+                    "maintenance_team_id": ot.maintenance_team_id.id,
+                    "fecha": ahora,
+                    "hasta": fines[destino],
+                })
+        if retenidos:
+            # Un disparo del cron por fin de ventana, no uno por aviso
+            hastas = {r["hasta"] for r in retenidos}
+            self.env.cr.execute("SELECT DISTINCT hasta FROM btr_wa_quiet WHERE hasta IN %s AND digest_id IS NULL",
+                                (tuple(hastas),))
+            nuevos = hastas - {r[0] for r in self.env.cr.fetchall()}
+            self.sudo().create(retenidos)
+            cron = self.env.ref(CRON_XMLID, raise_if_not_found=False)
+            if cron and nuevos:
+                cron.sudo()._trigger(sorted(nuevos))
+            metrics.inc("wa_quiet_held_total", len(retenidos), tipo="linea")
+        if descartados:
+            metrics.inc("wa_quiet_held_total", descartados, tipo="adjunto")
+        return salen
+
+    # --------------------------------- Envío -----------------------------------
+    @api.model
+    def vaciar(self):
+        """Envía un mensaje por destino con lo retenido en ventanas ya cerradas."""
+        ahora = fields.Datetime.now()
+        filas = self.sudo().search([("digest_id", "=", False), ("hasta", "<=", ahora)],
+                                   order="destino, category_id, maintenance_team_id, fecha, id")
+        self.sudo().search([("digest_id", "!=", False), ("fecha", "<", ahora - timedelta(days=PURGA_DIAS))]).unlink()
+        if not filas:
+            return 0
+        tz = self.env["btr.wa.helpers"]._wa_config()["quiet"].tz
+        outbox = self.env["btr.wa.outbox"]
+        plantillas = self.env["btr.wa.template"]
+
+        def local(fecha):
+            return pytz.utc.localize(fecha).astimezone(tz)
+
+        por_destino = defaultdict(lambda: self.browse())
+        for fila in filas:
+            por_destino[fila.destino] |= fila
+        for destino, retenidas in sorted(por_destino.items()):
+            lineas = []
+            grupo = None
+            for fila in retenidas:
+                clave = (fila.category_id.name or "Sin hotel", fila.maintenance_team_id.name or "Sin equipo")
+                if clave != grupo:
+                    grupo = clave
+                    lineas.append(f"🏢 *{clave[0]}* · 👥 {clave[1]}")
+                lineas.append(f"  {local(fila.fecha):%H:%M} {fila.linea}")
+            desde = local(min(retenidas.mapped("fecha"))).strftime('%d/%m %H:%M')
+            hasta = local(max(retenidas.mapped("hasta"))).strftime('%d/%m %H:%M')
+            vals_list = []
+            for i in range(0, len(lineas), LINEAS_MENSAJE):
+                texto = plantillas._render("silencio", {
+                    "n": len(retenidas), "desde": desde, "hasta": hasta,
+                    "cuerpo": "\n".join(lineas[i:i + LINEAS_MENSAJE]),
+                })
+                vals_list.append({
+                    "tipo": "text", "evento": "silencio", "destino": destino,
+                    "texto": texto, "content_hash": content_hash(texto),
+                })
+            jobs = outbox._encolar(vals_list)
+            retenidas.write({"digest_id": jobs[:1].id})
+        _logger.info(f"🌙 WA: {len(filas)} avisos retenidos enviados a {len(por_destino)} destino(s).")
+        return len(filas)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+CIRCUIT BREAKER DEL ENVÍO WHATSAPP
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Si mudslide está deslogueado o WhatsApp caído, cada envío esperaba el
+timeout completo y el mensaje se perdía. Ahora:
+- closed: se envía con normalidad. Tras `wa_breaker_threshold` fallos
+  seguidos sin ningún éxito pasa a open. El drenado los cuenta también
+  dentro del lote y deja de enviar en cuanto llega al umbral.
+- open: el drenado no intenta nada (falla rápido, los trabajos siguen
+  pendientes). Pasados `wa_breaker_probe_sec` segundos pasa a half_open.
+- half_open: se envía un único trabajo como sonda. Si sale bien vuelve a
+  closed; si falla, otra vez open.
+
+El estado vive en parámetros del sistema (Ajustes > Técnico > Parámetros
+del sistema, prefijo `btr_wa.breaker_`), así lo ven los administradores y
+lo comparten todos los workers.
+-----------------------------------------------------------
+"""
+import logging
+from datetime import timedelta
+
+from odoo import models, fields
+
+_logger = logging.getLogger(__name__)
+
+PREFIJO = "btr_wa.breaker_"
+
+
+class WABreaker(models.AbstractModel):
+    _name = "btr.wa.breaker"
+    _description = "Circuit breaker del envío WhatsApp"
+
+    def _icp(self):
+        return self.env["ir.config_parameter"].sudo()
+
+    def _leer(self):
+        icp = self._icp()
+        return {
+            "estado": icp.get_param(PREFIJO + "estado", "closed"),
+            "fallos": int(icp.get_param(PREFIJO + "fallos", 0) or 0),
+            "abierto_desde": fields.Datetime.to_datetime(icp.get_param(PREFIJO + "abierto_desde") or None),
+        }
+
+    def _guardar(self, **valores):
+        icp = self._icp()
+        actual = self._leer()
+        for clave, valor in valores.items():
+            if actual.get(clave) != valor:
+                icp.set_param(PREFIJO + clave, fields.Datetime.to_string(valor) if clave == "abierto_desde" else valor)
+
+    def estado(self):
+        """Estado actual para administradores (también visible en parámetros)."""
+        return self._leer()
+
+    def _permitir(self, cfg):
+        """'closed' (envío normal), 'half_open' (una sonda) u 'open' (nada)."""
+        datos = self._leer()
+        if datos["estado"] != "open":
+            return datos["estado"]
+        if fields.Datetime.now() >= self._proxima_sonda(cfg, datos):
+            self._guardar(estado="half_open")
+            _logger.warning("🟡 WA BREAKER: half_open, se envía una sonda.")
+            return "half_open"
+        return "open"
+
+    def _proxima_sonda(self, cfg, datos=None):
+        datos = datos or self._leer()
+        desde = datos["abierto_desde"] or fields.Datetime.now()
+        return desde + timedelta(seconds=cfg["breaker_probe_sec"])
+
+    def _abrir(self, fallos, motivo):
+        self._guardar(estado="open", fallos=fallos, abierto_desde=fields.Datetime.now())
+        _logger.error(f"🔴 WA BREAKER: open tras {fallos} fallos ({motivo}). Envíos en pausa.")
+
+    def _registrar(self, cfg, n_ok, n_fallos, racha=0):
+        """Actualiza el breaker con el resultado de un lote. True si queda abierto.
+
+        `racha`: fallos seguidos al final del lote, después del último
+        éxito (el drenado los cuenta según terminan los envíos).
+        """
+        if not n_ok and not n_fallos:
+            return False
+        datos = self._leer()
+        if datos["estado"] == "half_open":
+            if n_ok:
+                self._guardar(estado="closed", fallos=0)
+                _logger.info("🟢 WA BREAKER: closed, el envío se ha recuperado.")
+                self.env["btr.wa.catchup"]._trigger()
+                return False
+            self._abrir(datos["fallos"] + n_fallos, "sonda fallida")
+            return True
+        # Con algún éxito solo cuentan los fallos posteriores a él
+        fallos = min(racha, n_fallos) if n_ok else datos["fallos"] + n_fallos
+        if fallos >= cfg["breaker_threshold"]:
+            self._abrir(fallos, "fallos consecutivos")
+            return True
+        if fallos != datos["fallos"]:
+            self._guardar(fallos=fallos)
+        return False
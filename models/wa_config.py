@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+CONFIGURACIÓN WHATSAPP (secrets.yaml)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.1
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Punto único de lectura de secrets.yaml (o secrets.yaml.example) y de los
+valores por defecto de la capa de envío. Sustituye a las cuatro copias que
+vivían en aperturaot.py, cierreot.py, resumen_diario.py y resumen_semanal.py.
+La configuración se valida una sola vez y se cachea por proceso hasta que
+cambia el fichero. No depende de Odoo para poder usarse desde tools/.
+-----------------------------------------------------------
+"""
+import logging
+import os
+import re
+import string
+import threading
+
+from . import wa_metrics as metrics
+from .wa_routing import RoutingIndex
+from .wa_silencio import QuietHours
+
+_logger = logging.getLogger(__name__)
+
+BACKENDS = ("command", "sidecar", "http")
+IMAGE_MODES = ("single", "collage")
+EVENTOS = ("nueva", "estado", "cierre", "reasignacion", "prioridad")
+
+DEFAULT_TEXT_CMD = "npx mudslide@latest send {to} {text}"
+DEFAULT_IMAGE_CMD = "npx mudslide@latest send {to} --image {file}"
+DEFAULT_TIMEOUT = 120
+
+# Grupo (1203...@g.us, 34600-1600@g.us), usuario (346...@s.whatsapp.net),
+# número pelado o "me" (el propio número, como en mudslide)
+_JID_RE = re.compile(r"^(me|\d+(-\d+)?@g\.us|\d+@s\.whatsapp\.net|\+?\d{6,15})$")
+
+# Caché por proceso. Cada worker prefork tiene la suya y la invalida por
+# mtime/tamaño del fichero, así que no hace falta coordinación entre
+# procesos; al recargar el registro el módulo Python no se reimporta y la
+# caché sigue siendo válida porque su clave es el propio fichero.
+_cache = (None, None)  # (clave del fichero, config); se sustituye de forma atómica
+_cache_lock = threading.Lock()
+
+
+def module_root():
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def secrets_path():
+    primary = os.path.join(module_root(), "secrets.yaml")
+    fallback = os.path.join(module_root(), "secrets.yaml.example")
+    return primary if os.path.exists(primary) else fallback
+
+
+def load_secrets(path=None):
+    """Lee secrets.yaml (o el .example) desde la raíz del módulo."""
+    import yaml
+    try:
+        with open(path or secrets_path(), "r", encoding="utf-8") as f:
+            return yaml.safe_load(f) or {}
+    except Exception as e:
+        _logger.error(f"Error al cargar secrets: {e}")
+        return {}
+
+
+# ------------------------------- Validación ------------------------------------
+def valid_jid(jid):
+    return bool(_JID_RE.match(str(jid or "").strip()))
+
+
+def _int_positivo(s, clave, defecto):
+    try:
+        valor = int(s.get(clave, defecto))
+        if valor > 0:
+            return valor
+    except (TypeError, ValueError):
+        pass
+    _logger.error(f"WhatsApp config: '{clave}' inválido ({s.get(clave)!r}); se usa {defecto}.")
+    return defecto
+
+
+def _int_no_negativo(s, clave, defecto):
+    try:
+        valor = int(s.get(clave, defecto))
+        if valor >= 0:
+            return valor
+    except (TypeError, ValueError):
+        pass
+    _logger.error(f"WhatsApp config: '{clave}' inválido ({s.get(clave)!r}); se usa {defecto}.")
+    return defecto
+
+
+def _bool(s, clave, defecto):
+    """Booleano de YAML o texto ("true"/"false", "1"/"0", "sí"/"no")."""
+    valor = s.get(clave, defecto)
+    if isinstance(valor, bool):
+        return valor
+    texto = str(valor).strip().lower()
+    if texto in ("true", "1", "yes", "si", "sí", "on"):
+        return True
+    if texto in ("false", "0", "no", "off", ""):
+        return False
+    _logger.error(f"WhatsApp config: '{clave}' inválido ({valor!r}); se usa {defecto}.")
+    return defecto
+
+
+def _plantilla(s, clave, defecto, permitidos):
+    """Comprueba que la plantilla de comando solo usa los huecos permitidos e incluye {to}."""
+    valor = s.get(clave, defecto)
+    try:
+        huecos = {campo for _, campo, _, _ in string.Formatter().parse(valor) if campo is not None}
+    except (TypeError, ValueError) as e:
+        huecos = None
+        _logger.error(f"WhatsApp config: '{clave}' no es una plantilla válida ({e}).")
+    if huecos is not None and "to" in huecos and huecos <= permitidos:
+        return valor
+    _logger.error(f"WhatsApp config: '{clave}' debe usar {sorted(permitidos)}; se usa '{defecto}'.")
+    return defecto
+
+
+def _modo_imagen(s):
+    modo = s.get("wa_image_mode", "single")
+    if modo in IMAGE_MODES:
+        return modo
+    _logger.error(f"WhatsApp config: 'wa_image_mode' desconocido ({modo!r}); se usa 'single'.")
+    return "single"
+
+
+def _eventos(s):
+    """Avisos de OT activos (wa_events); los desconocidos se ignoran."""
+    valor = s.get("wa_events")
+    if valor in (None, ""):
+        return frozenset(EVENTOS)
+    pedidos = [valor] if isinstance(valor, str) else list(valor)
+    desconocidos = [e for e in pedidos if e not in EVENTOS]
+    if desconocidos:
+        _logger.error(f"WhatsApp config: 'wa_events' desconocidos {desconocidos}; válidos: {list(EVENTOS)}.")
+    return frozenset(e for e in pedidos if e in EVENTOS)
+
+
+def _prioridad(s, clave, defecto):
+    valor = str(s.get(clave, defecto))
+    if valor in ("0", "1", "2", "3"):
+        return valor
+    _logger.error(f"WhatsApp config: '{clave}' debe ser '0'..'3' ({valor!r}); se usa '{defecto}'.")
+    return defecto
+
+
+def build_config(s):
+    """Construye y valida la configuración a partir del dict de secrets."""
+    to = str(s.get("wa_to", "") or "").strip()
+    if to and not valid_jid(to):
+        _logger.error(f"WhatsApp config: 'wa_to' no parece un JID válido ({to!r}).")
+    backend = s.get("wa_backend", s.get("wa_mode", "command"))
+    if backend not in BACKENDS:
+        _logger.error(f"WhatsApp config: backend '{backend}' desconocido; se usa 'command'.")
+        backend = "command"
+    return {
+        "to": to,  # ej.: "1203...@g.us"
+        # Reglas wa_routes compiladas (wa_routing.py); sin reglas todo va a wa_to
+        "routes": RoutingIndex(s.get("wa_routes") or [], to, valid_jid),
+        # Avisos de OT que se envían (cambios_ot.py); por defecto todos
+        "eventos": _eventos(s),
+        # Horas de silencio por destino (wa_silencio.py); las OTs con prioridad
+        # >= quiet_urgent_priority no esperan
+        "quiet": QuietHours(s.get("wa_quiet_hours") or {}, s.get("wa_quiet_tz", "Europe/Madrid")),
+        "quiet_urgent_priority": _prioridad(s, "wa_quiet_urgent_priority", "3"),
+        # command (un proceso por envío) | sidecar (sesión persistente) | http (pasarela)
+        "backend": backend,
+        "text_cmd": _plantilla(s, "wa_text_cmd", DEFAULT_TEXT_CMD, {"to", "text"}),
+        "image_cmd": _plantilla(s, "wa_image_cmd", DEFAULT_IMAGE_CMD, {"to", "file"}),
+        "timeout": _int_positivo(s, "wa_timeout_sec", DEFAULT_TIMEOUT),
+        "sidecar_cmd": s.get("wa_sidecar_cmd", f"node {os.path.join(module_root(), 'tools', 'wa_sidecar.js')}"),
+        "sidecar_socket": s.get("wa_sidecar_socket", "/tmp/btr_wa_sidecar.sock"),
+        "http_url": s.get("wa_http_url", "http://127.0.0.1:8787"),
+        "http_token": s.get("wa_http_token", ""),
+        "http_pool_size": _int_positivo(s, "wa_http_pool_size", 4),
+        # Deduplicación de textos en btr.wa.ledger (las imágenes siempre)
+        "dedup_window_min": _int_positivo(s, "wa_dedup_window_min", 60),
+        # Agrupación de cambios de estado y límite de envíos por destino
+        "coalesce_sec": _int_no_negativo(s, "wa_coalesce_sec", 30),
+        "rate_per_min": _int_positivo(s, "wa_rate_per_min", 20),
+        "rate_burst": _int_positivo(s, "wa_rate_burst", 10),
+        # Envío concurrente por destino (wa_dispatch.py)
+        "concurrency": _int_positivo(s, "wa_concurrency", 4),
+        "queue_max": _int_positivo(s, "wa_queue_max", 100),
+        # Reintentos con backoff exponencial + jitter y circuit breaker (wa_breaker.py)
+        "retry_max": _int_positivo(s, "wa_retry_max", 8),
+        "retry_base_sec": _int_positivo(s, "wa_retry_base_sec", 30),
+        "retry_max_sec": _int_positivo(s, "wa_retry_max_sec", 3600),
+        "breaker_threshold": _int_positivo(s, "wa_breaker_threshold", 5),
+        "breaker_probe_sec": _int_positivo(s, "wa_breaker_probe_sec", 300),
+        # Registro de envíos para tools/wa_replay.py (vacío = desactivado)
+        "record_path": str(s.get("wa_record_path", "") or ""),
+        # Endpoint Prometheus /btr_wa/metrics (vacío = desactivado)
+        "metrics_token": str(s.get("wa_metrics_token", "") or ""),
+        # Preprocesado de imágenes (wa_images.py)
+        "image_preprocess": _bool(s, "wa_image_preprocess", True),
+        "image_max_side": _int_positivo(s, "wa_image_max_side", 1600),
+        "image_quality": min(_int_positivo(s, "wa_image_quality", 80), 95),
+        "image_cache_dir": s.get("wa_image_cache_dir", ""),  # vacío = data_dir de Odoo
+        "image_cache_mb": _int_positivo(s, "wa_image_cache_mb", 200),
+        # single (una subida por foto) | collage (una hoja de contactos por OT)
+        "image_mode": _modo_imagen(s),
+        "collage_max_images": _int_positivo(s, "wa_collage_max_images", 12),
+        "collage_max_mb": _int_positivo(s, "wa_collage_max_mb", 25),
+        "collage_tile": _int_positivo(s, "wa_collage_tile", 512),
+    }
+
+
+# -------------------------------- Acceso ---------------------------------------
+def _file_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (path, None, None)
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+def wa_config():
+    """Configuración validada, cacheada por proceso.
+
+    Solo se vuelve a leer y validar el YAML cuando cambia el fichero (ruta,
+    mtime o tamaño); en el camino caliente cuesta un os.stat(). El dict
+    devuelto es compartido: no modificarlo.
+    """
+    global _cache
+    key = _file_key(secrets_path())
+    cached_key, cfg = _cache
+    if cfg is not None and cached_key == key:
+        return cfg
+    with _cache_lock:
+        cached_key, cfg = _cache
+        if cfg is None or cached_key != key:
+            with metrics.timer("wa_config_load_seconds"):
+                cfg = build_config(load_secrets(key[0]) if key[1] is not None else {})
+            _cache = (key, cfg)
+            _logger.info(f"⚙️ WhatsApp: configuración cargada desde {os.path.basename(key[0])}.")
+        return cfg
+
+
+def invalidate():
+    """Fuerza la relectura en el siguiente acceso (p. ej. desde odoo shell)."""
+    global _cache
+    with _cache_lock:
+        _cache = (None, None)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+DESPACHADOR CONCURRENTE DE ENVÍOS WHATSAPP
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Pool de hilos acotado que envía a destinos distintos en paralelo y
+mantiene el orden FIFO dentro de cada destino ("NUEVA OT" antes que sus
+imágenes, "CIERRE DE OT" antes que su lista de "Adjuntos").
+
+Cada destino es un "carril": una cola FIFO que solo un hilo drena a la
+vez. Los carriles se reparten entre `wa_concurrency` hilos. `submit()`
+bloquea cuando hay `wa_queue_max` envíos sin terminar (contrapresión): el
+drenado deja de leer y bloquear filas de la outbox hasta que el pool se
+pone al día.
+
+Solo ejecuta funciones de envío (transporte); nada de ORM ni cursores,
+que no son seguros entre hilos.
+-----------------------------------------------------------
+"""
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+_logger = logging.getLogger(__name__)
+
+
+class WADispatcher:
+
+    def __init__(self, concurrency=4, max_queue=100):
+        self.max_queue = max(1, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="btr_wa")
+        self._cond = threading.Condition()
+        self._carriles = {}
+        self._activos = set()
+        self._en_vuelo = 0
+        self.max_en_vuelo = 0  # pico observado (métricas)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def submit(self, destino, fn, *args):
+        """Encola `fn(*args)` en el carril de `destino`; devuelve un Future."""
+        fut = Future()
+        with self._cond:
+            while self._en_vuelo >= self.max_queue:
+                self._cond.wait()
+            self._carriles.setdefault(destino, deque()).append((fn, args, fut))
+            self._en_vuelo += 1
+            self.max_en_vuelo = max(self.max_en_vuelo, self._en_vuelo)
+            if destino not in self._activos:
+                self._activos.add(destino)
+                self._executor.submit(self._drenar_carril, destino)
+        return fut
+
+    def _drenar_carril(self, destino):
+        while True:
+            with self._cond:
+                carril = self._carriles.get(destino)
+                if not carril:
+                    self._carriles.pop(destino, None)
+                    self._activos.discard(destino)
+                    return
+                fn, args, fut = carril.popleft()
+            try:
+                fut.set_result(fn(*args))
+            except Exception as e:
+                _logger.error(f"WA DISPATCH EXC ({destino}): {e}")
+                fut.set_exception(e)
+            finally:
+                with self._cond:
+                    self._en_vuelo -= 1
+                    self._cond.notify_all()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
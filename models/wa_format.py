@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+FORMATO DE MENSAJES WHATSAPP
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+- `html_a_markdown`: convierte el HTML de `note` al formato de WhatsApp en
+  una sola pasada sobre las etiquetas (antes eran cuatro regex y los `<li>`
+  de varias líneas se perdían). Listas con viñeta o numeradas, saltos de
+  línea, negrita (*), cursiva (_) y tachado (~). Cacheado por contenido.
+- `compilar`: plantillas tipo str.format ("{campo}", "{horas:.2f}")
+  precompiladas a una tupla de segmentos; renderizar es un join.
+No depende de Odoo.
+-----------------------------------------------------------
+"""
+import html
+import re
+import string
+from functools import lru_cache
+
+_TAG_RE = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9]*)\b[^>]*?(/?)>|<!--.*?-->", re.S)
+
+_BLOQUE = {"p", "div", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "tr", "table"}
+_MARCAS = {"b": "*", "strong": "*", "i": "_", "em": "_", "s": "~", "strike": "~", "del": "~"}
+
+
+@lru_cache(maxsize=2048)
+def html_a_markdown(html_text):
+    """HTML de Odoo -> texto con formato WhatsApp, recorriendo las etiquetas una vez."""
+    if not html_text:
+        return ""
+    salida = []
+    listas = []  # pila: None (viñetas) o contador (numeradas)
+
+    def salto():
+        # Como mucho una línea en blanco seguida
+        if salida and not "".join(salida[-2:]).endswith("\n\n"):
+            salida.append("\n")
+
+    pos = 0
+    for m in _TAG_RE.finditer(html_text):
+        _texto(salida, html_text[pos:m.start()], bool(listas))
+        pos = m.end()
+        cierre, tag = m.group(1), (m.group(2) or "").lower()
+        if not tag:
+            continue  # comentario
+        if tag == "br":
+            salida.append("\n")
+        elif tag in ("ul", "ol"):
+            if cierre:
+                listas and listas.pop()
+            else:
+                listas.append(0 if tag == "ol" else None)
+            salto()
+        elif tag == "li" and not cierre:
+            if salida and not salida[-1].endswith("\n"):
+                salida.append("\n")
+            sangria = "  " * max(len(listas) - 1, 0)
+            if listas and listas[-1] is not None:
+                listas[-1] += 1
+                salida.append(f"{sangria}{listas[-1]}. ")
+            else:
+                salida.append(f"{sangria}• ")
+        elif tag in _BLOQUE:
+            salto()
+        elif tag in _MARCAS:
+            salida.append(_MARCAS[tag])
+    _texto(salida, html_text[pos:], bool(listas))
+    return html.unescape("".join(salida)).strip()
+
+
+def _texto(salida, texto, en_lista):
+    """Añade el texto entre dos etiquetas. Dentro de listas los saltos de
+    línea del HTML no cuentan (un <li> de varias líneas es un solo punto)."""
+    if not texto:
+        return
+    if en_lista or not texto.strip():
+        limpio = " ".join(texto.split())
+        if texto[0].isspace() and salida and not salida[-1].endswith((" ", "\n")):
+            limpio = " " + limpio
+        if texto[-1].isspace() and limpio and not limpio.endswith(" "):
+            limpio += " "
+        texto = limpio
+    else:
+        texto = texto.strip("\n")
+    if texto:
+        salida.append(texto)
+
+
+class Plantilla:
+    """Plantilla compilada: tupla de (literal, campo, formato)."""
+
+    __slots__ = ("segmentos", "campos")
+
+    def __init__(self, segmentos):
+        self.segmentos = segmentos
+        self.campos = frozenset(c for _l, c, _f in segmentos if c)
+
+    def render(self, valores):
+        partes = []
+        for literal, campo, formato in self.segmentos:
+            partes.append(literal)
+            if campo:
+                valor = valores.get(campo, "")
+                partes.append(format(valor, formato) if formato else str(valor))
+        return "".join(partes)
+
+
+def compilar(cuerpo, permitidos=None):
+    """Compila `cuerpo`; ValueError si la sintaxis o algún campo no es válido."""
+    segmentos = []
+    for literal, campo, formato, conversion in string.Formatter().parse(cuerpo or ""):
+        if conversion:
+            raise ValueError(f"Conversión !{conversion} no permitida en {{{campo}}}.")
+        if campo is not None and not campo.isidentifier():
+            raise ValueError(f"Campo no válido: {{{campo}}}.")
+        if campo and permitidos is not None and campo not in permitidos:
+            raise ValueError(f"Campo desconocido: {{{campo}}}. Disponibles: {', '.join(sorted(permitidos))}.")
+        segmentos.append((literal, campo, formato or ""))
+    return Plantilla(tuple(segmentos))
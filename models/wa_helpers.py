@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+UTILIDADES WHATSAPP (btr.wa.helpers)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 2.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Única definición del AbstractModel `btr.wa.helpers` (antes duplicado en
+resumen_diario.py y resumen_semanal.py con valores por defecto distintos).
+Todos los modelos envían a través de aquí; el backend concreto lo decide
+`wa_backend` en secrets.yaml (ver wa_transport.py).
+Los adjuntos se envían directamente desde el filestore (store_fname), sin
+decodificar base64 ni copiar los bytes a /tmp, y las imágenes pasan por la
+caché de versiones reducidas de wa_images.py (clave: checksum).
+-----------------------------------------------------------
+"""
+import base64
+import logging
+import mimetypes
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from odoo import models
+from odoo.tools import config as odoo_config
+
+from . import wa_metrics as metrics
+from .wa_config import wa_config
+from .wa_images import collage, get_cache as get_rendition_cache
+from .wa_transport import get_transport
+
+_logger = logging.getLogger(__name__)
+
+
+class WAHelpers(models.AbstractModel):
+    _name = "btr.wa.helpers"
+    _description = "Utilidades WhatsApp (Mudslide)"
+
+    def _wa_config(self):
+        """Acceso compartido a la configuración (cacheada y validada en wa_config.py)."""
+        return wa_config()
+
+    def _wa_atributos(self, ot):
+        """Atributos de enrutado de una OT (dimensiones de wa_routing.py)."""
+        return {
+            "company": ot.company_id.name,
+            "hotel": ot.category_id.name,
+            "team": ot.maintenance_team_id.name,
+            "stage": ot.stage_id.name,
+            "priority": ot.priority,
+        }
+
+    def _wa_destinos(self, requests, cfg=None):
+        """{id OT: {destinos}} según las reglas wa_routes (o wa_to)."""
+        routes = (cfg or self._wa_config())["routes"]
+        return {ot.id: routes.resolve(self._wa_atributos(ot)) for ot in requests}
+
+    def _wa_transport(self, cfg=None):
+        return get_transport(cfg or self._wa_config())
+
+    def _wa_send_text(self, text, to=None):
+        cfg = self._wa_config()
+        to = to or cfg["to"]
+        if not to:
+            _logger.error("WhatsApp: 'wa_to' vacío en secrets.yaml(.example).")
+            return False
+        return self._wa_transport(cfg).send_text(to, text)
+
+    def _wa_send_image_bytes(self, filename, data_b64, to=None):
+        cfg = self._wa_config()
+        to = to or cfg["to"]
+        if not to:
+            _logger.error("WhatsApp: 'wa_to' vacío en secrets.yaml(.example).")
+            return False
+        tmp_path = None
+        try:
+            ext = os.path.splitext(filename or '')[1] or ".jpg"
+            with metrics.timer("wa_attachment_seconds", etapa="decode"), \
+                    tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
+                tmp_path = tmp.name
+                tmp.write(base64.b64decode(data_b64))
+            return self._wa_transport(cfg).send_image(to, tmp_path, filename)
+        except Exception as e:
+            _logger.error(f"WA IMG EXC: {e}")
+            return False
+        finally:
+            if tmp_path:
+                os.unlink(tmp_path)
+
+    # ----------------------------- Adjuntos ------------------------------------
+    @contextmanager
+    def _wa_attachment_path(self, attachment):
+        """Ruta en disco del adjunto, sin pasar por base64 ni copiar bytes.
+
+        - En el filestore: enlace simbólico con la extensión correcta (mudslide
+          y la pasarela deducen el tipo por el nombre) apuntando a store_fname.
+        - En base de datos: se vuelca `raw` a un temporal.
+        Todo lo creado se borra al salir del bloque.
+        """
+        att = attachment.sudo()
+        ext = os.path.splitext(att.name or '')[1] or mimetypes.guess_extension(att.mimetype or '') or ".jpg"
+        tmpdir = tempfile.mkdtemp(prefix="btr_wa_")
+        try:
+            path = os.path.join(tmpdir, f"{att.id}{ext}")
+            with metrics.timer("wa_attachment_seconds", etapa="filestore" if att.store_fname else "db"):
+                if att.store_fname:
+                    os.symlink(att._full_path(att.store_fname), path)
+                else:
+                    with open(path, "wb") as f:
+                        f.write(att.raw or b"")
+            yield path
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def _wa_rendition(self, attachment, cfg):
+        """Versión reducida y sin EXIF del adjunto, desde la caché por checksum.
+
+        Devuelve None si el preprocesado está desactivado o no es posible
+        (sin checksum, no es imagen, Pillow falla ahora o ya falló con ese
+        checksum); entonces se envía el original.
+        """
+        att = attachment.sudo()
+        if not cfg["image_preprocess"] or not att.checksum or not (att.mimetype or "").startswith("image/"):
+            return None
+        directory = cfg["image_cache_dir"] or os.path.join(odoo_config["data_dir"], "btr_wa_renditions")
+        cache = get_rendition_cache(directory, cfg["image_cache_mb"] * 1024 * 1024,
+                                    cfg["image_max_side"], cfg["image_quality"])
+        if cache.fallido(att.checksum):
+            metrics.inc("wa_rendition_cache_total", result="failed")
+            return None
+        path = cache.lookup(att.checksum)
+        metrics.inc("wa_rendition_cache_total", result="hit" if path else "miss")
+        if path:
+            return path
+        with self._wa_attachment_path(att) as src, metrics.timer("wa_attachment_seconds", etapa="transcode"):
+            return cache.put(att.checksum, src)
+
+    @contextmanager
+    def _wa_preparar_imagen(self, attachment, cfg=None):
+        """(ruta, nombre) listos para el transporte: la versión reducida si la
+        hay, si no el original. Se resuelve aquí (ORM) para que el envío pueda
+        hacerse después en otro hilo sin tocar la base de datos."""
+        cfg = cfg or self._wa_config()
+        rendition = self._wa_rendition(attachment, cfg)
+        if rendition:
+            yield rendition, os.path.splitext(attachment.name or "imagen")[0] + ".jpg"
+            return
+        with self._wa_attachment_path(attachment) as path:
+            yield path, attachment.name
+
+    @contextmanager
+    def _wa_preparar_collage(self, attachments, cfg=None):
+        """(ruta, nombre) de una hoja de contactos con todas las imágenes.
+
+        Parte de las versiones reducidas de la caché, así que componerla solo
+        cuesta decodificar fotos ya pequeñas; el collage se borra al salir.
+        """
+        cfg = cfg or self._wa_config()
+        with ExitStack() as stack:
+            rutas = [stack.enter_context(self._wa_preparar_imagen(adj, cfg))[0] for adj in attachments]
+            tmpdir = tempfile.mkdtemp(prefix="btr_wa_")
+            stack.callback(shutil.rmtree, tmpdir, ignore_errors=True)
+            path = os.path.join(tmpdir, f"fotos_{len(rutas)}.jpg")
+            with metrics.timer("wa_attachment_seconds", etapa="collage"):
+                collage(rutas, path, cfg["collage_tile"], cfg["image_max_side"], cfg["image_quality"])
+            yield path, os.path.basename(path)
+
+    def _wa_send_attachment(self, attachment, to=None):
+        cfg = self._wa_config()
+        to = to or cfg["to"]
+        if not to:
+            _logger.error("WhatsApp: 'wa_to' vacío en secrets.yaml(.example).")
+            return False
+        try:
+            with self._wa_preparar_imagen(attachment, cfg) as (path, filename):
+                return self._wa_transport(cfg).send_image(to, path, filename)
+        except Exception as e:
+            _logger.error(f"WA IMG EXC: {e}")
+            return False
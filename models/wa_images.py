@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+PREPROCESADO DE IMÁGENES PARA WHATSAPP
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Las fotos de los técnicos llegan a resolución completa. Antes de enviarlas
+se reducen (lado mayor `wa_image_max_side`), se reorientan según EXIF, se
+recodifican a JPEG y se eliminan los metadatos EXIF.
+
+El resultado se guarda en disco con clave `ir.attachment.checksum`, así
+cada original se transcodifica una sola vez aunque se envíe en la apertura
+y otra vez en el cierre. La caché expulsa por LRU (mtime) cuando supera
+`wa_image_cache_mb`. La escritura es atómica (os.replace), por lo que
+varios workers prefork pueden compartir el directorio. Los originales que
+no se pueden transcodificar se recuerdan (por checksum, en memoria del
+proceso) y se envían tal cual sin volver a intentarlo en cada envío.
+
+`collage` junta las fotos de una OT en una sola hoja de contactos
+(`wa_image_mode: collage`): una subida y un mensaje en vez de uno por foto.
+-----------------------------------------------------------
+"""
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+# No se expulsan entradas usadas hace menos de esto: pueden estar enviándose
+EVICT_GRACE_SEC = 120
+
+
+def _a_rgb(img):
+    """RGB/L listo para JPEG; la transparencia se aplana sobre blanco."""
+    from PIL import Image
+    if img.mode in ("RGB", "L"):
+        return img
+    fondo = Image.new("RGB", img.size, (255, 255, 255))
+    if img.mode in ("RGBA", "LA") or "transparency" in img.info:
+        rgba = img.convert("RGBA")
+        fondo.paste(rgba, mask=rgba.split()[-1])
+    else:
+        fondo.paste(img.convert("RGB"))
+    return fondo
+
+
+def transcode(src, dst, max_side=1600, quality=80):
+    """Reduce, reorienta y recodifica `src` a JPEG sin EXIF en `dst`."""
+    from PIL import Image, ImageOps
+    with Image.open(src) as img:
+        img = _a_rgb(ImageOps.exif_transpose(img))
+        img.thumbnail((max_side, max_side))
+        # Sin exif=...: PIL no copia metadatos al guardar
+        img.save(dst, "JPEG", quality=quality, optimize=True, progressive=True)
+
+
+def collage(srcs, dst, tile=512, max_side=1600, quality=80, margen=8):
+    """Hoja de contactos JPEG con `srcs` en cuadrícula casi cuadrada.
+
+    Cada foto se reduce a la celda (`tile`, limitada para que el lado del
+    collage no pase de `max_side`) conservando proporción y centrada.
+    """
+    from PIL import Image, ImageOps
+    cols = math.ceil(math.sqrt(len(srcs)))
+    filas = math.ceil(len(srcs) / cols)
+    tile = max(64, min(tile, (max_side - margen * (cols + 1)) // cols))
+    lienzo = Image.new("RGB", (cols * tile + margen * (cols + 1), filas * tile + margen * (filas + 1)),
+                       (255, 255, 255))
+    for i, src in enumerate(srcs):
+        with Image.open(src) as img:
+            img.draft("RGB", (tile, tile))  # JPEG: decodifica ya reducido
+            img = _a_rgb(ImageOps.exif_transpose(img))
+            img.thumbnail((tile, tile))
+            fila, col = divmod(i, cols)
+            x = margen + col * (tile + margen) + (tile - img.width) // 2
+            y = margen + fila * (tile + margen) + (tile - img.height) // 2
+            lienzo.paste(img, (x, y))
+    lienzo.save(dst, "JPEG", quality=quality, optimize=True, progressive=True)
+
+
+class RenditionCache:
+    """Caché en disco de versiones listas para WhatsApp, clave = checksum."""
+
+    def __init__(self, directory, max_bytes, max_side=1600, quality=80):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_side = max_side
+        self.quality = quality
+        self._lock = threading.Lock()
+        self._fallidos = set()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, checksum):
+        return os.path.join(self.directory, f"{checksum}-{self.max_side}q{self.quality}.jpg")
+
+    def lookup(self, checksum):
+        path = self._path(checksum)
+        try:
+            os.utime(path)  # marca de uso para el LRU
+        except OSError:
+            return None
+        return path
+
+    def fallido(self, checksum):
+        """True si `checksum` ya falló al transcodificarse en este proceso."""
+        return checksum in self._fallidos
+
+    def put(self, checksum, src):
+        """Transcodifica `src` y lo guarda. Devuelve la ruta o None si falla."""
+        if checksum in self._fallidos:
+            return None
+        path = self._path(checksum)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        os.close(fd)
+        try:
+            transcode(src, tmp, self.max_side, self.quality)
+            os.replace(tmp, path)
+        except Exception as e:
+            _logger.warning(f"WA IMG: no se pudo preprocesar la imagen ({e}); se envía el original.")
+            with self._lock:
+                self._fallidos.add(checksum)
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return None
+        self.evict()
+        return path
+
+    def evict(self):
+        """Borra las entradas menos usadas hasta quedar bajo max_bytes."""
+        with self._lock:
+            entradas = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(".jpg"):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entradas.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+            if total <= self.max_bytes:
+                return
+            limite_gracia = time.time() - EVICT_GRACE_SEC
+            for mtime, size, path in sorted(entradas):
+                if total <= self.max_bytes or mtime > limite_gracia:
+                    break
+                try:
+                    os.unlink(path)
+                    total -= size
+                except OSError:
+                    pass
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(directory, max_bytes, max_side=1600, quality=80):
+    key = (directory, max_bytes, max_side, quality)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = RenditionCache(directory, max_bytes, max_side, quality)
+        return cache
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+REGISTRO DE ENTREGAS WHATSAPP (LEDGER)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Guarda qué se ha enviado ya, con clave (destino, OT, hash de contenido).
+El drenado de la outbox lo consulta antes de cada envío (búsqueda por
+índice único, O(1)) y descarta duplicados exactos: la misma foto enviada
+en la apertura no se vuelve a subir en el cierre, y una transacción
+reintentada o un doble write no repiten el mensaje. Las imágenes se
+deduplican siempre; los textos dentro de `wa_dedup_window_min` minutos, y
+pasada esa ventana el autovacuum diario borra sus entradas (las de
+imágenes se conservan).
+-----------------------------------------------------------
+"""
+import hashlib
+import logging
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+
+def content_hash(contenido):
+    """sha256 hex de un texto o de una clave de contenido."""
+    return hashlib.sha256((contenido or "").encode("utf-8")).hexdigest()
+
+
+class WALedger(models.Model):
+    _name = "btr.wa.ledger"
+    _description = "Registro de envíos WhatsApp"
+    _order = "id desc"
+    _log_access = False
+
+    destino = fields.Char(required=True)
+    request_id = fields.Many2one("maintenance.request", string="OT", ondelete="cascade")
+    content_hash = fields.Char(required=True)
+    tipo = fields.Char(help="text, image o collage (tipo del trabajo enviado).")
+    fecha = fields.Datetime(default=fields.Datetime.now)
+
+    _sql_constraints = [
+        ("btr_wa_ledger_uniq", "unique(destino, request_id, content_hash)",
+         "Este contenido ya se envió a ese destino para esta OT."),
+    ]
+
+    @api.autovacuum
+    def _gc_textos(self):
+        """Los textos solo se deduplican dentro de la ventana: fuera sobran."""
+        ventana = self.env["btr.wa.helpers"]._wa_config()["dedup_window_min"]
+        self.env.cr.execute("""
+            DELETE FROM btr_wa_ledger
+             WHERE tipo = 'text' AND fecha < (now() at time zone 'UTC') - make_interval(mins => %s)
+        """, (ventana,))
+        if self.env.cr.rowcount:
+            _logger.info(f"🧹 Ledger WA: {self.env.cr.rowcount} entradas de texto purgadas.")
+            self.invalidate_model()
+
+    @api.model
+    def _ya_enviado(self, destino, request_id, chash, ventana_min=None):
+        """True si ya se envió. Con `ventana_min` solo cuentan los envíos
+        recientes (los textos pueden repetirse legítimamente más adelante)."""
+        if not request_id or not chash:
+            return False
+        consulta = """
+            SELECT 1 FROM btr_wa_ledger
+             WHERE destino = %s AND request_id = %s AND content_hash = %s
+        """
+        params = [destino, request_id, chash]
+        if ventana_min:
+            consulta += " AND fecha >= (now() at time zone 'UTC') - make_interval(mins => %s)"
+            params.append(ventana_min)
+        self.env.cr.execute(consulta, params)
+        return bool(self.env.cr.fetchone())
+
+    @api.model
+    def _registrar(self, destino, request_id, chash, tipo=None):
+        if not request_id or not chash:
+            return
+        self.env.cr.execute("""
+            INSERT INTO btr_wa_ledger (destino, request_id, content_hash, tipo, fecha)
+            VALUES (%s, %s, %s, %s, now() at time zone 'UTC')
+            ON CONFLICT (destino, request_id, content_hash)
+            DO UPDATE SET fecha = EXCLUDED.fecha, tipo = COALESCE(EXCLUDED.tipo, btr_wa_ledger.tipo)
+        """, (destino, request_id, chash, tipo))
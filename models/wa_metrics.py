@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+MÉTRICAS DEL ENVÍO WHATSAPP (REGISTRO EN PROCESO)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Contadores y temporizadores baratos (un dict y un lock) alrededor de cada
+etapa: carga de config, renderizado, lectura/preprocesado de adjuntos,
+arranque y espera del proceso mudslide, bytes enviados, fallos por código
+de salida y consultas de los resúmenes.
+
+Cada proceso acumula en memoria y vuelca los incrementos cada
+`FLUSH_INTERVAL_SEC` a `btr.wa.metrics.hourly` (rollup por hora), que
+suma los de todos los workers. El endpoint Prometheus (controllers/)
+se sirve desde esa tabla. No depende de Odoo.
+-----------------------------------------------------------
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+FLUSH_INTERVAL_SEC = 60
+
+
+def _etiquetas(labels):
+    """Forma canónica de las etiquetas: "k1=v1,k2=v2" ordenado."""
+    return ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+
+
+class Registry:
+    """Contadores {(nombre, etiquetas): valor} y temporizadores
+    {(nombre, etiquetas): [n, suma, máximo]}."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores = defaultdict(float)
+        self._tiempos = {}
+        self._ultimo_volcado = time.monotonic()
+
+    def inc(self, nombre, valor=1, **labels):
+        with self._lock:
+            self._contadores[(nombre, _etiquetas(labels))] += valor
+
+    def observe(self, nombre, segundos, **labels):
+        clave = (nombre, _etiquetas(labels))
+        with self._lock:
+            t = self._tiempos.get(clave)
+            if t is None:
+                self._tiempos[clave] = [1, segundos, segundos]
+            else:
+                t[0] += 1
+                t[1] += segundos
+                t[2] = max(t[2], segundos)
+
+    @contextmanager
+    def timer(self, nombre, **labels):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(nombre, time.perf_counter() - inicio, **labels)
+
+    def flush_due(self):
+        return time.monotonic() - self._ultimo_volcado >= FLUSH_INTERVAL_SEC
+
+    def drain(self):
+        """Devuelve y pone a cero lo acumulado desde el último volcado."""
+        with self._lock:
+            contadores, tiempos = dict(self._contadores), self._tiempos
+            self._contadores = defaultdict(float)
+            self._tiempos = {}
+            self._ultimo_volcado = time.monotonic()
+        return contadores, tiempos
+
+    def restore(self, contadores, tiempos):
+        """Reincorpora un volcado que no se pudo guardar."""
+        for (nombre, etiquetas), valor in contadores.items():
+            with self._lock:
+                self._contadores[(nombre, etiquetas)] += valor
+        for clave, (n, suma, maximo) in tiempos.items():
+            with self._lock:
+                t = self._tiempos.setdefault(clave, [0, 0.0, 0.0])
+                t[0] += n
+                t[1] += suma
+                t[2] = max(t[2], maximo)
+
+
+REGISTRY = Registry()
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+timer = REGISTRY.timer
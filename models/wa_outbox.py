@@ -0,0 +1,602 @@
+# -*- coding: utf-8 -*-
+"""
+COLA DE ENVÍOS WHATSAPP (OUTBOX TRANSACCIONAL)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Los hooks de create/write de maintenance.request ya no envían a WhatsApp
+directamente: encolan trabajos (texto o imagen) en esta tabla dentro de la
+misma transacción. Un cron drena la cola por lotes una vez confirmada la
+transacción, de modo que:
+- crear o cerrar una OT cuesta un INSERT, no N procesos de Node;
+- si la transacción hace rollback, los trabajos desaparecen con ella y no
+  se envían alertas fantasma.
+
+Además, para no inundar el grupo ni provocar bloqueos de WhatsApp:
+- Los cambios de estado de una misma OT dentro de `wa_coalesce_sec` se
+  funden en un único mensaje ("Nuevo → En curso → Pendiente material").
+  Si la OT encola otro aviso (cierre, imágenes...) el de estado sale ya,
+  por delante de él.
+- Cada destino tiene un token bucket (`wa_rate_per_min`, `wa_rate_burst`;
+  ver wa_ratelimit.py) reconstruido desde sus últimos envíos en esta tabla,
+  así el límite es el configurado aunque drenen varios workers. Lo que
+  desborda no se descarta: los textos en espera se agrupan en un único
+  mensaje resumen que sale con el siguiente token disponible.
+- El envío es concurrente entre destinos y FIFO dentro de cada destino
+  (`wa_concurrency`, `wa_queue_max`; ver wa_dispatch.py).
+- Un envío fallido no se pierde: sigue pendiente y se reprograma con
+  backoff exponencial y jitter hasta `wa_retry_max` intentos. Mientras
+  espera, lo que va detrás para el mismo destino también espera (FIFO).
+  Si fallan muchos seguidos, el circuit breaker (wa_breaker.py) pausa el
+  drenado.
+-----------------------------------------------------------
+"""
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack
+from datetime import timedelta, timezone
+
+from odoo import models, fields, api
+
+from . import wa_metrics as metrics
+from .wa_dispatch import WADispatcher
+from .wa_ledger import content_hash
+from .wa_ratelimit import TokenBucket
+
+_logger = logging.getLogger(__name__)
+
+CRON_XMLID = "btr_automation_whatsapp.ir_cron_wa_outbox"
+
+# Máximo de avisos por mensaje resumen (límite práctico de longitud en WhatsApp)
+DIGEST_MAX = 40
+
+# Días que se conservan los trabajos terminados (enviados, duplicados y
+# agrupados, con su texto) y los que acabaron en error
+PURGA_DIAS = 7
+PURGA_ERROR_DIAS = 30
+
+
+def _backoff(intentos, cfg):
+    """Segundos hasta el reintento nº `intentos`: exponencial con tope y
+    jitter ("equal jitter": entre la mitad y el total), para que los
+    trabajos que fallaron juntos no reintenten a la vez."""
+    espera = min(cfg["retry_max_sec"], cfg["retry_base_sec"] * 2 ** max(0, intentos - 1))
+    return espera / 2 + random.uniform(0, espera / 2)
+
+
+class WAOutbox(models.Model):
+    _name = "btr.wa.outbox"
+    _description = "Cola de envíos WhatsApp (outbox)"
+    _order = "id"
+
+    tipo = fields.Selection(
+        [("text", "Texto"), ("image", "Imagen"), ("collage", "Collage")],
+        required=True, default="text",
+    )
+    evento = fields.Char(help="nueva, estado, cierre, adjuntos, digest...")
+    destino = fields.Char(required=True)
+    texto = fields.Text()
+    attachment_id = fields.Many2one("ir.attachment", ondelete="cascade")
+    attachment_ids = fields.Many2many(
+        "ir.attachment", "btr_wa_outbox_attachment_rel", "job_id", "attachment_id",
+        string="Imágenes del collage",
+    )
+    request_id = fields.Many2one("maintenance.request", string="OT", ondelete="set null", index=True)
+    state = fields.Selection(
+        [("pending", "Pendiente"), ("sent", "Enviado"), ("duplicate", "Duplicado"),
+         ("merged", "Agrupado"), ("error", "Error")],
+        required=True, default="pending", index=True,
+    )
+    fecha_programada = fields.Datetime(help="No se envía antes de esta fecha (ventana de agrupación).")
+    estados = fields.Char(help="Cadena de estados agrupados de la OT.")
+    digest_id = fields.Many2one("btr.wa.outbox", string="Resumen", ondelete="set null")
+    content_hash = fields.Char(help="Clave de deduplicación en btr.wa.ledger.")
+    intentos = fields.Integer(default=0)
+    ultimo_error = fields.Char()
+    fecha_envio = fields.Datetime()
+
+    def init(self):
+        # Historial reciente de envíos por destino (token bucket)
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS btr_wa_outbox_enviados_idx
+                ON btr_wa_outbox (destino, fecha_envio) WHERE state = 'sent'
+        """)
+        # Pendientes por destino (lote y reintentos que bloquean su carril)
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS btr_wa_outbox_pendientes_idx
+                ON btr_wa_outbox (destino, id) WHERE state = 'pending'
+        """)
+
+    @api.autovacuum
+    def _gc_terminados(self):
+        """Borra los trabajos terminados pasados PURGA_DIAS días (PURGA_ERROR_DIAS
+        los de error, que se revisan a mano). Los pendientes nunca."""
+        self.env.cr.execute("""
+            DELETE FROM btr_wa_outbox
+             WHERE (state IN ('sent', 'duplicate', 'merged')
+                    AND create_date < (now() at time zone 'UTC') - %s * interval '1 day')
+                OR (state = 'error'
+                    AND create_date < (now() at time zone 'UTC') - %s * interval '1 day')
+        """, (PURGA_DIAS, PURGA_ERROR_DIAS))
+        if self.env.cr.rowcount:
+            _logger.info(f"🧹 Outbox WA: {self.env.cr.rowcount} trabajos terminados purgados.")
+            self.invalidate_model()
+
+    # ------------------------------ Encolado -----------------------------------
+    @api.model
+    def _vals_texto(self, texto, request=None, clave=None, evento=None):
+        """`clave` sustituye al texto como base del hash cuando el mensaje
+        lleva partes volátiles (p. ej. la fecha de notificación)."""
+        return {
+            "tipo": "text",
+            "evento": evento,
+            "texto": texto,
+            "request_id": request.id if request else False,
+            "content_hash": content_hash(clave or texto),
+        }
+
+    @api.model
+    def _vals_imagenes(self, adjuntos, request=None):
+        return [{
+            "tipo": "image",
+            "evento": "imagen",
+            "attachment_id": adj.id,
+            "request_id": request.id if request else adj.res_id,
+            "content_hash": content_hash(f"img:{adj.checksum or adj.id}"),
+        } for adj in adjuntos]
+
+    @api.model
+    def _vals_imagenes_ot(self, adjuntos, request, base_url=None):
+        """Imágenes de una OT según `wa_image_mode`.
+
+        - single: un trabajo por imagen.
+        - collage: un único trabajo con todas (hoja de contactos). Si superan
+          `wa_collage_max_images` o `wa_collage_max_mb` no se sube ninguna: con
+          `base_url` se encola la lista de enlaces; sin él (cierre) el llamador
+          ya los incluye en su texto de "Adjuntos".
+        """
+        cfg = self.env["btr.wa.helpers"]._wa_config()
+        if cfg["image_mode"] != "collage" or len(adjuntos) < 2:
+            return self._vals_imagenes(adjuntos, request)
+        if (len(adjuntos) > cfg["collage_max_images"]
+                or sum(adjuntos.mapped("file_size")) > cfg["collage_max_mb"] * 1024 * 1024):
+            _logger.info(f"WA OUTBOX: {len(adjuntos)} imágenes de la OT {request.code} superan el límite del "
+                         f"collage; se envían como enlaces.")
+            if not base_url:
+                return []
+            texto = self.env["btr.wa.template"]._render("ot_adjuntos", {
+                "code": request.code,
+                "enlaces": "\n".join(f"🖼 {adj.name}: {base_url}/web/content/{adj.id}" for adj in adjuntos),
+            })
+            return [self._vals_texto(texto, request, evento="adjuntos")]
+        checksums = sorted(adj.checksum or str(adj.id) for adj in adjuntos)
+        return [{
+            "tipo": "collage",
+            "evento": "collage",
+            "attachment_ids": [(6, 0, adjuntos.ids)],
+            "request_id": request.id,
+            "content_hash": content_hash("collage:" + ",".join(checksums)),
+        }]
+
+    def _trigger_cron(self, at=None):
+        cron = self.env.ref(CRON_XMLID, raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger(at)
+
+    @api.model
+    def _repartir(self, vals_list):
+        """Asigna destino a los trabajos que no lo traen (fan-out por wa_routes).
+
+        El texto ya viene renderizado: cada destino recibe una copia de los
+        mismos vals, en el mismo orden, así el orden por destino se conserva.
+        """
+        helpers = self.env["btr.wa.helpers"]
+        cfg = helpers._wa_config()
+        ots = self.env["maintenance.request"].browse(
+            {v["request_id"] for v in vals_list if v.get("request_id") and not v.get("destino")})
+        destinos_por_ot = helpers._wa_destinos(ots, cfg) if ots else {}
+        repartidos = []
+        for vals in vals_list:
+            if vals.get("destino"):
+                repartidos.append(vals)
+                continue
+            destinos = destinos_por_ot.get(vals.get("request_id")) or ({cfg["to"]} if cfg["to"] else set())
+            if not destinos:
+                _logger.error("WhatsApp: 'wa_to' vacío y sin reglas que casen. No se encola el aviso.")
+            for destino in sorted(destinos):
+                repartidos.append(dict(vals, destino=destino))
+        return repartidos
+
+    @api.model
+    def _encolar(self, vals_list):
+        """Crea los trabajos en la transacción actual (un único INSERT
+        multi-fila) y despierta al cron.
+
+        El disparo del cron (ir.cron.trigger) también es transaccional: si la
+        transacción se revierte, no queda ni el trabajo ni el disparo. Los
+        avisos de OT para destinos en horas de silencio se quedan en
+        btr.wa.quiet (silencio.py).
+        """
+        vals_list = self.env["btr.wa.quiet"]._retener(self._repartir(vals_list))
+        if not vals_list:
+            return self.browse()
+        self._soltar_estados(vals_list)
+        jobs = self.sudo().create(vals_list)
+        ats = sorted({v["fecha_programada"] for v in vals_list if v.get("fecha_programada")})
+        if any(not v.get("fecha_programada") for v in vals_list):
+            ats.insert(0, fields.Datetime.now())
+        self._trigger_cron(ats)
+        self.env["btr.wa.metrics.hourly"]._volcar_si_toca()
+        return jobs
+
+    @api.model
+    def _soltar_estados(self, vals_list):
+        """Un aviso de estado que espera su ventana de agrupación sale ya si
+        la misma OT encola otro aviso para ese destino: si no, el cierre o
+        las imágenes que vienen detrás llegarían antes que él."""
+        claves = {
+            (v["request_id"], v["destino"]) for v in vals_list
+            if v.get("request_id") and v.get("evento") != "estado"
+        }
+        if not claves:
+            return
+        self.env.cr.execute("""
+            UPDATE btr_wa_outbox SET fecha_programada = (now() at time zone 'UTC')
+             WHERE state = 'pending' AND evento = 'estado'
+               AND fecha_programada > (now() at time zone 'UTC')
+               AND (request_id, destino) IN %s
+        """, (tuple(claves),))
+        if self.env.cr.rowcount:
+            self.invalidate_model(["fecha_programada"])
+
+    @api.model
+    def _encolar_texto(self, texto, request=None, evento=None):
+        return self._encolar([self._vals_texto(texto, request, evento=evento)])
+
+    @api.model
+    def _encolar_imagenes(self, adjuntos, request=None):
+        return self._encolar(self._vals_imagenes(adjuntos, request))
+
+    @api.model
+    def _encolar_estados(self, transiciones, render):
+        """Encola cambios de estado fundiendo los de una misma OT.
+
+        `transiciones`: lista de (ot, estado_anterior, estado_nuevo).
+        `render(ot, cadena)`: texto del mensaje para la lista de estados.
+        Si la OT ya tiene un aviso de estado pendiente para un destino dentro
+        de la ventana (`wa_coalesce_sec`), se amplía su cadena en lugar de
+        crear otro. Los destinos se resuelven con la etapa nueva, así que un
+        destino que solo se interesa por ella recibe un aviso propio.
+        """
+        if not transiciones:
+            return
+        helpers = self.env["btr.wa.helpers"]
+        cfg = helpers._wa_config()
+        ventana = cfg["coalesce_sec"]
+        destinos_por_ot = helpers._wa_destinos(
+            self.env["maintenance.request"].browse([ot.id for ot, _a, _n in transiciones]), cfg)
+        abiertos = {}
+        if ventana:
+            # SKIP LOCKED: si el cron ya está enviando ese aviso, se crea uno nuevo
+            self.env.cr.execute("""
+                SELECT id, request_id, destino FROM btr_wa_outbox
+                 WHERE state = 'pending' AND evento = 'estado'
+                   AND request_id IN %s
+                   AND fecha_programada > (now() at time zone 'UTC')
+                 ORDER BY id
+                 FOR UPDATE SKIP LOCKED
+            """, (tuple(destinos_por_ot),))
+            for job_id, request_id, destino in self.env.cr.fetchall():
+                # La outbox es solo de administradores; el cambio de etapa lo hace el técnico
+                abiertos[(request_id, destino)] = self.sudo().browse(job_id)
+
+        programada = fields.Datetime.now() + timedelta(seconds=ventana)
+        vals_list = []
+        for ot, anterior, nuevo in transiciones:
+            textos = {}  # se renderiza una vez por cadena, no por destino
+            for destino in sorted(destinos_por_ot[ot.id]):
+                job = abiertos.get((ot.id, destino))
+                cadena = (job.estados or anterior).split(" → ") + [nuevo] if job else [anterior, nuevo]
+                clave = tuple(cadena)
+                if clave not in textos:
+                    with metrics.timer("wa_render_seconds", evento="estado"):
+                        textos[clave] = render(ot, cadena)
+                texto = textos[clave]
+                if job:
+                    job.write({"estados": " → ".join(cadena), "texto": texto, "content_hash": content_hash(texto)})
+                    continue
+                vals = self._vals_texto(texto, ot, evento="estado")
+                vals.update(destino=destino, estados=" → ".join(cadena))
+                if ventana:
+                    vals["fecha_programada"] = programada
+                vals_list.append(vals)
+        self._encolar(vals_list)
+
+    # ------------------------------- Drenado -----------------------------------
+    def _preparar_envio(self, transport, recursos):
+        """(función, args) del envío, listos para ejecutarse en otro hilo.
+
+        Todo lo que toca el ORM (leer el adjunto, la caché de versiones) se
+        resuelve aquí; los temporales quedan registrados en `recursos`
+        (ExitStack) y se borran cuando termina el lote.
+        """
+        self.ensure_one()
+        helpers = self.env["btr.wa.helpers"]
+        if self.tipo == "collage":
+            adjuntos = self.attachment_ids.filtered("file_size")
+            if not adjuntos:
+                return (lambda: True), ()
+            path, filename = recursos.enter_context(helpers._wa_preparar_collage(adjuntos))
+            return _medido(transport.send_image, transport.name, "collage", os.path.getsize(path)), \
+                (self.destino, path, filename)
+        if self.tipo == "image":
+            adj = self.attachment_id
+            if not adj or not adj.file_size:
+                return (lambda: True), ()
+            path, filename = recursos.enter_context(helpers._wa_preparar_imagen(adj))
+            return _medido(transport.send_image, transport.name, "image", os.path.getsize(path)), \
+                (self.destino, path, filename)
+        texto = self.texto or ""
+        return _medido(transport.send_text, transport.name, "text", len(texto.encode())), (self.destino, texto)
+
+    @api.model
+    def _bucket(self, destino, cfg, buckets):
+        """Token bucket de `destino` para este drenado (`buckets`: {destino: bucket}).
+
+        Se reconstruye una vez por drenado con los envíos de la ventana del
+        bucket; después descuenta en memoria los tokens de este drenado.
+        """
+        if destino not in buckets:
+            rate, burst = cfg["rate_per_min"] / 60.0, cfg["rate_burst"]
+            self.env.cr.execute("""
+                SELECT fecha_envio FROM btr_wa_outbox
+                 WHERE destino = %s AND state = 'sent'
+                   AND fecha_envio > (now() at time zone 'UTC') - %s * interval '1 second'
+            """, (destino, TokenBucket.ventana(rate, burst)))
+            envios = [f.replace(tzinfo=timezone.utc).timestamp() for (f,) in self.env.cr.fetchall()]
+            buckets[destino] = TokenBucket.desde_historial(rate, burst, envios, time.time())
+        return buckets[destino]
+
+    @api.model
+    def _lote_pendiente(self, limite, excluir=()):
+        """Ids listos para enviar. Un destino con un trabajo anterior esperando
+        su reintento no avanza: lo que va detrás espera a ese trabajo (FIFO)."""
+        self.env.cr.execute("""
+            SELECT o.id FROM btr_wa_outbox o
+             WHERE o.state = 'pending'
+               AND (o.fecha_programada IS NULL OR o.fecha_programada <= (now() at time zone 'UTC'))
+               AND NOT (o.destino = ANY(%s::varchar[]))
+               AND NOT EXISTS (
+                   SELECT 1 FROM btr_wa_outbox r
+                    WHERE r.destino = o.destino AND r.id < o.id
+                      AND r.state = 'pending' AND r.intentos > 0
+                      AND r.fecha_programada > (now() at time zone 'UTC'))
+             ORDER BY o.id
+             LIMIT %s
+        """, (list(excluir), limite))
+        return [r[0] for r in self.env.cr.fetchall()]
+
+    def _bloquear(self):
+        """Bloquea el trabajo si sigue pendiente y nadie más lo está enviando."""
+        self.ensure_one()
+        self.env.cr.execute("""
+            SELECT id FROM btr_wa_outbox
+             WHERE id = %s AND state = 'pending'
+             FOR UPDATE SKIP LOCKED
+        """, (self.id,))
+        return bool(self.env.cr.fetchone())
+
+    @api.model
+    def _agrupar_desbordados(self, destino):
+        """Funde en un solo mensaje los textos que esperan por falta de tokens.
+
+        Solo se agrupan los textos anteriores a la primera imagen pendiente
+        del destino, y el mensaje agrupado ocupa la fila del primero de ellos
+        (el resto quedan *Agrupado* en él): así sale en su turno y nunca
+        después de las imágenes que lo siguen en la cola.
+        """
+        pendientes = self.search([
+            ("state", "=", "pending"), ("destino", "=", destino),
+            "|", ("fecha_programada", "=", False), ("fecha_programada", "<=", fields.Datetime.now()),
+        ], order="id", limit=DIGEST_MAX + 1)
+        textos = self.browse()
+        for job in pendientes:
+            if job.tipo != "text" or len(textos) >= DIGEST_MAX:
+                break
+            textos |= job
+        if len(textos) < 2:
+            return
+        texto = self.env["btr.wa.template"]._render("digest", {
+            "n": len(textos), "cuerpo": "\n\n".join(textos.mapped("texto"))})
+        # El primero conserva su evento y su OT: la recuperación lo sigue
+        # contando como el aviso de esa OT
+        digest, resto = textos[0], textos[1:]
+        digest.write({"texto": texto, "content_hash": content_hash(texto), "estados": False})
+        resto.write({"state": "merged", "digest_id": digest.id})
+        _logger.info(f"📦 Outbox WA: {len(textos)} avisos agrupados para {destino}.")
+
+    @api.model
+    def procesar_cola(self, limite=50, max_lotes=20):
+        """Drena la cola por lotes.
+
+        Por cada lote, el hilo principal bloquea los trabajos (FOR UPDATE SKIP
+        LOCKED), descarta duplicados, aplica el límite por destino y prepara
+        los ficheros; el WADispatcher envía en paralelo entre destinos y en
+        orden dentro de cada uno. Los resultados se escriben y confirman al
+        terminar el lote, con las filas bloqueadas hasta entonces para que
+        dos ejecuciones concurrentes nunca envíen el mismo trabajo.
+
+        Con el breaker abierto no se intenta nada; en half_open el primer
+        lote es un único trabajo (la sonda).
+        """
+        ledger = self.env["btr.wa.ledger"]
+        breaker = self.env["btr.wa.breaker"]
+        helpers = self.env["btr.wa.helpers"]
+        cfg = helpers._wa_config()
+        modo = breaker._permitir(cfg)
+        self.env.cr.commit()
+        if modo == "open":
+            self._trigger_cron(breaker._proxima_sonda(cfg))
+            self.env.cr.commit()
+            return 0
+        transport = helpers._wa_transport(cfg)
+        agotados = set()  # destinos sin tokens: su cola espera entera (FIFO)
+        buckets = {}
+        racha = Racha(cfg["breaker_threshold"])
+        total = 0
+        abierto = False
+        for _ in range(max_lotes):
+            ids = self._lote_pendiente(1 if modo == "half_open" else limite, agotados)
+            if not ids:
+                break
+            envios = []
+            vistos = set()
+            caidos = set()  # destinos con un fallo en este lote: lo siguiente espera
+            with ExitStack() as recursos:
+                with WADispatcher(cfg["concurrency"], cfg["queue_max"]) as dispatcher:
+                    for job in self.browse(ids):
+                        if racha.cortada:
+                            break  # el breaker se abrirá al cerrar el lote
+                        if job.destino in agotados or job.destino in caidos or not job._bloquear():
+                            continue
+                        clave = (job.destino, job.request_id.id, job.content_hash)
+                        ventana = cfg["dedup_window_min"] if job.tipo == "text" else None
+                        if (job.request_id and clave in vistos) or ledger._ya_enviado(*clave, ventana):
+                            job.write({"state": "duplicate"})
+                            metrics.inc("wa_outbox_jobs_total", result="duplicate")
+                            continue
+                        if not self._bucket(job.destino, cfg, buckets).take():
+                            agotados.add(job.destino)
+                            continue
+                        vistos.add(clave)
+                        try:
+                            fn, args = job._preparar_envio(transport, recursos)
+                        except Exception as e:
+                            _logger.error(f"WA OUTBOX: no se pudo preparar el trabajo {job.id}: {e}")
+                            caidos.add(job.destino)
+                            envios.append((job, None))
+                            continue
+                        envios.append((job, dispatcher.submit(job.destino, _en_carril(fn, job.destino, caidos, racha),
+                                                              *args)))
+                # Al salir del dispatcher todos los envíos han terminado
+                resultados = [(job, _resultado(fut)) for job, fut in envios]
+            # Los saltados siguen pendientes tal cual, sin gastar intento
+            resultados = [(job, ok) for job, ok in resultados if ok is not SALTADO]
+            reintentos = []
+            for job, ok in resultados:
+                intentos = job.intentos + 1
+                if ok:
+                    ledger._registrar(job.destino, job.request_id.id, job.content_hash, job.tipo)
+                    job.write({
+                        "state": "sent", "intentos": intentos,
+                        "ultimo_error": False, "fecha_envio": fields.Datetime.now(),
+                    })
+                elif intentos < cfg["retry_max"]:
+                    reintento = fields.Datetime.now() + timedelta(seconds=_backoff(intentos, cfg))
+                    reintentos.append(reintento)
+                    metrics.inc("wa_outbox_jobs_total", result="retry")
+                    job.write({
+                        "intentos": intentos,
+                        "ultimo_error": f"Fallo de envío (intento {intentos}); reintento {reintento}",
+                        "fecha_programada": reintento,
+                    })
+                else:
+                    _logger.error(f"WA OUTBOX: trabajo {job.id} descartado tras {intentos} intentos.")
+                    metrics.inc("wa_outbox_jobs_total", result="error")
+                    job.write({
+                        "state": "error", "intentos": intentos,
+                        "ultimo_error": f"Fallo de envío tras {intentos} intentos (ver log)",
+                    })
+            if reintentos:
+                self._trigger_cron(min(reintentos))
+            n_ok = sum(1 for _job, ok in resultados if ok)
+            abierto = breaker._registrar(cfg, n_ok, len(resultados) - n_ok, racha.seguidos)
+            self.env.cr.commit()
+            total += len(resultados)
+            if abierto:
+                self._trigger_cron(breaker._proxima_sonda(cfg))
+                self.env.cr.commit()
+                break
+            if racha.cortada:
+                break
+            if modo == "half_open" and resultados:
+                modo = "closed"  # sonda correcta: se sigue con lotes normales
+        for destino in agotados:
+            self._agrupar_desbordados(destino)
+            espera = self._bucket(destino, cfg, buckets).wait_time()
+            self._trigger_cron(fields.Datetime.now() + timedelta(seconds=espera + 1))
+            self.env.cr.commit()
+        self.env["btr.wa.metrics.hourly"]._volcar_si_toca()
+        if total:
+            _logger.info(f"📤 Outbox WA: {total} trabajos procesados.")
+        return total
+
+
+# Resultado de un envío que no se intentó (su carril se detuvo antes)
+SALTADO = "saltado"
+
+
+class Racha:
+    """Fallos seguidos del drenado en curso, contados en todos los carriles
+    según van terminando. Al llegar a `wa_breaker_threshold` no se envía
+    nada más: sin esto un lote entero podía esperar 50 timeouts antes de
+    que el breaker viera el resultado."""
+
+    def __init__(self, umbral):
+        self.umbral = umbral
+        self.seguidos = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cortada(self):
+        return self.seguidos >= self.umbral
+
+    def anotar(self, ok):
+        with self._lock:
+            self.seguidos = 0 if ok else self.seguidos + 1
+
+
+def _en_carril(fn, destino, caidos, racha):
+    """Si falla un envío, el resto del carril de `destino` en este lote no
+    se intenta: un reintento no puede quedar detrás de lo que le seguía.
+    Con la racha de fallos cortada no se intenta ningún envío más."""
+    def envio(*args):
+        if destino in caidos or racha.cortada:
+            return SALTADO
+        ok = False
+        try:
+            ok = fn(*args)
+        finally:
+            racha.anotar(ok)
+            if not ok:
+                caidos.add(destino)
+        return ok
+    return envio
+
+
+def _medido(fn, backend, tipo, nbytes):
+    """Envuelve el envío con su temporizador y contadores (corre en el hilo del pool)."""
+    def envio(*args):
+        with metrics.timer("wa_send_seconds", backend=backend, tipo=tipo):
+            ok = fn(*args)
+        metrics.inc("wa_send_total", backend=backend, tipo=tipo, result="ok" if ok else "error")
+        if ok:
+            metrics.inc("wa_bytes_sent_total", nbytes, backend=backend, tipo=tipo)
+        return ok
+    return envio
+
+
+def _resultado(fut):
+    if fut is None:
+        return False
+    try:
+        res = fut.result()
+    except Exception:
+        return False
+    return res if res is SALTADO else bool(res)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+LÍMITE DE ENVÍOS POR DESTINO (TOKEN BUCKET)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Token bucket clásico: `rate` tokens por segundo, hasta `capacity`
+(`wa_rate_per_min` / 60 y `wa_rate_burst`). El estado no vive en memoria
+del proceso: `desde_historial` lo reconstruye a partir de las horas de los
+últimos envíos del destino (fecha_envio de la outbox), así el límite es el
+mismo con uno o varios workers y sobrevive a los reinicios.
+No depende de Odoo.
+-----------------------------------------------------------
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    """Token bucket con reloj inyectable (por defecto, time.monotonic)."""
+
+    def __init__(self, rate, capacity, tokens=None, stamp=None, reloj=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity if tokens is None else tokens)
+        self.reloj = reloj
+        self.stamp = reloj() if stamp is None else stamp
+        self._lock = threading.Lock()
+
+    @classmethod
+    def desde_historial(cls, rate, capacity, envios, ahora, reloj=time.time):
+        """Bucket en `ahora` tras los `envios` (instantes en segundos del
+        mismo reloj). Se parte de lleno una ventana (`ventana()`) antes de
+        `ahora`: desde vacío, el bucket se llena en ese tiempo."""
+        desde = ahora - cls.ventana(rate, capacity)
+        tokens, stamp = float(capacity), desde
+        for instante in sorted(e for e in envios if desde < e <= ahora):
+            tokens = min(capacity, tokens + (instante - stamp) * rate) - 1
+            stamp = instante
+        # Con varios workers los tokens pueden quedar en negativo: es deuda
+        bucket = cls(rate, capacity, tokens=tokens, stamp=stamp, reloj=reloj)
+        bucket._refill(ahora)
+        return bucket
+
+    @staticmethod
+    def ventana(rate, capacity):
+        """Segundos de historial que usa desde_historial."""
+        return capacity / rate
+
+    def _refill(self, now=None):
+        now = self.reloj() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.stamp) * self.rate)
+        self.stamp = max(self.stamp, now)
+
+    def take(self):
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def wait_time(self):
+        """Segundos hasta el próximo token."""
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self.tokens) / self.rate) if self.rate else 60.0
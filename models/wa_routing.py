@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+ENRUTADO DE AVISOS WHATSAPP POR DESTINO
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Reglas en secrets.yaml que deciden a qué grupos va cada OT según empresa,
+hotel (categoría), equipo de mantenimiento, etapa o prioridad:
+
+    wa_routes:
+      - to: ["1203...@g.us"]              # uno o varios destinos
+        company: "Hoteles del Sur S.L."   # opcional; valor o lista
+        hotel: ["Hotel Mar", "Hotel Sol"] # opcional; valor o lista
+        team: "Fontanería"                # opcional
+        stage: "Pendiente material"       # opcional
+        priority: "3"                     # opcional ('0'..'3')
+
+Una regla casa si casan todas sus condiciones; una regla sin condiciones
+casa siempre. Si ninguna casa, el aviso va a `wa_to`.
+
+Las reglas se compilan una vez (junto con la config cacheada) en un índice
+por "firma" (conjunto de dimensiones que usa la regla). Resolver una OT son
+como mucho 2^5 búsquedas en diccionario, independientemente del número de
+reglas.
+-----------------------------------------------------------
+"""
+import logging
+from collections import defaultdict
+from itertools import product
+
+_logger = logging.getLogger(__name__)
+
+DIMENSIONES = ("company", "hotel", "team", "stage", "priority")
+# Dimensiones que limitan el alcance de los resúmenes de un destino
+ALCANCE = ("company", "hotel", "team")
+
+
+def _norm(valor):
+    return str(valor).strip().lower() if valor not in (None, False, "") else ""
+
+
+def _lista(valor):
+    if valor in (None, ""):
+        return []
+    return list(valor) if isinstance(valor, (list, tuple, set)) else [valor]
+
+
+class RoutingIndex:
+    """Índice compilado: {firma: {valores: {destinos}}}."""
+
+    def __init__(self, rules, default, validar_jid=None):
+        self.default = default
+        self.index = defaultdict(lambda: defaultdict(set))
+        # Alcance de cada destino para los resúmenes: lista de condiciones
+        # {dimensión: {valores}} limitadas a ALCANCE; None = global
+        self.scopes = defaultdict(list)
+        self._filtros = {}
+        for n, rule in enumerate(rules or []):
+            if not isinstance(rule, dict):
+                _logger.error(f"WhatsApp config: wa_routes[{n}] no es un diccionario; se ignora.")
+                continue
+            destinos = [str(d).strip() for d in _lista(rule.get("to")) if str(d).strip()]
+            if validar_jid:
+                for d in destinos:
+                    if not validar_jid(d):
+                        _logger.error(f"WhatsApp config: wa_routes[{n}] destino no válido ({d!r}).")
+            if not destinos:
+                _logger.error(f"WhatsApp config: wa_routes[{n}] sin 'to'; se ignora.")
+                continue
+            condiciones = {d: [_norm(v) for v in _lista(rule.get(d))] for d in DIMENSIONES if _lista(rule.get(d))}
+            firma = tuple(d for d in DIMENSIONES if d in condiciones)
+            for valores in product(*(condiciones[d] for d in firma)):
+                self.index[firma][valores].update(destinos)
+            alcance = {d: set(condiciones[d]) for d in ALCANCE if d in condiciones}
+            for destino in destinos:
+                self.scopes[destino].append(alcance or None)
+
+    def resolve(self, atributos):
+        """Destinos para una OT dada como {company, hotel, team, stage, priority}."""
+        norm = {d: _norm(atributos.get(d)) for d in DIMENSIONES}
+        destinos = set()
+        for firma, tabla in self.index.items():
+            destinos |= tabla.get(tuple(norm[d] for d in firma), set())
+        if not destinos and self.default:
+            destinos.add(self.default)
+        return destinos
+
+    def destinations(self):
+        """Todos los destinos conocidos (resúmenes)."""
+        todos = set(self.scopes)
+        if self.default:
+            todos.add(self.default)
+        return todos
+
+    def summary_filter(self, destino):
+        """Función (hotel, team, company) -> bool para filtrar el resumen de `destino`.
+
+        None si el destino debe recibir el resumen global (es `wa_to`, o
+        alguna de sus reglas no restringe empresa, hotel ni equipo).
+        """
+        alcances = self.scopes.get(destino)
+        if not alcances or any(a is None for a in alcances):
+            return None
+        # Mismo alcance -> mismo objeto filtro, para poder reutilizar el texto
+        clave = tuple(sorted(tuple(tuple(sorted(a.get(d, ()))) for d in ALCANCE) for a in alcances))
+        if clave in self._filtros:
+            return self._filtros[clave]
+
+        def casa(hotel, team, company=""):
+            valores = {"hotel": _norm(hotel), "team": _norm(team), "company": _norm(company)}
+            return any(all(valores[d] in permitidos for d, permitidos in a.items()) for a in alcances)
+        self._filtros[clave] = casa
+        return casa
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+SIDECAR WHATSAPP PERSISTENTE
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+En lugar de lanzar `npx mudslide@latest` por cada mensaje (resolución npm,
+arranque de Node y handshake de WhatsApp cada vez), un único proceso
+sidecar mantiene la sesión abierta y recibe trabajos por un socket Unix.
+
+Protocolo (una línea JSON por petición y por respuesta):
+    {"op": "ping"}                                  -> {"ok": true} (false sin sesión abierta)
+    {"op": "text", "to": "...", "text": "..."}      -> {"ok": true}
+    {"op": "image", "to": "...", "file": "/ruta"}   -> {"ok": false, "error": "..."}
+
+El supervisor arranca el sidecar si no responde (con un lock de fichero
+para que los workers prefork no lancen varios a la vez) y lo relanza si
+muere. Un fallo de conexión (SidecarNoDisponible) garantiza que el envío
+no ha salido; cualquier otro error puede llegar después de entregarlo.
+Cuando ningún transporte usa ya un supervisor (cambió el comando o el
+socket), release_supervisor lo descarta y para el sidecar si lo arrancó
+este proceso.
+No depende de Odoo para poder usarse desde herramientas externas.
+-----------------------------------------------------------
+"""
+import fcntl
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+class SidecarError(Exception):
+    pass
+
+
+class SidecarNoDisponible(SidecarError):
+    """El sidecar no acepta conexiones: la petición no ha salido."""
+
+
+class SidecarSupervisor:
+    """Cliente + supervisor de un sidecar escuchando en `socket_path`."""
+
+    def __init__(self, cmd, socket_path, timeout=120, start_timeout=60, restart_backoff=10):
+        self.cmd = cmd
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.restart_backoff = restart_backoff
+        self._lock = threading.Lock()
+        self._last_start = 0.0
+        self._proc = None  # sidecar arrancado por este proceso
+        self.restarts = 0
+        self.usuarios = 0  # transportes que lo usan (get_supervisor/release_supervisor)
+
+    # ------------------------------ Transporte ---------------------------------
+    def _request(self, payload, timeout=None):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout or self.timeout)
+        try:
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                raise SidecarNoDisponible(f"No se puede conectar con el sidecar: {e}") from e
+            sock.sendall((json.dumps(payload) + "\n").encode("utf-8"))
+            buf = b""
+            while not buf.endswith(b"\n"):
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                buf += chunk
+        finally:
+            sock.close()
+        if not buf:
+            raise SidecarError("El sidecar cerró la conexión sin responder.")
+        return json.loads(buf.decode("utf-8"))
+
+    def _ping(self):
+        """(responde, sesión abierta). Un sidecar que responde sin sesión está
+        conectando o reconectando con WhatsApp: no se relanza."""
+        try:
+            return True, bool(self._request({"op": "ping"}, timeout=5).get("ok"))
+        except (OSError, ValueError, SidecarError):
+            return False, False
+
+    def ping(self):
+        return self._ping()[1]
+
+    def _esperar_sesion(self):
+        limite = time.monotonic() + self.start_timeout
+        while time.monotonic() < limite:
+            if self.ping():
+                return True
+            time.sleep(0.5)
+        return False
+
+    # ------------------------------ Supervisión --------------------------------
+    def _spawn(self):
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        env = os.environ.copy()
+        env["WA_SIDECAR_SOCKET"] = self.socket_path
+        env.setdefault("NODE_OPTIONS", "--max-old-space-size=256")
+        _logger.info(f"🚀 Arrancando sidecar WhatsApp: {self.cmd}")
+        # Nueva sesión: el sidecar sobrevive al reciclado de los workers de Odoo
+        self._proc = subprocess.Popen(
+            self.cmd, shell=True, env=env, start_new_session=True,
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        self._last_start = time.monotonic()
+        self.restarts += 1
+
+    def ensure_running(self):
+        """Garantiza un sidecar con sesión abierta; lo (re)arranca si no responde."""
+        responde, abierta = self._ping()
+        if abierta:
+            return True
+        if responde:
+            if self._esperar_sesion():
+                return True
+            _logger.error(f"WA SIDECAR: sin sesión de WhatsApp tras {self.start_timeout}s.")
+            return False
+        with self._lock:
+            if time.monotonic() - self._last_start < self.restart_backoff and self.restarts:
+                return self.ping()
+            with open(self.socket_path + ".lock", "w") as lockf:
+                fcntl.flock(lockf, fcntl.LOCK_EX)
+                try:
+                    responde, abierta = self._ping()
+                    if abierta:
+                        return True
+                    if not responde:
+                        self._spawn()
+                    if self._esperar_sesion():
+                        return True
+                finally:
+                    fcntl.flock(lockf, fcntl.LOCK_UN)
+        _logger.error(f"WA SIDECAR: no responde tras {self.start_timeout}s.")
+        return False
+
+    def close(self):
+        """Para el sidecar si lo arrancó este proceso (el de otro worker no se toca)."""
+        proc, self._proc = self._proc, None
+        if proc is None or proc.poll() is not None:
+            return
+        _logger.info(f"🛑 Parando sidecar WhatsApp: {self.cmd}")
+        try:
+            # Grupo completo: el shell y node comparten la sesión nueva
+            os.killpg(proc.pid, signal.SIGTERM)
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+        except ProcessLookupError:
+            pass
+
+    # -------------------------------- Envíos -----------------------------------
+    def _send(self, payload):
+        if not self.ensure_running():
+            raise SidecarNoDisponible("Sidecar no disponible.")
+        res = self._request(payload)
+        if not res.get("ok"):
+            raise SidecarError(res.get("error") or "Error desconocido en el sidecar.")
+        return True
+
+    def send_text(self, to, text):
+        return self._send({"op": "text", "to": to, "text": text})
+
+    def send_image(self, to, path):
+        return self._send({"op": "image", "to": to, "file": path})
+
+
+_supervisors = {}
+_supervisors_lock = threading.Lock()
+
+
+def get_supervisor(cmd, socket_path, timeout=120):
+    """Un supervisor por (cmd, socket) y proceso; devolverlo con release_supervisor."""
+    key = (cmd, socket_path)
+    with _supervisors_lock:
+        sup = _supervisors.get(key)
+        if sup is None:
+            sup = _supervisors[key] = SidecarSupervisor(cmd, socket_path, timeout=timeout)
+        sup.timeout = timeout
+        sup.usuarios += 1
+        return sup
+
+
+def release_supervisor(sup):
+    """Descarta el supervisor (y para su sidecar) cuando ya nadie lo usa."""
+    with _supervisors_lock:
+        sup.usuarios -= 1
+        if sup.usuarios > 0:
+            return
+        if _supervisors.get((sup.cmd, sup.socket_path)) is sup:
+            del _supervisors[(sup.cmd, sup.socket_path)]
+    sup.close()
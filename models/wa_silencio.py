@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+HORAS DE SILENCIO POR DESTINO
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Ventanas "HH:MM-HH:MM" (hora local de `wa_quiet_tz`) en las que un destino
+no recibe avisos de OT uno a uno; se acumulan y salen agrupados al final
+de la ventana (btr.wa.quiet, silencio.py). Una ventana puede cruzar la
+medianoche ("23:00-07:00").
+
+    wa_quiet_hours: "23:00-07:00"          # todos los destinos
+    wa_quiet_hours:                        # o por destino
+      default: "23:00-07:00"
+      "120363001@g.us": "00:00-06:00"
+      "120363002@g.us": ""                 # este destino, sin silencio
+
+No depende de Odoo.
+-----------------------------------------------------------
+"""
+import logging
+import re
+from datetime import datetime, timedelta, time as dtime
+
+import pytz
+
+_logger = logging.getLogger(__name__)
+
+_VENTANA_RE = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$")
+
+
+def parse_ventana(texto):
+    """"23:00-07:00" -> (time(23), time(7)); None si está vacía. ValueError si no es válida."""
+    if texto in (None, "", False):
+        return None
+    m = _VENTANA_RE.match(str(texto))
+    if not m:
+        raise ValueError(f"formato HH:MM-HH:MM esperado, no {texto!r}")
+    h1, m1, h2, m2 = (int(g) for g in m.groups())
+    if h1 > 23 or h2 > 23 or m1 > 59 or m2 > 59:
+        raise ValueError(f"hora fuera de rango en {texto!r}")
+    inicio, fin = dtime(h1, m1), dtime(h2, m2)
+    if inicio == fin:
+        raise ValueError(f"ventana vacía {texto!r}")
+    return inicio, fin
+
+
+class QuietHours:
+    """Ventanas de silencio compiladas: {destino: (inicio, fin)} + la general."""
+
+    def __init__(self, spec, tz_name="UTC"):
+        try:
+            self.tz = pytz.timezone(tz_name or "UTC")
+        except pytz.UnknownTimeZoneError:
+            _logger.error(f"WhatsApp config: 'wa_quiet_tz' desconocida ({tz_name!r}); se usa UTC.")
+            self.tz = pytz.utc
+        if not isinstance(spec, dict):
+            spec = {"default": spec}
+        self.general = None
+        self.por_destino = {}
+        for clave, texto in spec.items():
+            try:
+                ventana = parse_ventana(texto)
+            except ValueError as e:
+                _logger.error(f"WhatsApp config: wa_quiet_hours[{clave!r}] no válida ({e}); se ignora.")
+                continue
+            if clave == "default":
+                self.general = ventana
+            else:
+                self.por_destino[str(clave).strip()] = ventana
+
+    def __bool__(self):
+        return bool(self.general or any(self.por_destino.values()))
+
+    def ventana(self, destino):
+        return self.por_destino[destino] if destino in self.por_destino else self.general
+
+    def fin(self, destino, ahora=None):
+        """Fin (UTC naive) de la ventana en curso para `destino`; None fuera de ella."""
+        ventana = self.ventana(destino)
+        if not ventana:
+            return None
+        inicio, fin = ventana
+        ahora = ahora or datetime.utcnow()
+        local = pytz.utc.localize(ahora).astimezone(self.tz).replace(tzinfo=None)
+        hora = local.time()
+        if inicio < fin:
+            if not inicio <= hora < fin:
+                return None
+            dia = local.date()
+        elif hora >= inicio:
+            dia = local.date() + timedelta(days=1)
+        elif hora < fin:
+            dia = local.date()
+        else:
+            return None
+        fin_local = self.tz.localize(datetime.combine(dia, fin))
+        return fin_local.astimezone(pytz.utc).replace(tzinfo=None)
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+CAPA DE TRANSPORTE WHATSAPP
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Abstracción única de envío usada por todos los modelos. El backend se
+elige en secrets.yaml con `wa_backend`:
+- command: un proceso mudslide por envío (comportamiento histórico).
+- sidecar: sesión persistente por socket Unix (ver wa_sidecar.py).
+- http: pasarela HTTP con pool de conexiones keep-alive; muchos mensajes
+  viajan por la misma conexión TCP.
+Con `wa_record_path` cualquiera de ellos se envuelve en RecordingTransport,
+que anota cada envío (destino, bytes, duración, resultado) en un JSONL para
+reproducirlo después con tools/wa_replay.py.
+
+Todos los métodos devuelven True/False y nunca lanzan excepciones.
+get_transport reutiliza una instancia por proceso mientras no cambien los
+ajustes que usa su backend (`claves_cfg`); al cambiar, la anterior se
+cierra (pool HTTP, sidecar arrancado por este proceso).
+-----------------------------------------------------------
+"""
+import json
+import logging
+import os
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from datetime import date
+
+from . import wa_metrics as metrics
+from .wa_sidecar import SidecarNoDisponible, get_supervisor, release_supervisor
+
+_logger = logging.getLogger(__name__)
+
+
+class WATransport:
+    """Interfaz común: send_text(to, text) y send_image(to, path, filename)."""
+
+    name = "base"
+    claves_cfg = ("timeout",)  # ajustes de cfg que usa el backend (clave de get_transport)
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.timeout = cfg["timeout"]
+
+    def send_text(self, to, text):
+        raise NotImplementedError
+
+    def send_image(self, to, path, filename=None):
+        raise NotImplementedError
+
+    def close(self):
+        """Libera lo que retenga el transporte; get_transport lo llama al sustituirlo."""
+
+
+class CommandTransport(WATransport):
+    """Un proceso por envío a partir de wa_text_cmd / wa_image_cmd."""
+
+    name = "command"
+    claves_cfg = ("timeout", "text_cmd", "image_cmd")
+
+    def _env(self):
+        env = os.environ.copy()
+        env.setdefault("NODE_OPTIONS", "--max-old-space-size=256")
+        return env
+
+    def _run(self, cmd, etiqueta):
+        codigo = "exception"
+        try:
+            with metrics.timer("wa_subprocess_spawn_seconds"):
+                proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                        text=True, env=self._env(), start_new_session=True)
+            with metrics.timer("wa_subprocess_wait_seconds"):
+                try:
+                    _out, err = proc.communicate(timeout=self.timeout)
+                except subprocess.TimeoutExpired:
+                    # Grupo completo: npx/node son hijos del shell y retienen las tuberías
+                    os.killpg(proc.pid, signal.SIGKILL)
+                    proc.communicate()
+                    raise
+            if proc.returncode != 0:
+                codigo = str(proc.returncode)
+                _logger.error(f"WA ERROR ({proc.returncode}): {err}")
+            else:
+                _logger.info(f"✅ WhatsApp: {etiqueta} enviado.")
+                return True
+        except subprocess.TimeoutExpired:
+            codigo = "timeout"
+            _logger.error(f"WA EXC: El envío por WhatsApp superó {self.timeout} segundos (timeout).")
+        except Exception as e:
+            _logger.error(f"WA EXC: {e}")
+        metrics.inc("wa_send_failures_total", backend=self.name, code=codigo)
+        return False
+
+    def send_text(self, to, text):
+        # Importante: mudslide acepta: npx mudslide@latest send <to> "<mensaje>"
+        cmd = self.cfg["text_cmd"].format(to=shlex.quote(to), text=shlex.quote(text))
+        return self._run(cmd, "mensaje de texto")
+
+    def send_image(self, to, path, filename=None):
+        cmd = self.cfg["image_cmd"].format(to=shlex.quote(to), file=shlex.quote(path))
+        return self._run(cmd, f"imagen ({filename or os.path.basename(path)})")
+
+
+class SidecarTransport(WATransport):
+    """Sesión persistente; si el sidecar no está disponible cae al modo comando.
+
+    Solo se cae al modo comando si la petición no llegó a salir (sidecar
+    caído o que no acepta conexiones). Un timeout o un error después de
+    enviarla se da como fallo: repetirla por mudslide podría duplicar el
+    mensaje y esperar otro timeout completo; ya la reintenta la outbox.
+    """
+
+    name = "sidecar"
+    claves_cfg = CommandTransport.claves_cfg + ("sidecar_cmd", "sidecar_socket")
+
+    def __init__(self, cfg):
+        super().__init__(cfg)
+        self.supervisor = get_supervisor(cfg["sidecar_cmd"], cfg["sidecar_socket"], timeout=self.timeout)
+        self.fallback = CommandTransport(cfg)
+
+    def close(self):
+        release_supervisor(self.supervisor)
+
+    def _send(self, op, to, payload, etiqueta):
+        try:
+            if op == "image":
+                self.supervisor.send_image(to, payload)
+            else:
+                self.supervisor.send_text(to, payload)
+            _logger.info(f"✅ WhatsApp (sidecar): {etiqueta} enviado.")
+            return True
+        except SidecarNoDisponible as e:
+            _logger.warning(f"WA SIDECAR: {e}. Se usa el modo comando como respaldo.")
+            metrics.inc("wa_send_failures_total", backend=self.name, code="fallback")
+            return None
+        except Exception as e:
+            _logger.error(f"WA SIDECAR ERROR ({etiqueta}): {e}")
+            metrics.inc("wa_send_failures_total", backend=self.name, code="exception")
+            return False
+
+    def send_text(self, to, text):
+        ok = self._send("text", to, text, "mensaje de texto")
+        return self.fallback.send_text(to, text) if ok is None else ok
+
+    def send_image(self, to, path, filename=None):
+        ok = self._send("image", to, path, f"imagen ({filename or os.path.basename(path)})")
+        return self.fallback.send_image(to, path, filename) if ok is None else ok
+
+
+class HttpGatewayTransport(WATransport):
+    """Pasarela HTTP con sesión requests compartida (pool keep-alive).
+
+    API esperada de la pasarela:
+        POST {wa_http_url}/send/text   JSON {"to", "text"}
+        POST {wa_http_url}/send/image  multipart: to + file
+    Cualquier respuesta 2xx se considera éxito.
+    """
+
+    name = "http"
+    claves_cfg = ("timeout", "http_url", "http_token", "http_pool_size")
+
+    def __init__(self, cfg):
+        super().__init__(cfg)
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.base_url = cfg["http_url"].rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=cfg["http_pool_size"], max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if cfg["http_token"]:
+            self.session.headers["Authorization"] = f"Bearer {cfg['http_token']}"
+
+    def _post(self, ruta, etiqueta, **kwargs):
+        try:
+            res = self.session.post(f"{self.base_url}{ruta}", timeout=self.timeout, **kwargs)
+            if not res.ok:
+                _logger.error(f"WA HTTP ERROR ({res.status_code}): {res.text[:500]}")
+                metrics.inc("wa_send_failures_total", backend=self.name, code=str(res.status_code))
+                return False
+            _logger.info(f"✅ WhatsApp (http): {etiqueta} enviado.")
+            return True
+        except Exception as e:
+            _logger.error(f"WA HTTP EXC: {e}")
+            metrics.inc("wa_send_failures_total", backend=self.name, code="exception")
+            return False
+
+    def close(self):
+        self.session.close()
+
+    def send_text(self, to, text):
+        return self._post("/send/text", "mensaje de texto", json={"to": to, "text": text})
+
+    def send_image(self, to, path, filename=None):
+        filename = filename or os.path.basename(path)
+        try:
+            f = open(path, "rb")
+        except OSError as e:
+            _logger.error(f"WA HTTP EXC: {e}")
+            return False
+        with f:
+            return self._post("/send/image", f"imagen ({filename})",
+                              data={"to": to}, files={"file": (filename, f)})
+
+
+class RecordingTransport(WATransport):
+    """Envía con `inner` y anota cada envío en `wa_record_path`.
+
+    Una línea JSON por envío, sin el contenido del mensaje:
+        {"ts": 1760680800.123, "op": "text", "to": "...", "bytes": 412, "ms": 850.2, "ok": true}
+    `{fecha}` en la ruta se sustituye por AAAAMMDD (un fichero por día).
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, cfg, inner):
+        super().__init__(cfg)
+        self.inner = inner
+        self.name = inner.name  # las métricas siguen etiquetadas con el backend real
+        self.path = cfg["record_path"]
+
+    def _anotar(self, op, to, nbytes, fn, *args):
+        inicio = time.time()
+        ok = fn(*args)
+        linea = json.dumps({
+            "ts": round(inicio, 3), "op": op, "to": to, "bytes": nbytes,
+            "ms": round((time.time() - inicio) * 1000, 1), "ok": bool(ok),
+        }, ensure_ascii=False)
+        try:
+            with self._lock, open(self.path.replace("{fecha}", f"{date.today():%Y%m%d}"), "a",
+                                  encoding="utf-8") as f:
+                f.write(linea + "\n")
+        except OSError as e:
+            _logger.error(f"WA RECORD: no se pudo escribir en {self.path}: {e}")
+        return ok
+
+    def send_text(self, to, text):
+        return self._anotar("text", to, len((text or "").encode()), self.inner.send_text, to, text)
+
+    def send_image(self, to, path, filename=None):
+        try:
+            nbytes = os.path.getsize(path)
+        except OSError:
+            nbytes = 0
+        return self._anotar("image", to, nbytes, self.inner.send_image, to, path, filename)
+
+    def close(self):
+        self.inner.close()
+
+
+TRANSPORTS = {
+    CommandTransport.name: CommandTransport,
+    SidecarTransport.name: SidecarTransport,
+    HttpGatewayTransport.name: HttpGatewayTransport,
+}
+
+_cache = (None, None)  # (clave, transporte); se sustituye de forma atómica
+_cache_lock = threading.Lock()
+
+
+def get_transport(cfg):
+    """Instancia de transporte por proceso, reutilizada mientras no cambien los
+    ajustes de su backend (así el pool HTTP y el supervisor del sidecar
+    sobreviven entre envíos y entre recargas de otros ajustes)."""
+    global _cache
+    backend = cfg.get("backend") or "command"
+    if backend not in TRANSPORTS:
+        _logger.error(f"WhatsApp: backend '{backend}' desconocido; se usa 'command'.")
+        backend = "command"
+    cls = TRANSPORTS[backend]
+    key = (backend, cfg.get("record_path") or "") + tuple(cfg[k] for k in cls.claves_cfg)
+    cached = _cache
+    if cached[0] == key:
+        return cached[1]
+    with _cache_lock:
+        anterior = _cache
+        if anterior[0] == key:
+            return anterior[1]
+        transport = cls(cfg)
+        if cfg.get("record_path"):
+            transport = RecordingTransport(cfg, transport)
+        _cache = (key, transport)
+    if anterior[1] is not None:
+        # Después de crear el nuevo: si comparten sidecar, este sigue en marcha
+        anterior[1].close()
+    return transport
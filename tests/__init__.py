@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+from . import test_estadisticas
+from . import test_agrupacion_estados
+from . import test_outbox
+from . import test_ledger
+from . import test_breaker
+from . import test_recuperacion
+from . import test_cambios_ot
+from . import test_resumenes
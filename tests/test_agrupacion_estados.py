@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+TESTS DE AGRUPACIÓN DE ESTADOS Y LÍMITE POR DESTINO (ODOO)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Los cambios de etapa seguidos de una OT se funden en un solo aviso de la
+outbox (`wa_coalesce_sec`), también cuando los hace un usuario sin acceso
+a la outbox, y el token bucket de cada destino parte de sus envíos
+recientes.
+-----------------------------------------------------------
+"""
+from odoo import fields
+from odoo.tests import TransactionCase, new_test_user, tagged
+
+from odoo.addons.btr_automation_whatsapp.models.wa_config import build_config
+
+DESTINO = "34600000000@s.whatsapp.net"
+
+
+@tagged("post_install", "-at_install")
+class TestAgrupacionEstados(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.etapas = cls.env["maintenance.stage"].create([
+            {"name": f"Test agrupación {n}", "done": False} for n in ("A", "B", "C")])
+        cls.tecnico = new_test_user(cls.env, login="tecnico_wa_agrupacion", groups="base.group_user")
+
+    def setUp(self):
+        super().setUp()
+        self.cfg = build_config({"wa_to": DESTINO, "wa_events": ["estado", "reasignacion"],
+                                 "wa_coalesce_sec": 30})
+        self.patch(type(self.env["btr.wa.helpers"]), "_wa_config", lambda _self: self.cfg)
+        self.ot = self.env["maintenance.request"].create({"name": "OT test agrupación", "stage_id": self.etapas[0].id})
+
+    def _avisos_estado(self):
+        return self.env["btr.wa.outbox"].search([("request_id", "=", self.ot.id), ("evento", "=", "estado")])
+
+    def test_tecnico_encadena_dos_cambios_seguidos(self):
+        ot = self.ot.with_user(self.tecnico)
+        ot.stage_id = self.etapas[1]
+        ot.stage_id = self.etapas[2]
+        aviso = self._avisos_estado()
+        self.assertEqual(len(aviso), 1)
+        self.assertEqual(aviso.estados, " → ".join(self.etapas.mapped("name")))
+        self.assertEqual(aviso.state, "pending")
+        self.assertIn(self.etapas[2].name, aviso.texto)
+
+    def test_otro_aviso_de_la_ot_suelta_el_estado_pendiente(self):
+        self.ot.stage_id = self.etapas[1]
+        aviso = self._avisos_estado()
+        self.assertGreater(aviso.fecha_programada, fields.Datetime.now())
+        self.env["btr.wa.outbox"]._encolar_texto("Otro aviso", self.ot, evento="reasignacion")
+        aviso.invalidate_recordset(["fecha_programada"])
+        self.assertLessEqual(aviso.fecha_programada, fields.Datetime.now())
+        # El siguiente cambio ya no se funde con el aviso soltado
+        self.ot.stage_id = self.etapas[2]
+        self.assertEqual(len(self._avisos_estado()), 2)
+
+    def test_bucket_descuenta_envios_recientes(self):
+        outbox = self.env["btr.wa.outbox"]
+        burst = self.cfg["rate_burst"]
+        outbox.create([{"tipo": "text", "destino": DESTINO, "texto": f"Enviado {n}", "state": "sent",
+                        "fecha_envio": fields.Datetime.now()} for n in range(burst)])
+        self.assertFalse(outbox._bucket(DESTINO, self.cfg, {}).take())
+        self.assertTrue(outbox._bucket("34611111111@s.whatsapp.net", self.cfg, {}).take())
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+TESTS DEL CIRCUIT BREAKER (ODOO)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+closed -> open tras `wa_breaker_threshold` fallos seguidos, sonda en
+half_open pasados `wa_breaker_probe_sec` y vuelta a closed (con
+recuperación) o a open según la sonda. El drenado deja de enviar en
+cuanto la racha de fallos llega al umbral.
+-----------------------------------------------------------
+"""
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.btr_automation_whatsapp.models.wa_config import build_config
+
+from .test_outbox import DESTINO, Transporte
+
+
+@tagged("post_install", "-at_install")
+class TestBreaker(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cfg = build_config({"wa_to": DESTINO, "wa_events": [],
+                                 "wa_breaker_threshold": 2, "wa_breaker_probe_sec": 300,
+                                 "wa_concurrency": 1})
+        self.transporte = Transporte(ok=False)
+        helpers = type(self.env["btr.wa.helpers"])
+        self.patch(helpers, "_wa_config", lambda _self: self.cfg)
+        self.patch(helpers, "_wa_transport", lambda _self, cfg=None: self.transporte)
+        self.patch(self.env.cr, "commit", lambda: None)
+        self.patch(type(self.env["btr.wa.metrics.hourly"]), "_volcar_si_toca", lambda _self: None)
+        self.recuperaciones = []
+        self.patch(type(self.env["btr.wa.catchup"]), "_trigger", lambda _self: self.recuperaciones.append(1))
+        self.breaker = self.env["btr.wa.breaker"]
+        self.breaker._guardar(estado="closed", fallos=0)
+
+    def _abrir_hace(self, segundos):
+        self.breaker._abrir(self.cfg["breaker_threshold"], "test")
+        self.breaker._guardar(abierto_desde=fields.Datetime.now() - timedelta(seconds=segundos))
+
+    def test_abre_tras_el_umbral_de_fallos(self):
+        self.assertFalse(self.breaker._registrar(self.cfg, 0, 1, 1))
+        self.assertTrue(self.breaker._registrar(self.cfg, 0, 1, 1))
+        self.assertEqual(self.breaker.estado()["estado"], "open")
+        self.assertEqual(self.breaker._permitir(self.cfg), "open")
+
+    def test_un_exito_reinicia_la_cuenta(self):
+        self.breaker._registrar(self.cfg, 0, 1, 1)
+        self.assertFalse(self.breaker._registrar(self.cfg, 1, 1, 1))
+        self.assertEqual(self.breaker.estado()["fallos"], 1)
+
+    def test_sonda_correcta_cierra_y_recupera(self):
+        self._abrir_hace(self.cfg["breaker_probe_sec"] - 10)
+        self.assertEqual(self.breaker._permitir(self.cfg), "open")
+        self._abrir_hace(self.cfg["breaker_probe_sec"] + 10)
+        self.assertEqual(self.breaker._permitir(self.cfg), "half_open")
+        self.assertFalse(self.breaker._registrar(self.cfg, 1, 0))
+        self.assertEqual(self.breaker.estado()["estado"], "closed")
+        self.assertEqual(self.breaker.estado()["fallos"], 0)
+        self.assertEqual(self.recuperaciones, [1])
+
+    def test_sonda_fallida_vuelve_a_abrir(self):
+        self._abrir_hace(self.cfg["breaker_probe_sec"] + 10)
+        self.breaker._permitir(self.cfg)
+        self.assertTrue(self.breaker._registrar(self.cfg, 0, 1, 1))
+        self.assertEqual(self.breaker.estado()["estado"], "open")
+        self.assertFalse(self.recuperaciones)
+
+    def test_drenado_para_al_llegar_al_umbral(self):
+        outbox = self.env["btr.wa.outbox"]
+        jobs = outbox._encolar([
+            dict(outbox._vals_texto(f"Aviso {n}"), destino=f"3461000000{n}@s.whatsapp.net") for n in range(4)])
+        outbox.procesar_cola()
+        self.assertEqual(len(self.transporte.enviados), self.cfg["breaker_threshold"])
+        self.assertEqual(jobs.mapped("intentos"), [1, 1, 0, 0])
+        self.assertEqual(set(jobs.mapped("state")), {"pending"})
+        self.assertEqual(self.breaker.estado()["estado"], "open")
+        # Abierto no se intenta nada hasta la sonda
+        self.assertEqual(outbox.procesar_cola(), 0)
+        self.assertEqual(len(self.transporte.enviados), self.cfg["breaker_threshold"])
+
+    def test_sonda_correcta_en_el_drenado_sigue_con_el_resto(self):
+        outbox = self.env["btr.wa.outbox"]
+        jobs = outbox._encolar([
+            dict(outbox._vals_texto(f"Aviso {n}"), destino=f"3461000000{n}@s.whatsapp.net") for n in range(3)])
+        self._abrir_hace(self.cfg["breaker_probe_sec"] + 10)
+        self.transporte.ok = True
+        outbox.procesar_cola()
+        # Sonda correcta: se cierra y el drenado sigue con lotes normales
+        self.assertEqual(set(jobs.mapped("state")), {"sent"})
+        self.assertEqual(self.breaker.estado()["estado"], "closed")
+        self.assertEqual(self.recuperaciones, [1])
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+TESTS DEL HOOK ÚNICO DE CAMBIOS EN OTs (ODOO)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Un write sin campos vigilados no fotografía nada; cada cambio real llega a
+su manejador una vez (etapa, técnico, subida de prioridad) y los writes
+anidados de maintenance no se vuelven a despachar.
+-----------------------------------------------------------
+"""
+from odoo.tests import TransactionCase, new_test_user, tagged
+
+from odoo.addons.btr_automation_whatsapp.models.wa_config import build_config
+
+from .test_outbox import DESTINO
+
+
+@tagged("post_install", "-at_install")
+class TestCambiosOT(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.etapas = cls.env["maintenance.stage"].create([
+            {"name": "Test cambios A", "done": False},
+            {"name": "Test cambios B", "done": False},
+            {"name": "Reparado", "done": True},
+        ])
+        cls.tecnicos = (new_test_user(cls.env, login="tecnico_wa_cambios_1", groups="base.group_user")
+                        | new_test_user(cls.env, login="tecnico_wa_cambios_2", groups="base.group_user"))
+
+    def setUp(self):
+        super().setUp()
+        self.cfg = build_config({"wa_to": DESTINO,
+                                 "wa_events": ["nueva", "estado", "cierre", "reasignacion", "prioridad"]})
+        self.patch(type(self.env["btr.wa.helpers"]), "_wa_config", lambda _self: self.cfg)
+        self.ot = self.env["maintenance.request"].create({
+            "name": "OT test cambios", "stage_id": self.etapas[0].id,
+            "user_id": self.tecnicos[0].id, "priority": "1",
+        })
+
+    def _eventos(self, ot=None):
+        jobs = self.env["btr.wa.outbox"].search([("request_id", "=", (ot or self.ot).id)], order="id")
+        return jobs.mapped("evento")
+
+    def test_write_sin_campos_vigilados_no_fotografia(self):
+        instantaneas = []
+        original = type(self.ot)._wa_instantanea
+        self.patch(type(self.ot), "_wa_instantanea",
+                   lambda recs, campos: instantaneas.append(campos) or original(recs, campos))
+        self.ot.write({"name": "OT test cambios renombrada"})
+        self.assertFalse(instantaneas)
+        self.ot.write({"stage_id": self.etapas[1].id})
+        self.assertEqual(len(instantaneas), 1)
+
+    def test_cambio_de_etapa_encola_un_aviso(self):
+        self.ot.stage_id = self.etapas[1]
+        self.assertEqual(self._eventos(), ["nueva", "estado"])
+
+    def test_cierre_no_se_avisa_como_estado(self):
+        self.ot.stage_id = self.etapas[2]
+        self.assertEqual(self._eventos(), ["nueva", "cierre"])
+
+    def test_solo_avisa_cuando_sube_la_prioridad(self):
+        self.ot.priority = "0"
+        self.assertEqual(self._eventos(), ["nueva"])
+        self.ot.priority = "3"
+        self.assertEqual(self._eventos(), ["nueva", "prioridad"])
+
+    def test_reasignacion(self):
+        self.ot.user_id = self.tecnicos[1]
+        self.assertEqual(self._eventos(), ["nueva", "reasignacion"])
+
+    def test_crear_en_etapa_final_no_redespacha_el_write_anidado(self):
+        ot = self.env["maintenance.request"].create({"name": "OT test cerrada", "stage_id": self.etapas[2].id})
+        self.assertEqual(self._eventos(ot), ["nueva"])
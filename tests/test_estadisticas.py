@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+TESTS DE LAS ESTADÍSTICAS DIARIAS (ODOO)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Aportaciones de btr.wa.stats.daily desde el hook único de create/write.
+Se lanzan con `odoo-bin -i btr_automation_whatsapp --test-tags
+/btr_automation_whatsapp`; pytest solo recoge tests/unit.
+-----------------------------------------------------------
+"""
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.btr_automation_whatsapp.models.wa_config import build_config
+
+
+@tagged("post_install", "-at_install")
+class TestEstadisticasDiarias(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.equipo = cls.env["maintenance.team"].create({"name": "Equipo test estadísticas"})
+        cls.abierta = cls.env["maintenance.stage"].create({"name": "Test abierta", "done": False})
+        cls.cerrada = cls.env["maintenance.stage"].create({"name": "Test cerrada", "done": True})
+
+    def setUp(self):
+        super().setUp()
+        # Sin avisos: solo interesa la tabla de estadísticas
+        cfg = build_config({"wa_to": "34600000000@s.whatsapp.net", "wa_events": []})
+        self.patch(type(self.env["btr.wa.helpers"]), "_wa_config", lambda self: cfg)
+
+    def _totales(self):
+        self.env.cr.execute("""
+            SELECT COALESCE(SUM(creadas), 0), COALESCE(SUM(cerradas), 0)
+              FROM btr_wa_stats_daily WHERE maintenance_team_id = %s
+        """, (self.equipo.id,))
+        return self.env.cr.fetchone()
+
+    def _crear(self, etapa):
+        return self.env["maintenance.request"].create({
+            "name": "OT test estadísticas",
+            "maintenance_team_id": self.equipo.id,
+            "stage_id": etapa.id,
+        })
+
+    def test_crear_en_etapa_final_cuenta_un_cierre(self):
+        ot = self._crear(self.cerrada)
+        self.assertTrue(ot.close_date)
+        self.assertEqual(self._totales(), (1, 1))
+
+    def test_cerrar_y_reabrir(self):
+        ot = self._crear(self.abierta)
+        self.assertEqual(self._totales(), (1, 0))
+        ot.stage_id = self.cerrada
+        self.assertEqual(self._totales(), (1, 1))
+        ot.stage_id = self.abierta
+        self.assertEqual(self._totales(), (1, 0))
+
+    def test_unlink_resta_aportaciones(self):
+        self._crear(self.cerrada).unlink()
+        self.assertEqual(self._totales(), (0, 0))
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+TESTS DEL LEDGER DE ENTREGAS (ODOO)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Deduplicación por (destino, OT, hash de contenido) al drenar la outbox:
+los textos dentro de `wa_dedup_window_min`, las imágenes siempre.
+-----------------------------------------------------------
+"""
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.btr_automation_whatsapp.models.wa_config import build_config
+
+from .test_outbox import DESTINO, Transporte
+
+
+@tagged("post_install", "-at_install")
+class TestLedger(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cfg = build_config({"wa_to": DESTINO, "wa_events": [], "wa_dedup_window_min": 60,
+                                 "wa_image_preprocess": False})
+        self.transporte = Transporte()
+        helpers = type(self.env["btr.wa.helpers"])
+        self.patch(helpers, "_wa_config", lambda _self: self.cfg)
+        self.patch(helpers, "_wa_transport", lambda _self, cfg=None: self.transporte)
+        self.patch(self.env.cr, "commit", lambda: None)
+        self.patch(type(self.env["btr.wa.metrics.hourly"]), "_volcar_si_toca", lambda _self: None)
+        self.outbox = self.env["btr.wa.outbox"]
+        self.ledger = self.env["btr.wa.ledger"]
+        self.ot = self.env["maintenance.request"].create({"name": "OT test ledger"})
+
+    def _envejecer_ledger(self, minutos):
+        self.env.cr.execute("UPDATE btr_wa_ledger SET fecha = %s WHERE request_id = %s",
+                            (fields.Datetime.now() - timedelta(minutes=minutos), self.ot.id))
+
+    def test_texto_repetido_en_la_ventana_es_duplicado(self):
+        primero = self.outbox._encolar_texto("Hola", self.ot)
+        mismo_lote = self.outbox._encolar_texto("Hola", self.ot)
+        self.outbox.procesar_cola()
+        otro_drenado = self.outbox._encolar_texto("Hola", self.ot)
+        self.outbox.procesar_cola()
+        self.assertEqual((primero | mismo_lote | otro_drenado).mapped("state"), ["sent", "duplicate", "duplicate"])
+        self.assertEqual(len(self.transporte.enviados), 1)
+
+    def test_texto_fuera_de_la_ventana_se_reenvia(self):
+        self.outbox._encolar_texto("Hola", self.ot)
+        self.outbox.procesar_cola()
+        self._envejecer_ledger(self.cfg["dedup_window_min"] + 1)
+        job = self.outbox._encolar_texto("Hola", self.ot)
+        self.outbox.procesar_cola()
+        self.assertEqual(job.state, "sent")
+        self.assertEqual(len(self.transporte.enviados), 2)
+
+    def test_imagen_no_se_repite_en_el_cierre(self):
+        foto = self.env["ir.attachment"].create({
+            "name": "foto.jpg", "raw": b"\xff\xd8\xff\xe0 foto", "mimetype": "image/jpeg",
+            "res_model": "maintenance.request", "res_id": self.ot.id,
+        })
+        self.outbox._encolar_imagenes(foto, self.ot)
+        self.outbox.procesar_cola()
+        # Las imágenes no caducan: ni pasada la ventana de los textos
+        self._envejecer_ledger(self.cfg["dedup_window_min"] * 10)
+        job = self.outbox._encolar_imagenes(foto, self.ot)
+        self.outbox.procesar_cola()
+        self.assertEqual(job.state, "duplicate")
+        self.assertEqual(self.transporte.enviados, [(DESTINO, "foto.jpg")])
+
+    def test_gc_borra_solo_textos_caducados(self):
+        chash = self.outbox._vals_texto("Hola", self.ot)["content_hash"]
+        self.ledger._registrar(DESTINO, self.ot.id, chash, "text")
+        self.ledger._registrar(DESTINO, self.ot.id, "img:abc", "image")
+        self._envejecer_ledger(self.cfg["dedup_window_min"] + 1)
+        self.ledger._gc_textos()
+        self.assertFalse(self.ledger._ya_enviado(DESTINO, self.ot.id, chash))
+        self.assertTrue(self.ledger._ya_enviado(DESTINO, self.ot.id, "img:abc"))
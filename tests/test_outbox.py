@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+TESTS DE LA OUTBOX TRANSACCIONAL (ODOO)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Encolado dentro de la transacción, drenado por el cron (envío, registro en
+el ledger, reintento con backoff y error tras agotar los reintentos) y
+purga de los trabajos terminados. El transporte es un doble en memoria.
+-----------------------------------------------------------
+"""
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.btr_automation_whatsapp.models.wa_config import build_config
+from odoo.addons.btr_automation_whatsapp.models.wa_outbox import CRON_XMLID, PURGA_DIAS
+
+DESTINO = "34600000000@s.whatsapp.net"
+
+
+class Transporte:
+    """Transporte en memoria: anota los envíos y responde `ok`."""
+
+    name = "test"
+
+    def __init__(self, ok=True):
+        self.ok = ok
+        self.enviados = []
+
+    def send_text(self, to, text):
+        self.enviados.append((to, text))
+        return self.ok
+
+    def send_image(self, to, path, filename=None):
+        self.enviados.append((to, filename))
+        return self.ok
+
+
+@tagged("post_install", "-at_install")
+class TestOutbox(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cfg = build_config({"wa_to": DESTINO, "wa_events": [], "wa_retry_max": 3})
+        self.transporte = Transporte()
+        helpers = type(self.env["btr.wa.helpers"])
+        self.patch(helpers, "_wa_config", lambda _self: self.cfg)
+        self.patch(helpers, "_wa_transport", lambda _self, cfg=None: self.transporte)
+        # El drenado confirma por lotes: dentro del test se queda en la transacción
+        self.patch(self.env.cr, "commit", lambda: None)
+        self.patch(type(self.env["btr.wa.metrics.hourly"]), "_volcar_si_toca", lambda _self: None)
+        self.outbox = self.env["btr.wa.outbox"]
+        self.ot = self.env["maintenance.request"].create({"name": "OT test outbox"})
+
+    def test_encolar_no_envia_y_despierta_al_cron(self):
+        job = self.outbox._encolar_texto("Hola", self.ot)
+        self.assertEqual((job.state, job.destino, job.request_id), ("pending", DESTINO, self.ot))
+        self.assertFalse(self.transporte.enviados)
+        cron = self.env.ref(CRON_XMLID)
+        self.assertTrue(self.env["ir.cron.trigger"].search([("cron_id", "=", cron.id)]))
+
+    def test_drenado_envia_en_orden_y_registra(self):
+        jobs = self.outbox.browse()
+        for n in range(3):
+            jobs |= self.outbox._encolar_texto(f"Aviso {n}", self.ot)
+        self.assertEqual(self.outbox.procesar_cola(), 3)
+        self.assertEqual(self.transporte.enviados, [(DESTINO, f"Aviso {n}") for n in range(3)])
+        self.assertEqual(set(jobs.mapped("state")), {"sent"})
+        self.assertTrue(all(jobs.mapped("fecha_envio")))
+        self.assertTrue(self.env["btr.wa.ledger"]._ya_enviado(DESTINO, self.ot.id, jobs[0].content_hash))
+
+    def test_fallo_programa_reintento(self):
+        self.transporte.ok = False
+        job = self.outbox._encolar_texto("Hola", self.ot)
+        self.outbox.procesar_cola()
+        self.assertEqual((job.state, job.intentos), ("pending", 1))
+        self.assertGreater(job.fecha_programada, fields.Datetime.now())
+        self.assertTrue(job.ultimo_error)
+        # Hasta su hora no se vuelve a intentar
+        self.assertEqual(self.outbox.procesar_cola(), 0)
+        self.assertEqual(len(self.transporte.enviados), 1)
+
+    def test_error_tras_agotar_reintentos(self):
+        self.transporte.ok = False
+        job = self.outbox._encolar_texto("Hola", self.ot)
+        for _ in range(self.cfg["retry_max"]):
+            job.fecha_programada = False
+            self.outbox.procesar_cola()
+        self.assertEqual((job.state, job.intentos), ("error", self.cfg["retry_max"]))
+
+    def test_gc_purga_terminados_y_conserva_pendientes(self):
+        enviado = self.outbox._encolar_texto("Enviado", self.ot)
+        pendiente = self.outbox._encolar_texto("Pendiente", self.ot)
+        enviado.state = "sent"
+        self.env.flush_all()
+        self.env.cr.execute("UPDATE btr_wa_outbox SET create_date = %s WHERE id IN %s",
+                            (fields.Datetime.now() - timedelta(days=PURGA_DIAS + 1), (enviado.id, pendiente.id)))
+        self.outbox._gc_terminados()
+        self.assertFalse(enviado.exists())
+        self.assertTrue(pendiente.exists())
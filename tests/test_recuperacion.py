@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+TESTS DE LA RECUPERACIÓN DE AVISOS PERDIDOS (ODOO)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+La primera pasada solo fija la marca; después, una OT creada sin aviso en
+la outbox (o con su aviso en error) se reenvía en el mensaje agrupado
+"backlog" de su destino, una sola vez.
+-----------------------------------------------------------
+"""
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.btr_automation_whatsapp.models.recuperacion import PARAM_OT, PARAM_TRACKING
+from odoo.addons.btr_automation_whatsapp.models.wa_config import build_config
+
+from .test_outbox import DESTINO
+
+
+@tagged("post_install", "-at_install")
+class TestRecuperacion(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cfg = build_config({"wa_to": DESTINO, "wa_events": ["nueva"]})
+        self.patch(type(self.env["btr.wa.helpers"]), "_wa_config", lambda _self: self.cfg)
+        self.env["ir.config_parameter"].sudo().search([("key", "in", (PARAM_OT, PARAM_TRACKING))]).unlink()
+        self.catchup = self.env["btr.wa.catchup"]
+        self.outbox = self.env["btr.wa.outbox"]
+
+    def _crear_ot(self):
+        ot = self.env["maintenance.request"].create({"name": "OT test recuperación"})
+        return ot, self.outbox.search([("request_id", "=", ot.id), ("evento", "=", "nueva")])
+
+    def _backlog(self):
+        return self.outbox.search([("evento", "=", "backlog"), ("destino", "=", DESTINO)])
+
+    def test_primera_pasada_solo_fija_la_marca(self):
+        ot, aviso = self._crear_ot()
+        aviso.unlink()
+        self.assertEqual(self.catchup.recuperar(), 0)
+        self.assertEqual(self.catchup._leer_marca()[0], ot.id)
+        self.assertFalse(self._backlog())
+
+    def test_creacion_perdida_se_reenvia_una_vez(self):
+        self.catchup.recuperar()
+        ot, aviso = self._crear_ot()
+        # Alta por importación/SQL: sin trabajo en la outbox
+        aviso.unlink()
+        self.assertEqual(self.catchup.recuperar(), 1)
+        backlog = self._backlog()
+        self.assertEqual(len(backlog), 1)
+        self.assertIn(ot.name, backlog.texto)
+        self.assertEqual(self.catchup.recuperar(), 0)
+        self.assertEqual(self._backlog(), backlog)
+
+    def test_creacion_con_aviso_pendiente_no_se_recupera(self):
+        self.catchup.recuperar()
+        self._crear_ot()
+        self.assertEqual(self.catchup.recuperar(), 0)
+        self.assertFalse(self._backlog())
+
+    def test_trabajo_en_error_queda_agrupado(self):
+        self.catchup.recuperar()
+        ot, aviso = self._crear_ot()
+        aviso.write({"state": "error", "intentos": self.cfg["retry_max"]})
+        self.env.flush_all()
+        self.assertEqual(self.catchup.recuperar(), 1)
+        backlog = self._backlog()
+        self.assertIn(ot.name, backlog.texto)
+        self.assertEqual((aviso.state, aviso.digest_id), ("merged", backlog))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+TESTS DE LOS AGREGADOS DE LOS RESÚMENES (ODOO)
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+Totales y desglose por equipo, hotel y técnico del periodo leídos con un
+read_group de btr.wa.stats.daily, el filtro por alcance de un destino y
+el recuento de pendientes por tramo de antigüedad.
+-----------------------------------------------------------
+"""
+from datetime import date
+
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.btr_automation_whatsapp.models.wa_config import build_config
+
+from .test_outbox import DESTINO
+
+# Día sin actividad real: el periodo solo ve las filas del test
+DIA = date(2001, 1, 1)
+
+
+@tagged("post_install", "-at_install")
+class TestResumenes(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.equipos = cls.env["maintenance.team"].create([{"name": f"Equipo test resumen {n}"} for n in "AB"])
+        cls.hotel = cls.env["maintenance.equipment.category"].create({"name": "Hotel test resumen"})
+        cls.env["btr.wa.stats.daily"].create([
+            {"fecha": DIA, "maintenance_team_id": cls.equipos[0].id, "category_id": cls.hotel.id,
+             "user_id": cls.env.user.id, "creadas": 3, "cerradas": 2, "horas": 1.5},
+            {"fecha": DIA, "maintenance_team_id": cls.equipos[1].id,
+             "creadas": 1, "cerradas": 1, "horas": 0.5},
+        ])
+
+    def setUp(self):
+        super().setUp()
+        cfg = build_config({"wa_to": DESTINO, "wa_events": []})
+        self.patch(type(self.env["btr.wa.helpers"]), "_wa_config", lambda _self: cfg)
+        self.resumen = self.env["btr.wa.resumen"]
+
+    def test_totales_y_desglose_del_periodo(self):
+        agregados = self.resumen._wa_agregar(DIA, DIA)
+        self.assertEqual((agregados["creadas"], agregados["cerradas"], agregados["horas"]), (4, 3, 2.0))
+        self.assertEqual(agregados["maintenance_team_id"][self.equipos[0].name], [3, 2, 1.5])
+        self.assertEqual(agregados["maintenance_team_id"][self.equipos[1].name], [1, 1, 0.5])
+        self.assertEqual(agregados["category_id"]["Sin hotel"], [1, 1, 0.5])
+        self.assertEqual(agregados["user_id"][self.env.user.name], [3, 2, 1.5])
+
+    def test_filtro_de_un_destino(self):
+        agregados = self.resumen._wa_agregar(DIA, DIA, lambda hotel, equipo, empresa: hotel == self.hotel.name)
+        self.assertEqual((agregados["creadas"], agregados["cerradas"]), (3, 2))
+        self.assertEqual(list(agregados["maintenance_team_id"]), [self.equipos[0].name])
+
+    def test_desglose_omite_empresa_unica(self):
+        lineas = self.resumen._wa_lineas_desglose(self.resumen._wa_agregar(DIA, DIA))
+        self.assertNotIn("🏛 *Por empresa:*", lineas)
+        self.assertIn(f"  • {self.equipos[0].name}: 2 cerradas (1.50h) · 3 creadas", lineas)
+
+    def test_pendientes_por_tramo(self):
+        etapa = self.env["maintenance.stage"].create({"name": "Test resumen abierta", "done": False})
+        self.env["maintenance.request"].create([
+            {"name": f"OT test resumen {n}", "stage_id": etapa.id, "maintenance_team_id": self.equipos[0].id}
+            for n in range(2)])
+        filas = [f for f in self.resumen._wa_filas_pendientes()
+                 if f["maintenance_team_id"] and f["maintenance_team_id"][0] == self.equipos[0].id]
+        self.assertEqual(sum(f["__count"] for f in filas), 2)
+        self.assertEqual(sum(f["antiguedad"][0] for f in filas), 2)
+        self.assertEqual(self.resumen._wa_pendientes(
+            filas, lambda hotel, equipo, empresa: equipo == self.equipos[1].name), 0)
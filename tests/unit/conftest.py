@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+TESTS UNITARIOS DE LOS MÓDULOS PUROS
+-----------------------------------------------------------
+- Fecha de implementación: 17/10/2026
+- Versión: 1.0
+- Autor: Andrés Sánchez Serrano
+
+📌 Descripción:
+models/__init__.py importa Odoo; los módulos puros (wa_dispatch,
+wa_format, wa_routing, wa_silencio...) no. Se registra un paquete
+`btr_wa` cuyo __path__ es models/ sin ejecutar su __init__, así los tests
+importan `btr_wa.wa_dispatch` (y sus imports relativos) sin Odoo:
+
+    python -m pytest -q
+-----------------------------------------------------------
+"""
+import os
+import sys
+import types
+
+MODELS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "models")
+
+if "btr_wa" not in sys.modules:
+    paquete = types.ModuleType("btr_wa")
+    paquete.__path__ = [os.path.normpath(MODELS)]
+    sys.modules["btr_wa"] = paquete
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+pytest.importorskip("pytz")
+
+from btr_wa.wa_config import build_config  # noqa: E402
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    (True, True), (False, False), ("false", False), ("no", False), ("0", False),
+    ("true", True), ("1", True), ("quizá", True),
+])
+def test_image_preprocess_booleano(valor, esperado):
+    assert build_config({"wa_image_preprocess": valor})["image_preprocess"] is esperado
+
+
+def test_image_preprocess_por_defecto():
+    assert build_config({})["image_preprocess"] is True
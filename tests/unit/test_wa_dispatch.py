@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from btr_wa.wa_dispatch import WADispatcher
+
+
+def test_fifo_por_destino():
+    enviados = []
+    lock = threading.Lock()
+
+    def enviar(destino, n):
+        time.sleep(0.001 * (n % 3))
+        with lock:
+            enviados.append((destino, n))
+        return True
+
+    with WADispatcher(concurrency=4, max_queue=8) as dispatcher:
+        futuros = [dispatcher.submit(f"d{i % 3}", enviar, f"d{i % 3}", i) for i in range(60)]
+    assert all(f.result() for f in futuros)
+    for destino in ("d0", "d1", "d2"):
+        orden = [n for d, n in enviados if d == destino]
+        assert orden == sorted(orden) and len(orden) == 20
+
+
+def test_orden_de_drenado_texto_antes_que_imagenes():
+    # Un carril no empieza el siguiente trabajo hasta terminar el anterior,
+    # aunque el texto tarde más que las imágenes que lo siguen
+    inicio_fin = []
+
+    def enviar(nombre, espera):
+        inicio_fin.append(("inicio", nombre))
+        time.sleep(espera)
+        inicio_fin.append(("fin", nombre))
+        return nombre
+
+    with WADispatcher(concurrency=4) as dispatcher:
+        for nombre, espera in (("CIERRE", 0.03), ("img1", 0), ("img2", 0), ("Adjuntos", 0)):
+            dispatcher.submit("grupo", enviar, nombre, espera)
+    assert inicio_fin == [(e, n) for n in ("CIERRE", "img1", "img2", "Adjuntos") for e in ("inicio", "fin")]
+
+
+def test_destinos_en_paralelo():
+    barrera = threading.Barrier(2, timeout=2)
+
+    with WADispatcher(concurrency=2) as dispatcher:
+        a = dispatcher.submit("a", barrera.wait)
+        b = dispatcher.submit("b", barrera.wait)
+    # Si los carriles no fueran en paralelo la barrera daría timeout
+    assert a.exception() is None and b.exception() is None
+
+
+def test_contrapresion_limita_en_vuelo():
+    evento = threading.Event()
+    with WADispatcher(concurrency=2, max_queue=3) as dispatcher:
+        hilo = threading.Thread(target=lambda: [dispatcher.submit(f"d{i}", evento.wait, 2) for i in range(6)])
+        hilo.start()
+        time.sleep(0.05)
+        assert dispatcher._en_vuelo == 3
+        evento.set()
+        hilo.join()
+    assert dispatcher.max_en_vuelo == 3
+
+
+def test_excepcion_no_para_el_carril():
+    def falla():
+        raise RuntimeError("caído")
+
+    with WADispatcher(concurrency=1) as dispatcher:
+        f1 = dispatcher.submit("a", falla)
+        f2 = dispatcher.submit("a", lambda: "ok")
+    assert isinstance(f1.exception(), RuntimeError)
+    assert f2.result() == "ok"
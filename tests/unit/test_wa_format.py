@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from btr_wa.wa_format import compilar, html_a_markdown
+
+
+@pytest.mark.parametrize("entrada, esperado", [
+    ("", ""),
+    (None, ""),
+    ("<p>Hola</p><p>mundo</p>", "Hola\n\nmundo"),
+    ("línea 1<br>línea 2", "línea 1\nlínea 2"),
+    ("<p><b>Grifo</b> <i>roto</i> <s>ya</s></p>", "*Grifo* _roto_ ~ya~"),
+    ("<ul><li>uno</li><li>dos</li></ul>", "• uno\n• dos"),
+    ("<ol><li>uno</li><li>dos</li></ol>", "1. uno\n2. dos"),
+    ("<ul><li>una\n   sola\n línea</li></ul>", "• una sola línea"),
+    ("<ul><li>a<ol><li>b</li></ol></li></ul>", "• a\n  1. b"),
+    ("<p>Tom &amp; Jerry &lt;3</p>", "Tom & Jerry <3"),
+    ("<p>a<!-- nota --> b</p>", "a b"),
+])
+def test_html_a_markdown(entrada, esperado):
+    assert html_a_markdown(entrada) == esperado
+
+
+def test_compilar_y_render():
+    plantilla = compilar("OT #{code}: {horas:.1f} h", {"code", "horas"})
+    assert plantilla.campos == {"code", "horas"}
+    assert plantilla.render({"code": "0042", "horas": 2.25}) == "OT #0042: 2.2 h"
+
+
+@pytest.mark.parametrize("cuerpo", ["{desconocido}", "{code!r}", "{0}", "{code"])
+def test_compilar_rechaza(cuerpo):
+    with pytest.raises(ValueError):
+        compilar(cuerpo, {"code"})
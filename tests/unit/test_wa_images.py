@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from btr_wa import wa_images
+from btr_wa.wa_images import RenditionCache
+
+
+def test_fallo_de_transcodificacion_se_recuerda(tmp_path, monkeypatch):
+    llamadas = []
+
+    def transcode(src, dst, max_side, quality):
+        llamadas.append(src)
+        raise OSError("cannot identify image file")
+
+    monkeypatch.setattr(wa_images, "transcode", transcode)
+    cache = RenditionCache(str(tmp_path), 1024 * 1024)
+    src = tmp_path / "rota.jpg"
+    src.write_bytes(b"no es una imagen")
+    assert cache.put("abc", str(src)) is None
+    assert cache.fallido("abc") and not cache.fallido("def")
+    assert cache.put("abc", str(src)) is None
+    assert len(llamadas) == 1
+    assert not list(tmp_path.glob("*.part"))
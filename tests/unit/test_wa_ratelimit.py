@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from btr_wa.wa_ratelimit import TokenBucket
+
+
+class Reloj:
+    def __init__(self, t=1000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def test_rafaga_y_recarga():
+    reloj = Reloj()
+    bucket = TokenBucket(rate=0.5, capacity=3, reloj=reloj)
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+    assert bucket.wait_time() == pytest.approx(2.0)
+    reloj.t += 2
+    assert bucket.take() and not bucket.take()
+    reloj.t += 100
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+
+
+def test_desde_historial_vacio_esta_lleno():
+    bucket = TokenBucket.desde_historial(1 / 3, 10, [], 5000.0, reloj=Reloj(5000.0))
+    assert bucket.tokens == pytest.approx(10)
+
+
+def test_desde_historial_descuenta_envios_recientes():
+    ahora = 5000.0
+    # 10 envíos en los últimos 3 s con 20/min y ráfaga 10: bucket casi vacío
+    envios = [ahora - 3 + i * 0.3 for i in range(10)]
+    bucket = TokenBucket.desde_historial(20 / 60, 10, envios, ahora, reloj=Reloj(ahora))
+    assert bucket.tokens < 1
+    assert not bucket.take()
+    assert bucket.wait_time() > 0
+
+
+def test_desde_historial_ignora_envios_fuera_de_ventana():
+    ahora = 5000.0
+    viejos = [ahora - TokenBucket.ventana(1.0, 5) - 1] * 50
+    bucket = TokenBucket.desde_historial(1.0, 5, viejos + [ahora - 1], ahora, reloj=Reloj(ahora))
+    assert bucket.tokens == pytest.approx(5)
+
+
+def test_dos_workers_comparten_limite():
+    # Lo que envía un worker lo ve el siguiente al reconstruir desde la tabla
+    ahora = 5000.0
+    reloj = Reloj(ahora)
+    envios = []
+    for _worker in range(3):
+        bucket = TokenBucket.desde_historial(0.1, 4, envios, ahora, reloj=reloj)
+        while bucket.take():
+            envios.append(ahora)
+    assert len(envios) == 4
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from btr_wa.wa_routing import RoutingIndex
+
+REGLAS = [
+    {"to": "mar@g.us", "hotel": ["Hotel Mar", "Hotel Sol"]},
+    {"to": ["fonta@g.us"], "team": "Fontanería", "priority": "3"},
+    {"to": "sur@g.us", "company": "Hoteles del Sur S.L."},
+    {"to": "todos@g.us"},
+]
+
+
+def _ot(**atributos):
+    base = {"company": "", "hotel": "", "team": "", "stage": "", "priority": "1"}
+    base.update(atributos)
+    return base
+
+
+def test_resolve_reglas_y_regla_sin_condiciones():
+    index = RoutingIndex(REGLAS, "general@g.us")
+    assert index.resolve(_ot(hotel="hotel mar ")) == {"mar@g.us", "todos@g.us"}
+    assert index.resolve(_ot(team="Fontanería", priority="3")) == {"fonta@g.us", "todos@g.us"}
+    assert index.resolve(_ot(team="Fontanería", priority="2")) == {"todos@g.us"}
+    assert index.resolve(_ot(company="Hoteles del Sur S.L.")) == {"sur@g.us", "todos@g.us"}
+
+
+def test_resolve_sin_coincidencias_va_a_wa_to():
+    index = RoutingIndex(REGLAS[:2], "general@g.us")
+    assert index.resolve(_ot(hotel="Otro")) == {"general@g.us"}
+    assert RoutingIndex([], "").resolve(_ot()) == set()
+
+
+def test_reglas_no_validas_se_ignoran():
+    index = RoutingIndex(["no", {"hotel": "Hotel Mar"}, {"to": "ok@g.us"}], "")
+    assert index.destinations() == {"ok@g.us"}
+
+
+def test_summary_filter():
+    index = RoutingIndex(REGLAS, "general@g.us")
+    assert index.summary_filter("general@g.us") is None
+    assert index.summary_filter("todos@g.us") is None
+    # La prioridad no limita el alcance del resumen; el equipo sí
+    fonta = index.summary_filter("fonta@g.us")
+    assert fonta("Hotel Mar", "fontanería") and not fonta("Hotel Mar", "Electricidad")
+    mar = index.summary_filter("mar@g.us")
+    assert mar("Hotel Sol", "x") and not mar("Hotel Luna", "x")
+    sur = index.summary_filter("sur@g.us")
+    assert sur("", "", "hoteles del sur s.l.") and not sur("Hotel Mar", "x")
+    assert index.destinations() == {"mar@g.us", "fonta@g.us", "sur@g.us", "todos@g.us", "general@g.us"}
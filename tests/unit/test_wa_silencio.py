@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("pytz")
+
+from btr_wa.wa_silencio import QuietHours, parse_ventana  # noqa: E402
+
+
+def test_parse_ventana():
+    assert parse_ventana("") is None
+    assert parse_ventana(" 23:00 - 7:30 ")[1].hour == 7
+    for mala in ("23-07", "25:00-07:00", "07:00-07:00"):
+        with pytest.raises(ValueError):
+            parse_ventana(mala)
+
+
+# Madrid en octubre (antes del cambio de hora) es UTC+2
+@pytest.mark.parametrize("ahora, fin", [
+    (datetime(2026, 10, 17, 21, 30), datetime(2026, 10, 18, 5, 0)),   # 23:30 local
+    (datetime(2026, 10, 18, 4, 0), datetime(2026, 10, 18, 5, 0)),     # 06:00 local
+    (datetime(2026, 10, 18, 5, 0), None),                             # 07:00 local: fuera
+    (datetime(2026, 10, 17, 12, 0), None),
+])
+def test_fin_ventana_que_cruza_medianoche(ahora, fin):
+    quiet = QuietHours("23:00-07:00", "Europe/Madrid")
+    assert quiet.fin("g@g.us", ahora) == fin
+
+
+def test_fin_por_destino_y_cambio_de_hora():
+    quiet = QuietHours({"default": "23:00-07:00", "a@g.us": "", "b@g.us": "01:00-03:00"}, "Europe/Madrid")
+    ahora = datetime(2026, 10, 24, 23, 30)  # 01:30 local del día del cambio (UTC+2 -> UTC+1)
+    assert quiet.fin("a@g.us", ahora) is None
+    assert quiet.fin("b@g.us", ahora) == datetime(2026, 10, 25, 2, 0)
+    assert quiet.fin("otro@g.us", ahora) == datetime(2026, 10, 25, 6, 0)
+
+
+def test_config_no_valida():
+    quiet = QuietHours({"default": "mal", "a@g.us": "10:00-11:00"}, "Marte/Olimpo")
+    assert quiet.general is None and quiet.tz.zone == "UTC"
+    assert bool(quiet) and not QuietHours("", "UTC")
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import socket
+import threading
+
+from btr_wa import wa_transport
+from btr_wa.wa_sidecar import SidecarNoDisponible, SidecarSupervisor, get_supervisor
+from btr_wa.wa_transport import SidecarTransport, get_transport
+
+
+class _Fallback:
+    def __init__(self):
+        self.enviados = []
+
+    def send_text(self, to, text):
+        self.enviados.append((to, text))
+        return True
+
+
+def _transporte(error):
+    class _Supervisor:
+        def send_text(self, to, text):
+            raise error
+
+    transporte = SidecarTransport.__new__(SidecarTransport)
+    transporte.cfg, transporte.timeout = {}, 1
+    transporte.supervisor, transporte.fallback = _Supervisor(), _Fallback()
+    return transporte
+
+
+def test_sidecar_caido_usa_modo_comando():
+    transporte = _transporte(SidecarNoDisponible("caído"))
+    assert transporte.send_text("a@g.us", "hola") is True
+    assert transporte.fallback.enviados == [("a@g.us", "hola")]
+
+
+def test_error_tras_enviar_no_repite_por_comando():
+    transporte = _transporte(socket.timeout("timed out"))
+    assert transporte.send_text("a@g.us", "hola") is False
+    assert transporte.fallback.enviados == []
+
+
+def test_conexion_rechazada_es_no_disponible(tmp_path):
+    supervisor = SidecarSupervisor("true", str(tmp_path / "no_existe.sock"), timeout=1)
+    try:
+        supervisor._request({"op": "ping"})
+    except SidecarNoDisponible:
+        pass
+    else:
+        raise AssertionError("se esperaba SidecarNoDisponible")
+
+
+def test_timeout_tras_conectar_no_es_no_disponible(tmp_path):
+    ruta = str(tmp_path / "mudo.sock")
+    servidor = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    servidor.bind(ruta)
+    servidor.listen(1)
+    conexiones = []
+    hilo = threading.Thread(target=lambda: conexiones.append(servidor.accept()[0]))
+    hilo.start()
+    try:
+        SidecarSupervisor("true", ruta, timeout=0.2)._request({"op": "text", "to": "a", "text": "b"})
+    except SidecarNoDisponible:
+        raise AssertionError("la petición ya había salido")
+    except OSError:
+        pass
+    finally:
+        hilo.join()
+        for c in conexiones:
+            c.close()
+        servidor.close()
+
+
+def _cfg(**extra):
+    cfg = {"backend": "command", "timeout": 5, "text_cmd": "echo {to} {text}",
+           "image_cmd": "echo {to} {file}", "record_path": "", "sidecar_cmd": "sleep 30",
+           "sidecar_socket": "/tmp/btr_wa_test_no_usado.sock", "coalesce_sec": 30}
+    cfg.update(extra)
+    return cfg
+
+
+def test_get_transport_cierra_el_sustituido(monkeypatch):
+    monkeypatch.setattr(wa_transport, "_cache", (None, None))
+    cerrados = []
+    monkeypatch.setattr(wa_transport.CommandTransport, "close", lambda self: cerrados.append(self))
+    primero = get_transport(_cfg())
+    # Un ajuste que el backend no usa no rehace el transporte
+    assert get_transport(_cfg(coalesce_sec=60)) is primero
+    segundo = get_transport(_cfg(text_cmd="printf {to} {text}"))
+    assert segundo is not primero and cerrados == [primero]
+
+
+def test_release_para_el_sidecar_propio_sin_usuarios(tmp_path, monkeypatch):
+    monkeypatch.setattr(wa_transport, "_cache", (None, None))
+    cfg = _cfg(backend="sidecar", sidecar_socket=str(tmp_path / "s.sock"))
+    primero = get_transport(cfg)
+    primero.supervisor._spawn()
+    proc = primero.supervisor._proc
+    # Mismo sidecar con otro timeout: el supervisor sigue vivo
+    segundo = get_transport(dict(cfg, timeout=7))
+    assert segundo.supervisor is primero.supervisor and proc.poll() is None
+    get_transport(dict(cfg, sidecar_cmd="sleep 31"))
+    assert proc.wait(timeout=5) is not None
+    assert get_supervisor(cfg["sidecar_cmd"], cfg["sidecar_socket"]) is not primero.supervisor
+
+
+def test_sidecar_sin_sesion_no_se_relanza(tmp_path):
+    ruta = str(tmp_path / "conectando.sock")
+    servidor = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    servidor.bind(ruta)
+    servidor.listen(8)
+    parar = threading.Event()
+
+    def atender():
+        servidor.settimeout(0.1)
+        while not parar.is_set():
+            try:
+                conn, _ = servidor.accept()
+            except socket.timeout:
+                continue
+            with conn:
+                conn.recv(4096)
+                conn.sendall(b'{"ok": false, "error": "sin sesi\\u00f3n (connecting)"}\n')
+
+    hilo = threading.Thread(target=atender)
+    hilo.start()
+    try:
+        supervisor = SidecarSupervisor("false", ruta, timeout=1, start_timeout=1)
+        assert supervisor.ping() is False
+        assert supervisor.ensure_running() is False
+        assert supervisor.restarts == 0
+    finally:
+        parar.set()
+        hilo.join()
+        servidor.close()
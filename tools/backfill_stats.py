@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""
+Reconstruye btr.wa.stats.daily desde maintenance.request.
+
+Uso (una vez, o si se sospecha de desajustes tras cambios masivos por SQL):
+    odoo shell -d <base_de_datos> < tools/backfill_stats.py
+"""
+filas = env["btr.wa.stats.daily"].backfill()  # noqa: F821 (env lo inyecta odoo shell)
+env.cr.commit()  # noqa: F821
+print(f"btr.wa.stats.daily reconstruida: {filas} filas.")
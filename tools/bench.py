@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK OFFLINE DEL MÓDULO WHATSAPP
+-----------------------------------------------------------
+Mide, sin teléfono ni red:
+1. drenado: trabajos/s de la outbox contra tools/fake_mudslide.py
+   (solo si wa_text_cmd apunta a fake_mudslide; si no, se omite para no
+   enviar nada real);
+2. create: latencia de maintenance.request.create() (con el encolado de
+   "NUEVA OT") y de los trabajos de imagen de una OT con 0..20 imágenes;
+3. writes: cambios de estado por segundo;
+4. resúmenes: enviar_resumen_diario / enviar_resumen_semanal (y la carga
+   de btr.wa.stats.daily) sobre 10k..1M OTs sintéticas.
+
+Las fases 2-4 se hacen en una transacción que se revierte al final; la 1
+confirma (el cron confirma por lotes) y borra después lo que ha creado.
+
+Uso (base de datos de pruebas):
+    WA_STUB_LATENCY=0.2 BENCH_OUT=bench.json \\
+        odoo shell -d <base_de_datos> < tools/bench.py
+
+Variables: BENCH_OUT (ruta del JSON), BENCH_SIZES ("10000,100000,1000000"),
+BENCH_IMAGES ("0,1,5,10,20"), BENCH_REPEAT (5), BENCH_WRITES (200),
+BENCH_DRAIN_DESTINOS (20), BENCH_DRAIN_TEXTOS (5 por destino).
+Comparar dos informes: python3 tools/bench_compare.py base.json nuevo.json
+"""
+import base64
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+
+from odoo.addons.btr_automation_whatsapp.models.wa_config import module_root
+
+env = env  # noqa: F821 (env lo inyecta odoo shell)
+
+
+def _lista_int(nombre, defecto):
+    return [int(x) for x in os.environ.get(nombre, defecto).split(",") if x.strip()]
+
+
+SIZES = _lista_int("BENCH_SIZES", "10000,100000,1000000")
+IMAGES = _lista_int("BENCH_IMAGES", "0,1,5,10,20")
+REPEAT = int(os.environ.get("BENCH_REPEAT", "5"))
+WRITES = int(os.environ.get("BENCH_WRITES", "200"))
+DRAIN_DESTINOS = int(os.environ.get("BENCH_DRAIN_DESTINOS", "20"))
+DRAIN_TEXTOS = int(os.environ.get("BENCH_DRAIN_TEXTOS", "5"))
+OUT = os.environ.get("BENCH_OUT") or f"bench_{datetime.now():%Y%m%d_%H%M%S}.json"
+
+
+def _ms(segundos):
+    return round(segundos * 1000, 3)
+
+
+def _estadisticas(tiempos):
+    return {
+        "n": len(tiempos),
+        "min_ms": _ms(min(tiempos)),
+        "p50_ms": _ms(statistics.median(tiempos)),
+        "max_ms": _ms(max(tiempos)),
+    }
+
+
+def _cronometrar(fn, *args):
+    inicio = time.perf_counter()
+    res = fn(*args)
+    return time.perf_counter() - inicio, res
+
+
+def _imagen_jpeg():
+    """Foto sintética de 2000x1500 (tamaño típico de móvil tras compresión)."""
+    from PIL import Image
+    img = Image.linear_gradient("L").resize((2000, 1500)).convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=90)
+    return base64.b64encode(buf.getvalue())
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=module_root(),
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+# ------------------------------- 1. Drenado ------------------------------------
+def bench_drenado(cfg):
+    if cfg["backend"] != "command" or "fake_mudslide" not in cfg["text_cmd"]:
+        return {"omitido": "wa_text_cmd no apunta a tools/fake_mudslide.py"}
+    outbox = env["btr.wa.outbox"].sudo()
+    icp = env["ir.config_parameter"].sudo()
+    claves_breaker = ["btr_wa.breaker_estado", "btr_wa.breaker_fallos", "btr_wa.breaker_abierto_desde"]
+    breaker_antes = {k: icp.get_param(k) for k in claves_breaker}
+    destinos = [f"3460000{n:04d}@s.whatsapp.net" for n in range(DRAIN_DESTINOS)]
+    sello = time.time()
+    outbox._encolar([
+        dict(outbox._vals_texto(f"BENCH {sello} {d} #{i}"), destino=d)
+        for i in range(DRAIN_TEXTOS) for d in destinos
+    ])
+    env.cr.commit()
+    inicio = time.perf_counter()
+    procesados = 0
+    while True:
+        n = outbox.procesar_cola()
+        procesados += n
+        if not n:
+            break
+    duracion = time.perf_counter() - inicio
+    env.cr.execute("""
+        SELECT state, COUNT(*) FROM btr_wa_outbox WHERE destino = ANY(%s) GROUP BY state
+    """, (destinos,))
+    por_estado = dict(env.cr.fetchall())
+    env.cr.execute("DELETE FROM btr_wa_outbox WHERE destino = ANY(%s)", (destinos,))
+    env.cr.execute("DELETE FROM btr_wa_ledger WHERE destino = ANY(%s)", (destinos,))
+    for clave, valor in breaker_antes.items():
+        icp.set_param(clave, valor or False)
+    env.cr.commit()
+    return {
+        "trabajos": len(destinos) * DRAIN_TEXTOS,
+        "procesados": procesados,
+        "estados": por_estado,
+        "duracion_ms": _ms(duracion),
+        "trabajos_per_sec": round(procesados / duracion, 2) if duracion else None,
+        "concurrency": cfg["concurrency"],
+    }
+
+
+# ------------------------------- 2. Create -------------------------------------
+def bench_create():
+    """create() ya encola "NUEVA OT" desde el hook; las imágenes que se suben
+    después no pasan por él, así que se mide aparte lo que crece con ellas:
+    los trabajos de imagen de la OT (_vals_imagenes_ot, según wa_image_mode)."""
+    OT = env["maintenance.request"]
+    outbox = env["btr.wa.outbox"]
+    base_url = OT._wa_base_url()
+    datos = _imagen_jpeg()
+    t_create = [_cronometrar(OT.create, {"name": f"BENCH create {i}"})[0] for i in range(REPEAT)]
+    resultados = {"create": _estadisticas(t_create)}
+    for n_imagenes in IMAGES:
+        t_imagenes = []
+        for i in range(REPEAT):
+            rec = OT.create({"name": f"BENCH imágenes {n_imagenes}/{i}"})
+            adjuntos = env["ir.attachment"].create([{
+                "name": f"bench_{k}.jpg", "datas": datos, "mimetype": "image/jpeg",
+                "res_model": "maintenance.request", "res_id": rec.id,
+            } for k in range(n_imagenes)])
+            t, _ = _cronometrar(outbox._vals_imagenes_ot, adjuntos, rec, base_url)
+            t_imagenes.append(t)
+        resultados[f"imagenes_{n_imagenes}"] = {"vals_imagenes": _estadisticas(t_imagenes)}
+    return resultados
+
+
+# ------------------------------- 3. Writes -------------------------------------
+def bench_writes():
+    etapas = env["maintenance.stage"].search([("done", "=", False)])
+    if len(etapas) < 2:
+        return {"omitido": "hacen falta al menos dos etapas no finales"}
+    ots = env["maintenance.request"].create([{"name": f"BENCH write {i}"} for i in range(min(WRITES, 50))])
+    inicio = time.perf_counter()
+    for i in range(WRITES):
+        ots[i % len(ots)].write({"stage_id": etapas[(i // len(ots) + 1) % len(etapas)].id})
+    duracion = time.perf_counter() - inicio
+    return {
+        "writes": WRITES,
+        "duracion_ms": _ms(duracion),
+        "writes_per_sec": round(WRITES / duracion, 2) if duracion else None,
+    }
+
+
+# ------------------------------ 4. Resúmenes -----------------------------------
+def _insertar_ots(desde, hasta):
+    """OTs sintéticas desde..hasta-1 repartidas en 30 días, equipos, hoteles y técnicos."""
+    abierta = env["maintenance.stage"].search([("done", "=", False)], limit=1)
+    cerrada = env["maintenance.stage"].search([("done", "=", True)], limit=1) or abierta
+    equipos = env["maintenance.team"].search([]).ids
+    hoteles = env["maintenance.equipment.category"].search([]).ids
+    tecnicos = env["res.users"].search([("share", "=", False)], limit=20).ids
+    env.cr.execute("""
+        INSERT INTO maintenance_request
+               (name, company_id, stage_id, maintenance_team_id, category_id, user_id,
+                create_date, write_date, create_uid, write_uid, request_date,
+                close_date, duration, kanban_state, maintenance_type, priority, archive)
+        SELECT 'BENCH ' || g, %(company)s,
+               CASE WHEN g %% 2 = 0 THEN %(cerrada)s ELSE %(abierta)s END,
+               (%(equipos)s::int[])[1 + g %% %(n_equipos)s],
+               (%(hoteles)s::int[])[1 + g %% %(n_hoteles)s],
+               (%(tecnicos)s::int[])[1 + g %% %(n_tecnicos)s],
+               fecha, fecha, %(uid)s, %(uid)s, fecha::date,
+               CASE WHEN g %% 2 = 0 THEN fecha::date END,
+               CASE WHEN g %% 2 = 0 THEN (g %% 8) + 0.5 ELSE 0 END,
+               'normal', 'corrective', (g %% 4)::varchar, FALSE
+          FROM (SELECT g, (now() at time zone 'UTC') - (g %% 720) * interval '1 hour' AS fecha
+                  FROM generate_series(%(desde)s, %(hasta)s - 1) AS g) AS s
+    """, {
+        "company": env.company.id, "abierta": abierta.id, "cerrada": cerrada.id,
+        "equipos": equipos, "n_equipos": max(len(equipos), 1),
+        "hoteles": hoteles, "n_hoteles": max(len(hoteles), 1),
+        "tecnicos": tecnicos, "n_tecnicos": max(len(tecnicos), 1),
+        "uid": env.uid, "desde": desde, "hasta": hasta,
+    })
+    env["maintenance.request"].invalidate_model()
+
+
+def bench_resumenes():
+    resultados = {}
+    actual = 0
+    for size in sorted(SIZES):
+        t_insert, _ = _cronometrar(_insertar_ots, actual, size)
+        actual = size
+        t_backfill, _ = _cronometrar(env["btr.wa.stats.daily"].backfill)
+        diario = [_cronometrar(env["resumen_diario"].enviar_resumen_diario)[0] for _ in range(REPEAT)]
+        semanal = [_cronometrar(env["resumen_semanal"].enviar_resumen_semanal)[0] for _ in range(REPEAT)]
+        resultados[f"ots_{size}"] = {
+            "insercion_ms": _ms(t_insert),
+            "backfill_ms": _ms(t_backfill),
+            "resumen_diario": _estadisticas(diario),
+            "resumen_semanal": _estadisticas(semanal),
+        }
+    return resultados
+
+
+# --------------------------------- Informe -------------------------------------
+def main():
+    cfg = env["btr.wa.helpers"]._wa_config()
+    env.cr.execute("SHOW server_version")
+    informe = {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "git": _git_rev(),
+            "db": env.cr.dbname,
+            "python": platform.python_version(),
+            "postgres": env.cr.fetchone()[0],
+            "backend": cfg["backend"],
+            "stub_latency": float(os.environ.get("WA_STUB_LATENCY", "0")),
+            "stub_fail_rate": float(os.environ.get("WA_STUB_FAIL_RATE", "0")),
+            "ots_existentes": env["maintenance.request"].search_count([]),
+        },
+    }
+    informe["drenado"] = bench_drenado(cfg)
+    try:
+        informe["create"] = bench_create()
+        informe["writes"] = bench_writes()
+        informe["resumenes"] = bench_resumenes()
+    finally:
+        env.cr.rollback()
+    with open(OUT, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(json.dumps(informe, indent=2, ensure_ascii=False))
+    print(f"Informe guardado en {OUT}")
+
+
+main()
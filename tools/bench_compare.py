@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+COMPARADOR DE INFORMES DE tools/bench.py
+-----------------------------------------------------------
+Compara las métricas numéricas comunes de dos informes JSON:
+- *_ms: menos es mejor;
+- *_per_sec: más es mejor.
+Sale con código 1 si alguna empeora más del umbral (20 % por defecto),
+para usarlo antes de desplegar:
+
+    python3 tools/bench_compare.py base.json nuevo.json [--threshold 0.2]
+-----------------------------------------------------------
+"""
+import argparse
+import json
+import sys
+
+
+def _aplanar(datos, prefijo=""):
+    planos = {}
+    for clave, valor in datos.items():
+        ruta = f"{prefijo}.{clave}" if prefijo else clave
+        if isinstance(valor, dict):
+            planos.update(_aplanar(valor, ruta))
+        elif isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            planos[ruta] = valor
+    return planos
+
+
+def comparar(base, nuevo, umbral):
+    """Lista de (métrica, base, nuevo, cambio relativo, ¿regresión?)."""
+    a, b = _aplanar(base), _aplanar(nuevo)
+    filas = []
+    for ruta in sorted(set(a) & set(b)):
+        if ruta.startswith("meta."):
+            continue
+        if ruta.endswith("_ms"):
+            peor = 1
+        elif ruta.endswith("_per_sec"):
+            peor = -1
+        else:
+            continue
+        if not a[ruta]:
+            continue
+        cambio = (b[ruta] - a[ruta]) / a[ruta]
+        filas.append((ruta, a[ruta], b[ruta], cambio, cambio * peor > umbral))
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("nuevo")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.nuevo, encoding="utf-8") as f:
+        nuevo = json.load(f)
+    filas = comparar(base, nuevo, args.threshold)
+    ancho = max((len(f[0]) for f in filas), default=10)
+    for ruta, va, vb, cambio, regresion in filas:
+        marca = "  ❌ REGRESIÓN" if regresion else ""
+        print(f"{ruta:<{ancho}}  {va:>12.2f}  {vb:>12.2f}  {cambio:+7.1%}{marca}")
+    regresiones = [f for f in filas if f[4]]
+    print(f"\n{len(filas)} métricas comparadas, {len(regresiones)} regresiones (umbral {args.threshold:.0%}).")
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MUDSLIDE DE PRUEBAS (sin red)
+-----------------------------------------------------------
+Sustituto de `npx mudslide@latest` para el backend command. Acepta la
+misma línea de órdenes que usan las plantillas por defecto:
+
+    fake_mudslide.py send <to> <texto>
+    fake_mudslide.py send <to> --image <fichero>
+
+En secrets.yaml:
+
+    wa_text_cmd: "python3 /ruta/al/modulo/tools/fake_mudslide.py send {to} {text}"
+    wa_image_cmd: "python3 /ruta/al/modulo/tools/fake_mudslide.py send {to} --image {file}"
+
+Variables (las mismas que wa_sidecar_stub.py): WA_STUB_LATENCY (segundos),
+WA_STUB_FAIL_RATE (0..1), WA_STUB_LOG (JSONL; sin ella no escribe nada).
+Un fallo simulado sale con código 1 y mensaje en stderr, como mudslide.
+-----------------------------------------------------------
+"""
+import json
+import os
+import random
+import sys
+import time
+
+LATENCY = float(os.environ.get("WA_STUB_LATENCY", "0"))
+FAIL_RATE = float(os.environ.get("WA_STUB_FAIL_RATE", "0"))
+LOG = os.environ.get("WA_STUB_LOG")
+
+
+def _log(req):
+    if not LOG:
+        return
+    with open(LOG, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"ts": time.time(), **req}, ensure_ascii=False) + "\n")
+
+
+def main(argv):
+    if len(argv) < 3 or argv[0] != "send":
+        print("uso: fake_mudslide.py send <to> (<texto> | --image <fichero>)", file=sys.stderr)
+        return 2
+    to, resto = argv[1], argv[2:]
+    if resto[0] == "--image":
+        if len(resto) < 2 or not os.path.exists(resto[1]):
+            print(f"Error: fichero inexistente: {resto[1:]}", file=sys.stderr)
+            return 1
+        req = {"op": "image", "to": to, "file": resto[1], "bytes": os.path.getsize(resto[1])}
+    else:
+        texto = " ".join(resto)
+        req = {"op": "text", "to": to, "bytes": len(texto.encode("utf-8"))}
+    time.sleep(LATENCY)
+    if random.random() < FAIL_RATE:
+        print("Error: fallo simulado", file=sys.stderr)
+        return 1
+    _log(req)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PASARELA HTTP WHATSAPP DE PRUEBAS
+-----------------------------------------------------------
+Implementa la API que espera HttpGatewayTransport sin hablar con WhatsApp:
+
+    POST /send/text    JSON {"to", "text"}
+    POST /send/image   multipart (to + file)
+    GET  /stats        peticiones y conexiones TCP atendidas
+
+Habla HTTP/1.1 con keep-alive, así /stats permite comprobar que muchos
+envíos reutilizan pocas conexiones. Uso:
+
+    python3 tools/fake_wa_gateway.py --port 8787 [--latency 0.05] [--fail-rate 0.1]
+
+y en secrets.yaml: wa_backend: http / wa_http_url: http://127.0.0.1:8787
+-----------------------------------------------------------
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STATS = {"requests": 0, "connections": 0, "text": 0, "image": 0, "bytes": 0, "errors": 0}
+_lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    fail_rate = 0.0
+
+    def setup(self):
+        super().setup()
+        with _lock:
+            STATS["connections"] += 1
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            sys.stderr.write("%s - %s\n" % (self.address_string(), fmt % args))
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with _lock:
+                return self._reply(200, dict(STATS))
+        self._reply(404, {"ok": False})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        kind = {"/send/text": "text", "/send/image": "image"}.get(self.path)
+        if not kind:
+            return self._reply(404, {"ok": False, "error": "ruta desconocida"})
+        time.sleep(self.latency)
+        with _lock:
+            STATS["requests"] += 1
+            STATS["bytes"] += len(body)
+            if random.random() < self.fail_rate:
+                STATS["errors"] += 1
+                fallo = True
+            else:
+                STATS[kind] += 1
+                fallo = False
+        if fallo:
+            return self._reply(503, {"ok": False, "error": "fallo simulado"})
+        self._reply(200, {"ok": True})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    Handler.latency = args.latency
+    Handler.fail_rate = args.fail_rate
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    server.verbose = args.verbose
+    print(f"pasarela WA falsa en http://{args.host}:{args.port}", file=sys.stderr, flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+REPRODUCTOR DE CAPTURAS DE ENVÍO (CAPACIDAD)
+-----------------------------------------------------------
+Reproduce un registro de `wa_record_path` (RecordingTransport) a 1×, 10×
+o 100× la velocidad original con el mismo camino que el cron de la outbox:
+el despachador de models/wa_dispatch.py (carriles FIFO por destino,
+`--concurrency` hilos, contrapresión con `--queue-max`) y el transporte
+real de models/wa_transport.py del `--backend` elegido, apuntando a su
+simulador (sin red ni teléfono):
+- command: tools/fake_mudslide.py, un proceso por envío;
+- sidecar: tools/wa_sidecar_stub.py, arrancado por el supervisor;
+- http: tools/fake_wa_gateway.py en un puerto libre (necesita requests).
+
+Cada envío se inyecta a su hora original / velocidad con un texto o una
+imagen de los bytes capturados. El simulador tarda `--latency` segundos
+por envío (por defecto, la mediana de `ms` de la captura) y falla con
+`--fail-rate`. Cada velocidad corre en su propio proceso, así la memoria
+de una pasada no arrastra el pico de la anterior. Informe por velocidad:
+- envios_per_sec: envíos terminados por segundo de reloj;
+- latencia_envio: p50/p95/p99 de la llamada de envío;
+- latencia_total: p50/p95/p99 desde su hora prevista hasta que termina
+  (incluye la espera en el carril y la contrapresión);
+- cola: envíos sin terminar (máximo y media, muestreada cada 50 ms);
+- rss_pico_kb: memoria residente máxima del proceso que envía en esa pasada.
+
+    python3 tools/wa_replay.py captura_20261017.jsonl --speeds 10,100 --out replay.json
+    python3 tools/bench_compare.py replay_base.json replay.json
+
+A 1× una captura de un día tarda un día; `--max-seconds` corta cada pasada.
+No depende de Odoo.
+-----------------------------------------------------------
+"""
+import argparse
+import importlib
+import importlib.util
+import json
+import logging
+import os
+import resource
+import shlex
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from contextlib import contextmanager
+from datetime import datetime
+
+_TOOLS = os.path.dirname(os.path.abspath(__file__))
+_MODELS = os.path.normpath(os.path.join(_TOOLS, "..", "models"))
+
+BACKENDS = ("command", "sidecar", "http")
+
+
+def _modelos():
+    """(WADispatcher, TRANSPORTS) de models/ sin Odoo: como tests/unit, se
+    registra un paquete `btr_wa` cuyo __path__ es models/."""
+    if "btr_wa" not in sys.modules:
+        paquete = types.ModuleType("btr_wa")
+        paquete.__path__ = [_MODELS]
+        sys.modules["btr_wa"] = paquete
+    dispatch = importlib.import_module("btr_wa.wa_dispatch")
+    transport = importlib.import_module("btr_wa.wa_transport")
+    return dispatch.WADispatcher, transport.TRANSPORTS
+
+
+def cargar(path, dia=None):
+    """Envíos de la captura ordenados por hora; `dia` (AAAA-MM-DD) filtra por fecha local."""
+    envios = []
+    with open(path, encoding="utf-8") as f:
+        for n, linea in enumerate(f, 1):
+            try:
+                envio = json.loads(linea)
+                float(envio["ts"])
+            except (ValueError, KeyError, TypeError):
+                print(f"⚠️  línea {n} no válida; se ignora.", file=sys.stderr)
+                continue
+            if dia and datetime.fromtimestamp(envio["ts"]).strftime("%Y-%m-%d") != dia:
+                continue
+            envios.append(envio)
+    envios.sort(key=lambda e: e["ts"])
+    return envios
+
+
+def _percentiles(valores):
+    if not valores:
+        return {"n": 0}
+    orden = sorted(valores)
+
+    def p(q):
+        return round(orden[min(len(orden) - 1, int(q * len(orden)))] * 1000, 3)
+    return {"n": len(orden), "p50_ms": p(0.50), "p95_ms": p(0.95), "p99_ms": p(0.99),
+            "max_ms": round(orden[-1] * 1000, 3)}
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _esperar_puerto(puerto, limite=10):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            socket.create_connection(("127.0.0.1", puerto), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"fake_wa_gateway no escucha en el puerto {puerto}")
+
+
+@contextmanager
+def simulador(args, tmpdir):
+    """Config del transporte de `args.backend` contra su simulador, arrancado aquí."""
+    os.environ["WA_STUB_LATENCY"] = str(args.latency)
+    os.environ["WA_STUB_FAIL_RATE"] = str(args.fail_rate)
+    python = shlex.quote(sys.executable)
+    mudslide = f"{python} {shlex.quote(os.path.join(_TOOLS, 'fake_mudslide.py'))}"
+    cfg = {
+        "timeout": args.timeout,
+        "record_path": "",
+        "text_cmd": f"{mudslide} send {{to}} {{text}}",
+        "image_cmd": f"{mudslide} send {{to}} --image {{file}}",
+        "sidecar_cmd": f"{python} {shlex.quote(os.path.join(_TOOLS, 'wa_sidecar_stub.py'))}",
+        "sidecar_socket": os.path.join(tmpdir, "sidecar.sock"),
+        "http_url": "",
+        "http_token": "",
+        "http_pool_size": args.concurrency,
+    }
+    if args.backend != "http":
+        yield cfg
+        return
+    puerto = _puerto_libre()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(_TOOLS, "fake_wa_gateway.py"), "--port", str(puerto),
+         "--latency", str(args.latency), "--fail-rate", str(args.fail_rate)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _esperar_puerto(puerto)
+        cfg["http_url"] = f"http://127.0.0.1:{puerto}"
+        yield cfg
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+class Imagenes:
+    """Un fichero por tamaño capturado: las imágenes se envían con sus bytes reales."""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self._rutas = {}
+        self._lock = threading.Lock()
+
+    def ruta(self, nbytes):
+        with self._lock:
+            if nbytes not in self._rutas:
+                ruta = os.path.join(self.directorio, f"img_{nbytes}.jpg")
+                with open(ruta, "wb") as f:
+                    f.write(b"\xff" * nbytes)
+                self._rutas[nbytes] = ruta
+            return self._rutas[nbytes]
+
+
+def reproducir(envios, velocidad, args, WADispatcher, transport, imagenes):
+    latencias, totales = [], []
+    fallos = [0]
+    muestras = []
+    lock = threading.Lock()
+
+    def enviar(envio, prevista):
+        to = envio.get("to") or "me"
+        nbytes = int(envio.get("bytes") or 0)
+        inicio = time.perf_counter()
+        if envio.get("op") == "image":
+            ok = transport.send_image(to, imagenes.ruta(nbytes))
+        else:
+            ok = transport.send_text(to, "x" * max(nbytes, 1))
+        fin = time.perf_counter()
+        with lock:
+            latencias.append(fin - inicio)
+            totales.append(fin - prevista)
+            if not ok:
+                fallos[0] += 1
+        return ok
+
+    t0 = envios[0]["ts"] if envios else 0
+    fin_muestreo = threading.Event()
+    inyectados = 0
+    with WADispatcher(args.concurrency, args.queue_max) as dispatcher:
+        def muestrear():
+            while not fin_muestreo.wait(0.05):
+                muestras.append(dispatcher._en_vuelo)
+        hilo = threading.Thread(target=muestrear, daemon=True)
+        hilo.start()
+        inicio = time.perf_counter()
+        for envio in envios:
+            prevista = inicio + (envio["ts"] - t0) / velocidad
+            if args.max_seconds and prevista - inicio > args.max_seconds:
+                break
+            pausa = prevista - time.perf_counter()
+            if pausa > 0:
+                time.sleep(pausa)
+            dispatcher.submit(envio.get("to") or "?", enviar, envio, prevista)
+            inyectados += 1
+    duracion = time.perf_counter() - inicio
+    fin_muestreo.set()
+    hilo.join()
+    return {
+        "envios": inyectados,
+        "fallos": fallos[0],
+        "bytes": sum(int(e.get("bytes") or 0) for e in envios[:inyectados]),
+        "destinos": len({e.get("to") for e in envios[:inyectados]}),
+        "duracion_ms": round(duracion * 1000, 3),
+        "envios_per_sec": round(inyectados / duracion, 2) if duracion else None,
+        "latencia_envio": _percentiles(latencias),
+        "latencia_total": _percentiles(totales),
+        "cola": {
+            "max": dispatcher.max_en_vuelo,
+            "media": round(sum(muestras) / len(muestras), 2) if muestras else 0,
+        },
+    }
+
+
+def pasada(envios, velocidad, args):
+    """Una velocidad completa: simulador, transporte real y reproducción."""
+    WADispatcher, TRANSPORTS = _modelos()
+    # Los fallos simulados ya cuentan en el informe; no se listan uno a uno
+    logging.getLogger("btr_wa").setLevel(logging.CRITICAL)
+    with tempfile.TemporaryDirectory(prefix="btr_wa_replay_") as tmpdir, simulador(args, tmpdir) as cfg:
+        transport = TRANSPORTS[args.backend](cfg)
+        if args.backend == "sidecar":
+            transport.supervisor.ensure_running()  # el arranque no cuenta como latencia de envío
+        try:
+            resultado = reproducir(envios, velocidad, args, WADispatcher, transport, Imagenes(tmpdir))
+        finally:
+            transport.close()
+    # ru_maxrss es el pico de todo el proceso: por eso cada pasada va en el suyo
+    resultado["rss_pico_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return resultado
+
+
+def _pasada_aparte(velocidad):
+    """Lanza este mismo script con `--pass` para `velocidad` y devuelve su informe."""
+    cmd = [sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--pass", repr(velocidad)]
+    res = subprocess.run(cmd, stdout=subprocess.PIPE, text=True)
+    if res.returncode != 0:
+        raise RuntimeError(f"la pasada x{velocidad:g} terminó con código {res.returncode}")
+    return json.loads(res.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("captura", help="JSONL de wa_record_path")
+    parser.add_argument("--speeds", default="1,10,100", help="velocidades separadas por comas (1,10,100)")
+    parser.add_argument("--day", help="solo los envíos de este día (AAAA-MM-DD, hora local)")
+    parser.add_argument("--backend", choices=BACKENDS, default="command")
+    parser.add_argument("--latency", type=float,
+                        help="segundos por envío en el simulador (por defecto, la mediana capturada)")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=int, default=120, help="timeout del transporte (s)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--queue-max", type=int, default=100)
+    parser.add_argument("--max-seconds", type=float, default=0, help="tope de reloj por pasada (0 = sin tope)")
+    parser.add_argument("--out", help="ruta del informe JSON")
+    parser.add_argument("--pass", dest="una_pasada", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend == "http" and importlib.util.find_spec("requests") is None:
+        print("El backend http necesita el paquete requests.", file=sys.stderr)
+        return 1
+    envios = cargar(args.captura, args.day)
+    if not envios:
+        print("La captura no tiene envíos.", file=sys.stderr)
+        return 1
+    if args.latency is None:
+        args.latency = round(statistics.median(float(e.get("ms") or 0) for e in envios) / 1000, 4)
+    if args.una_pasada is not None:
+        json.dump(pasada(envios, args.una_pasada, args), sys.stdout)
+        return 0
+    informe = {"meta": {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "captura": os.path.abspath(args.captura),
+        "envios_captura": len(envios),
+        "desde": datetime.fromtimestamp(envios[0]["ts"]).isoformat(timespec="seconds"),
+        "hasta": datetime.fromtimestamp(envios[-1]["ts"]).isoformat(timespec="seconds"),
+        "backend": args.backend,
+        "latency": args.latency,
+        "fail_rate": args.fail_rate,
+        "concurrency": args.concurrency,
+        "queue_max": args.queue_max,
+    }}
+    for velocidad in [float(v) for v in args.speeds.split(",") if v.strip()]:
+        clave = f"x{velocidad:g}"
+        informe[clave] = r = _pasada_aparte(velocidad)
+        print(f"{clave:>6}: {r['envios']} envíos en {r['duracion_ms'] / 1000:.1f}s "
+              f"({r['envios_per_sec']}/s) · envío p50/p95/p99 "
+              f"{r['latencia_envio'].get('p50_ms')}/{r['latencia_envio'].get('p95_ms')}/"
+              f"{r['latencia_envio'].get('p99_ms')} ms · total p99 {r['latencia_total'].get('p99_ms')} ms · "
+              f"cola máx {r['cola']['max']} · RSS pico {r['rss_pico_kb']} KB")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"Informe guardado en {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env node
+/*
+ * SIDECAR WHATSAPP (Baileys)
+ * -----------------------------------------------------------
+ * Mantiene una única sesión de WhatsApp abierta y atiende peticiones
+ * JSON (una por línea) en el socket Unix indicado por WA_SIDECAR_SOCKET.
+ * Reutiliza las credenciales de mudslide (WA_AUTH_DIR, por defecto
+ * ~/.local/share/mudslide), así que basta con haber hecho `npx mudslide login`.
+ *
+ * Instalación: npm install @whiskeysockets/baileys pino
+ * -----------------------------------------------------------
+ */
+const fs = require('fs');
+const net = require('net');
+const os = require('os');
+const path = require('path');
+const {
+  default: makeWASocket,
+  useMultiFileAuthState,
+  DisconnectReason,
+} = require('@whiskeysockets/baileys');
+const pino = require('pino');
+
+const SOCKET = process.env.WA_SIDECAR_SOCKET || '/tmp/btr_wa_sidecar.sock';
+const AUTH_DIR = process.env.WA_AUTH_DIR
+  || path.join(os.homedir(), '.local', 'share', 'mudslide');
+
+let sock = null;
+let ready = null;
+let estado = 'connecting'; // connecting | open | close: lo que responde ping
+
+function toJid(to) {
+  if (to === 'me' && sock && sock.user) return sock.user.id.replace(/:\d+@/, '@');
+  if (String(to).includes('@')) return to;
+  return `${String(to).replace(/\D/g, '')}@s.whatsapp.net`;
+}
+
+function connect() {
+  estado = 'connecting';
+  ready = new Promise((resolve, reject) => {
+    useMultiFileAuthState(AUTH_DIR).then(({ state, saveCreds }) => {
+      sock = makeWASocket({ auth: state, logger: pino({ level: 'warn' }) });
+      sock.ev.on('creds.update', saveCreds);
+      sock.ev.on('connection.update', ({ connection, lastDisconnect }) => {
+        if (connection === 'open') {
+          estado = 'open';
+          resolve();
+        }
+        if (connection === 'close') {
+          estado = 'close';
+          const code = lastDisconnect && lastDisconnect.error
+            && lastDisconnect.error.output && lastDisconnect.error.output.statusCode;
+          if (code === DisconnectReason.loggedOut) {
+            console.error('Sesión cerrada en WhatsApp: ejecuta `npx mudslide login`.');
+            process.exit(2);
+          }
+          // Lo que esperaba a esta conexión espera a la siguiente
+          resolve(connect());
+        }
+      });
+    }).catch(reject);
+  });
+  // Sin credenciales o Baileys roto: se sale y el supervisor lo relanza
+  ready.catch((e) => {
+    console.error(`No se pudo conectar con WhatsApp: ${e && e.message ? e.message : e}`);
+    process.exit(1);
+  });
+  return ready;
+}
+
+async function handle(req) {
+  if (req.op === 'ping') {
+    return estado === 'open' ? { ok: true } : { ok: false, error: `sin sesión de WhatsApp (${estado})` };
+  }
+  await ready;
+  if (req.op === 'text') {
+    await sock.sendMessage(toJid(req.to), { text: req.text });
+    return { ok: true };
+  }
+  if (req.op === 'image') {
+    await sock.sendMessage(toJid(req.to), { image: fs.readFileSync(req.file), caption: req.caption });
+    return { ok: true };
+  }
+  return { ok: false, error: `op desconocida: ${req.op}` };
+}
+
+const server = net.createServer((conn) => {
+  let buf = '';
+  conn.on('data', async (chunk) => {
+    buf += chunk.toString('utf8');
+    let idx;
+    while ((idx = buf.indexOf('\n')) >= 0) {
+      const line = buf.slice(0, idx);
+      buf = buf.slice(idx + 1);
+      let res;
+      try {
+        res = await handle(JSON.parse(line));
+      } catch (e) {
+        res = { ok: false, error: String(e && e.message ? e.message : e) };
+      }
+      conn.write(JSON.stringify(res) + '\n');
+    }
+  });
+});
+
+if (fs.existsSync(SOCKET)) fs.unlinkSync(SOCKET);
+connect();
+server.listen(SOCKET, () => fs.chmodSync(SOCKET, 0o600));
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SIDECAR WHATSAPP DE PRUEBAS (sin red)
+-----------------------------------------------------------
+Implementa el mismo protocolo que tools/wa_sidecar.js pero no habla con
+WhatsApp: registra cada petición en stdout (o en WA_STUB_LOG) y responde OK.
+Sirve para probar el modo sidecar sin teléfono:
+
+    wa_mode: sidecar
+    wa_sidecar_cmd: "python3 /ruta/al/modulo/tools/wa_sidecar_stub.py"
+
+Variables: WA_SIDECAR_SOCKET, WA_STUB_LATENCY (segundos), WA_STUB_FAIL_RATE (0..1).
+-----------------------------------------------------------
+"""
+import json
+import os
+import random
+import socketserver
+import sys
+import time
+
+SOCKET = os.environ.get("WA_SIDECAR_SOCKET", "/tmp/btr_wa_sidecar.sock")
+LATENCY = float(os.environ.get("WA_STUB_LATENCY", "0"))
+FAIL_RATE = float(os.environ.get("WA_STUB_FAIL_RATE", "0"))
+LOG = os.environ.get("WA_STUB_LOG")
+
+
+def _log(req):
+    line = json.dumps({"ts": time.time(), **req}, ensure_ascii=False)
+    if LOG:
+        with open(LOG, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    else:
+        print(line, flush=True)
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            try:
+                req = json.loads(raw)
+            except ValueError as e:
+                res = {"ok": False, "error": str(e)}
+            else:
+                if req.get("op") == "ping":
+                    res = {"ok": True}
+                elif req.get("op") in ("text", "image"):
+                    time.sleep(LATENCY)
+                    if random.random() < FAIL_RATE:
+                        res = {"ok": False, "error": "fallo simulado"}
+                    elif req["op"] == "image" and not os.path.exists(req.get("file", "")):
+                        res = {"ok": False, "error": "fichero inexistente"}
+                    else:
+                        _log(req)
+                        res = {"ok": True}
+                else:
+                    res = {"ok": False, "error": f"op desconocida: {req.get('op')}"}
+            self.wfile.write((json.dumps(res) + "\n").encode("utf-8"))
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def main():
+    if os.path.exists(SOCKET):
+        os.unlink(SOCKET)
+    with Server(SOCKET, Handler) as srv:
+        print(f"stub sidecar escuchando en {SOCKET}", file=sys.stderr, flush=True)
+        srv.serve_forever()
+
+
+if __name__ == "__main__":
+    main()